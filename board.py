@@ -0,0 +1,307 @@
+import base64
+import binascii
+import hashlib
+import struct
+
+from protocol import (DRAWING_LEGACY, DRAWING_STROKE, HEADER_SIZE,
+                      SNAPSHOT_CODE, STROKE_BIN_CODE, STROKE_CODE,
+                      compress_frame, convert_drawing, decode_binary_stroke,
+                      decode_frame, frame_header, type_code)
+
+LINE_CODE = type_code('line')
+CLEAR_CODE = type_code('clear')
+# 보드에 쌓는 그리기 메시지 (선 조각과 폴리라인)
+DRAWING_CODES = (LINE_CODE, STROKE_CODE, STROKE_BIN_CODE)
+
+# snapshot 프레임 하나에 담을 최대 크기 (넘으면 여러 프레임으로 나눠 보냄)
+SNAPSHOT_CHUNK_SIZE = 1024 * 1024
+
+# 보드에 선이 이만큼 쌓이면 방의 클라이언트에게 래스터 체크포인트를 요청
+CHECKPOINT_LINES = 20000
+# 요청한 체크포인트가 이 시간(초) 안에 오지 않으면 다시 요청
+CHECKPOINT_RETRY = 10.0
+# 체크포인트 이미지(base64 PNG) 최대 크기
+MAX_CHECKPOINT_SIZE = 8 * 1024 * 1024
+# 체크포인트 이미지로 받는 캔버스 크기 (너비, 높이)
+# 최소는 클라이언트 캔버스의 최소 크기(client.DrawingCanvas)이고, 클라이언트는 이전 체크포인트
+# 위에 그리므로 이전 체크포인트보다 작은 이미지도 받지 않는다
+MIN_CANVAS_SIZE = (600, 400)
+MAX_CANVAS_SIZE = (8192, 8192)
+# PNG 시그니처와 IHDR 청크 앞부분 (이미지 너비, 높이를 읽는 데 필요한 만큼)
+PNG_HEADER = struct.Struct('!8sI4sII')
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class Board:
+    # 방 하나의 그림판 상태 (서버가 기준)
+    # 받은 선 프레임을 순서대로 쌓고, clear가 오면 그 앞의 선은 모두 버려서
+    # 항상 "마지막 clear 이후의 선"만 남도록 압축한다.
+    # 선이 많이 쌓이면 클라이언트가 그려 준 체크포인트 이미지로 앞부분을 대신하므로
+    # 보관 크기는 세션 길이가 아니라 캔버스 크기에 비례한다.
+    # 이미지 밖으로 나가는 선은 접지 않고 이미지 뒤에 남기므로 그 선들만 그린 순서가 바뀐다 (fold)
+    # 프레임은 파싱하지 않고 원본 바이트로 보관하므로 스냅샷은 이어 붙이기만 하면 된다.
+
+    def __init__(self):
+        self.lines = []  # 헤더를 포함한 line/stroke 프레임(bytes)
+        self.size = 0  # 보관 중인 프레임 바이트 합
+        self.compacted = 0  # clear나 체크포인트로 정리한 선 수
+        self.first_seq = 0  # lines[0]의 일련번호 (보드가 생긴 뒤 받은 선 순서)
+        self.checkpoint = None  # first_seq 이전 선들을 그린 checkpoint 프레임(bytes)
+        self.kept = 0  # 마지막 체크포인트 직후 남은 선 수 (이미지 밖이라 접지 못한 선 포함)
+        self.canvas = None  # 체크포인트 이미지의 (너비, 높이)
+        # 체크포인트를 요청한 시각과, 요청받은 연결 번호와 일련번호 (이 둘이 맞는 응답만 적용)
+        self.requested_at = None
+        self.requested_by = None
+        self.requested_seq = None
+        # 기록 워커(cluster.py)의 부탁으로 대신 요청한 것이면 그 요청 번호
+        self.requested_for = None
+        # 마지막으로 체크포인트를 요청한 연결 번호 (답하지 않는 연결에만 거듭 요청하지 않도록
+        # 다음 요청은 그다음 연결에게)
+        self.asked = None
+        self.folding = None  # 받아서 접는 중인 체크포인트의 일련번호
+        # (그리기 수준, 압축 여부) -> 만들어 둔 snapshot 프레임 목록 (보드가 바뀌면 비움)
+        # 재시작 직후처럼 여러 연결이 같은 보드를 받을 때 한 번만 만들고 압축하도록
+        self.snapshot_cache = {}
+
+    @property
+    def next_seq(self):
+        return self.first_seq + len(self.lines)
+
+    def add_line(self, frame, copy=True):
+        if copy:
+            frame = bytes(frame)  # 수신 버퍼를 붙잡지 않도록 복사해서 보관
+        self.lines.append(frame)
+        self.size += len(frame)
+        if self.snapshot_cache:
+            self.snapshot_cache = {}
+
+    def load(self, first_seq, checkpoint, lines):
+        # 디스크에서 복원한 보드 (board_store.py - 프레임은 파일 매핑의 memoryview)
+        self.first_seq = first_seq
+        self.checkpoint = checkpoint
+        self.canvas = None
+        if checkpoint is not None:
+            message = decode_frame(checkpoint)
+            if message is not None and isinstance(message.get('image'), str):
+                self.canvas = checkpoint_size(message['image'])
+        self.lines = lines
+        self.size = sum(len(line) for line in lines)
+        self.snapshot_cache = {}
+
+    def clear(self):
+        self.compacted += len(self.lines)
+        self.first_seq = self.next_seq
+        self.lines = []
+        self.size = 0
+        self.checkpoint = None
+        self.kept = 0
+        self.canvas = None
+        self.snapshot_cache = {}
+        self.cancel_request()
+
+    def needs_checkpoint(self, now):
+        if len(self.lines) - self.kept < CHECKPOINT_LINES:
+            return False
+        return self.requested_at is None or \
+            now - self.requested_at > CHECKPOINT_RETRY
+
+    def request(self, connection_id, now, requested_for=None):
+        # connection_id번 연결에 지금까지의 선을 그려 달라고 요청함 -> 요청한 일련번호
+        # connection_id가 None이면 이 프로세스에 그려 줄 연결이 없어 다른 워커에 부탁한 것
+        self.requested_at = now
+        self.requested_by = connection_id
+        if connection_id is not None:
+            self.asked = connection_id
+        self.requested_seq = self.next_seq
+        self.requested_for = requested_for
+        self.folding = None
+        return self.requested_seq
+
+    def cancel_request(self):
+        self.requested_at = None
+        self.requested_by = None
+        self.requested_seq = None
+        self.requested_for = None
+        self.folding = None
+
+    def accepts_canvas(self, size):
+        # 체크포인트 이미지 크기(너비, 높이)가 이 보드의 캔버스로 받을 만한지
+        if size is None:
+            return False
+        minimum = MIN_CANVAS_SIZE
+        if self.canvas is not None:
+            minimum = (max(minimum[0], self.canvas[0]),
+                       max(minimum[1], self.canvas[1]))
+        return all(low <= value <= high for low, value, high
+                   in zip(minimum, size, MAX_CANVAS_SIZE))
+
+    def accept_checkpoint(self, connection_id, seq):
+        # 요청한 연결이 요청한 일련번호로 보낸 응답이면 이미지로 접을 선 목록(복사본), 아니면 None
+        # 접기(fold)는 이미지 밖으로 나가는 선을 가려낸 뒤에 하므로 그동안 같은 응답은 다시 받지 않는다
+        if connection_id is None or connection_id != self.requested_by or \
+                seq != self.requested_seq or \
+                not self.first_seq < seq <= self.next_seq:
+            return None
+        self.requested_by = None
+        self.requested_seq = None
+        self.folding = seq
+        return self.lines[:seq - self.first_seq]
+
+    def accept_remote(self, seq):
+        # 다른 워커에 부탁한 체크포인트(요청 일련번호 seq)의 응답이면 begin_fold(), 아니면 None
+        if self.requested_at is None or self.requested_by is not None or \
+                seq is None or seq != self.requested_seq:
+            return None
+        return self.begin_fold()
+
+    def begin_fold(self):
+        # 다른 워커가 그린 체크포인트로 지금까지의 선을 접기 시작 -> (일련번호, 선 목록 복사본)
+        # 어느 선이 이미지에 들어갔는지는 다이제스트로 가려낸다 (match_plan)
+        seq = self.next_seq
+        self.requested_by = None
+        self.requested_seq = None
+        self.requested_for = None
+        self.folding = seq
+        return seq, list(self.lines)
+
+    def fold(self, seq, frame, outside, size):
+        # seq번 이전의 선을 size 크기의 체크포인트 이미지로 대신함
+        # outside: 접을 선 중 이미지에 들어가지 않아 남겨 둘 선의 위치 (fold_plan, match_plan)
+        # 남긴 선은 서로의 순서를 지킨 채 이미지 바로 뒤로 옮겨진다. 이미지 안쪽 픽셀에 닿지 않는
+        # 선은 그려도 결과가 같고, 이미지 가장자리에 걸친 선만 안쪽 부분이 그 뒤에 접힌 선 위에
+        # 다시 그려진다 (선 하나를 이미지 경계에서 자를 수 없으므로 받아들이는 차이)
+        # 그 사이 clear가 있었으면 무시
+        if self.folding != seq or not self.first_seq < seq <= self.next_seq:
+            return False
+        count = seq - self.first_seq
+        kept = [self.lines[i] for i in outside]
+        self.size -= sum(len(line) for line in self.lines[:count])
+        self.size += sum(len(line) for line in kept)
+        self.lines[:count] = kept
+        self.compacted += count - len(kept)
+        self.first_seq = seq - len(kept)
+        self.checkpoint = bytes(frame)
+        self.canvas = size
+        self.kept = len(self.lines)
+        self.snapshot_cache = {}
+        self.cancel_request()
+        return True
+
+    def snapshot_frames(self, level, compress=False, stats=None):
+        # 현재 보드의 snapshot 프레임 목록 (보드가 그대로면 만들어 둔 것을 재사용)
+        # compress: 압축을 협상한 연결용으로 미리 압축해 둠 (stats: CompressionStats)
+        key = (level, compress)
+        frames = self.snapshot_cache.get(key)
+        if frames is None:
+            frames = self.build_snapshot(level)
+            if compress:
+                frames = [compress_frame(frame, stats) for frame in frames]
+            self.snapshot_cache[key] = frames
+        return frames
+
+    def build_snapshot(self, level):
+        # 현재 보드를 받는 연결의 그리기 수준(level)에 맞는 snapshot 프레임 목록으로 만든다
+        # 프레임 모드: snapshot 프레임의 페이로드 = 선 프레임들을 그대로 이어 붙인 것
+        # 예전 클라이언트: 선 JSON을 이어 붙여 한 번에 보냄 (write_frame이 헤더를 뗀다)
+        # 체크포인트 이미지는 프레임 모드 클라이언트에게만 맨 앞에 넣어 보낸다
+        frames = []
+        chunk = []
+        chunk_size = 0
+        if level >= DRAWING_STROKE and self.checkpoint is not None:
+            chunk.append(self.checkpoint)
+            chunk_size = len(self.checkpoint)
+        for line in self.lines:
+            # 받는 쪽이 모르는 형식(폴리라인, 바이너리)은 아는 형식으로 풀어서 보냄
+            line = convert_drawing(line[1], line, level)
+            if line is None:
+                continue
+            if level == DRAWING_LEGACY:
+                line = memoryview(line)[HEADER_SIZE:]
+            if chunk and chunk_size + len(line) > SNAPSHOT_CHUNK_SIZE:
+                frames.append(snapshot_frame(chunk, chunk_size))
+                chunk = []
+                chunk_size = 0
+            chunk.append(line)
+            chunk_size += len(line)
+        if chunk:
+            frames.append(snapshot_frame(chunk, chunk_size))
+        return frames
+
+
+def checkpoint_size(image):
+    # base64 PNG 체크포인트 이미지의 (너비, 높이), PNG가 아니면 None
+    try:
+        header = base64.b64decode(image[:32], validate=True)
+        signature, _, chunk, width, height = \
+            PNG_HEADER.unpack(header[:PNG_HEADER.size])
+    except (binascii.Error, ValueError, struct.error):
+        return None
+    if signature != PNG_SIGNATURE or chunk != b'IHDR':
+        return None
+    return width, height
+
+
+def line_bounds(line):
+    # 선 프레임이 칠하는 범위 (왼쪽, 위, 오른쪽, 아래), 그릴 수 없는 프레임이면 None
+    code = line[1]
+    if code == STROKE_BIN_CODE:
+        data = decode_binary_stroke(line)
+    else:
+        data = decode_frame(line)
+    try:
+        if code == LINE_CODE:
+            xs = (data['x1'], data['x2'])
+            ys = (data['y1'], data['y2'])
+        else:
+            xs = data['points'][0::2]
+            ys = data['points'][1::2]
+        pad = data['width'] // 2 + 1
+        return min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def outside_positions(lines, size):
+    # 선 목록 중 size(너비, 높이) 이미지 밖으로 나가는 선의 위치
+    # 선마다 파싱하므로 이벤트 루프가 아니라 실행기 스레드에서 부른다
+    # (그릴 수 없는 선은 이미지 안에 있는 것으로 봐서 접어 버림)
+    width, height = size
+    positions = []
+    for i, line in enumerate(lines):
+        bounds = line_bounds(line)
+        if bounds is not None and (bounds[2] >= width or bounds[3] >= height):
+            positions.append(i)
+    return positions
+
+
+def line_digest(line):
+    # 선 프레임의 64비트 다이제스트
+    # 워커마다 선을 받은 순서가 달라 일련번호로는 같은 선을 가리킬 수 없으므로 이것으로 맞춘다
+    return int.from_bytes(hashlib.blake2b(line, digest_size=8).digest(), 'big')
+
+
+def fold_plan(lines, size):
+    # 클라이언트가 그린 size 이미지로 lines를 접을 때
+    # -> (남겨 둘 선의 위치, 이미지로 접히는 선의 다이제스트 목록)
+    outside = outside_positions(lines, size)
+    skip = set(outside)
+    return outside, [line_digest(line) for i, line in enumerate(lines)
+                     if i not in skip]
+
+
+def match_plan(lines, digests):
+    # 다른 워커가 접은 선(digests, 다이제스트 집합)에 맞춰 lines를 접을 때 -> fold_plan과 같은 형식
+    # 아직 이 워커에 오지 않았거나 그쪽에 없던 선은 남겨 둔다
+    kept = []
+    folded = []
+    for i, line in enumerate(lines):
+        digest = line_digest(line)
+        if digest in digests:
+            folded.append(digest)
+        else:
+            kept.append(i)
+    return kept, folded
+
+
+def snapshot_frame(chunk, size):
+    return memoryview(b''.join([frame_header(SNAPSHOT_CODE, size)] + chunk))
@@ -0,0 +1,293 @@
+import mmap
+import os
+import struct
+import time
+
+from board import CLEAR_CODE, DRAWING_CODES, Board
+from protocol import FRAME_HEADER, HEADER_SIZE, PROTOCOL_VERSION
+from writer_thread import WriterThread
+
+# 방마다 파일 두 개 (파일 이름은 방 이름 UTF-8의 16진수)
+#   <방>.snap: 헤더(매직, 세대, 첫 선 일련번호, 체크포인트 길이) + 체크포인트 프레임 + 선 프레임들
+#   <방>.log : 헤더(매직, 세대) + 스냅샷 이후 받은 선/지우기 프레임들 (받은 그대로 이어 붙임)
+# 스냅샷을 새로 쓸 때마다 세대를 올리고 로그를 새 세대로 비운다.
+# 스냅샷만 바뀌고 로그를 비우기 전에 죽었다면 로그 세대가 달라서 무시되므로 선이 두 번 들어가지 않는다.
+SNAPSHOT_HEADER = struct.Struct('!4sQQI')
+SNAPSHOT_MAGIC = b'BSv1'
+LOG_HEADER = struct.Struct('!4sQ')
+LOG_MAGIC = b'BLv1'
+SNAPSHOT_SUFFIX = '.snap'
+LOG_SUFFIX = '.log'
+
+# 쓰기 스레드가 한 번에 모아 쓰는 최대 작업 수와, 로그를 디스크까지 내리는(fsync) 최소 간격(초)
+WRITE_BATCH = 1000
+FSYNC_INTERVAL = 1.0
+# 스냅샷 이후 로그에 이만큼 붙으면 스냅샷을 새로 써서 로그를 비움 (재시작 때 다시 읽을 로그를 제한)
+# 보드 전체를 다시 쓰는 비용이 그동안 붙인 양을 넘지 않도록 로그가 직전 스냅샷보다 작으면 미룸
+SNAPSHOT_LOG_LINES = 100000
+SNAPSHOT_LOG_BYTES = 16 * 1024 * 1024
+
+
+class BoardStore(WriterThread):
+    # 보드를 디스크에 남기는 쓰기 전용 저장소
+    # 이벤트 루프는 큐에 넣기만 하고, 파일 쓰기는 전용 스레드가 몰아서 한다.
+    # 큐에 쌓인 선은 방별로 묶어 write 한 번으로 로그에 붙인다.
+    # 로그가 충분히 자랐는지는 이벤트 루프 쪽에서 세고(needs_snapshot), 스냅샷은 호출한 쪽이 요청한다.
+
+    batch_size = WRITE_BATCH
+    name = '보드 저장'
+
+    def __init__(self, directory, generations=None):
+        super().__init__()
+        self.directory = directory
+        # 방 이름 -> 지금 로그의 세대 (load_boards가 복원하면서 알려 줌)
+        self.generations = dict(generations or {})
+        self.logs = {}  # 방 이름 -> 열어 둔 로그 파일
+        self.synced_at = 0.0
+        self.written = 0  # 로그에 쓴 바이트 수
+        self.snapshots = 0  # 새로 쓴 스냅샷 수
+        # 방 이름 -> [스냅샷 이후 로그에 붙인 선 수, 바이트], 마지막 스냅샷 크기
+        # (이벤트 루프에서만 바꿈 - 재시작했으면 이어 쓸 로그와 스냅샷 파일 크기부터)
+        self.log_sizes = {}
+        self.snapshot_sizes = {}
+        for room in self.generations:
+            self.log_sizes[room] = [0, max(0, file_size(
+                room_path(directory, room, LOG_SUFFIX)) - LOG_HEADER.size)]
+            self.snapshot_sizes[room] = file_size(
+                room_path(directory, room, SNAPSHOT_SUFFIX))
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        super().start()
+
+    def append(self, room, frame):
+        # 보드에 더한 선/지우기 프레임 (bytes 또는 읽기 전용 memoryview)
+        self.tasks.put(('append', room, frame))
+        size = self.log_sizes.setdefault(room, [0, 0])
+        size[0] += 1
+        size[1] += len(frame)
+
+    def needs_snapshot(self, room):
+        lines, size = self.log_sizes.get(room, (0, 0))
+        return (lines >= SNAPSHOT_LOG_LINES or size >= SNAPSHOT_LOG_BYTES) and \
+            size >= self.snapshot_sizes.get(room, 0)
+
+    def snapshot(self, room, board):
+        # 보드 전체를 새 스냅샷으로 (clear나 체크포인트로 보드가 줄어든 뒤, 로그가 많이 자랐을 때)
+        # 프레임 목록은 지금 시점의 것을 복사해서 넘기고, 파일로 만드는 것은 쓰기 스레드에서
+        self.tasks.put(('snapshot', room, (board.first_seq, board.checkpoint,
+                                           list(board.lines))))
+        self.log_sizes[room] = [0, 0]
+        self.snapshot_sizes[room] = SNAPSHOT_HEADER.size + \
+            len(board.checkpoint or b'') + board.size
+
+    def process(self, tasks):
+        appends = {}  # 방 이름 -> 로그에 붙일 프레임들 (순서 유지)
+        for kind, room, data in tasks:
+            if kind == 'append':
+                appends.setdefault(room, []).append(data)
+                continue
+            # 스냅샷 전에 받은 선은 이전 로그에 먼저 씀 (스냅샷에도 들어 있음)
+            self.write_logs(appends)
+            appends = {}
+            self.write_snapshot(room, *data)
+        self.write_logs(appends)
+        self.sync()
+
+    def teardown(self):
+        self.sync(force=True)
+        for log in self.logs.values():
+            log.close()
+        self.logs = {}
+
+    def write_logs(self, appends):
+        for room, frames in appends.items():
+            try:
+                log = self.open_log(room)
+                data = b''.join(frames)
+                log.write(data)
+                log.flush()
+                self.written += len(data)
+            except OSError as e:
+                print(f"보드 로그 쓰기 실패({room}): {e}")
+
+    def open_log(self, room):
+        log = self.logs.get(room)
+        if log is None:
+            path = room_path(self.directory, room, LOG_SUFFIX)
+            if room in self.generations and os.path.exists(path):
+                log = open(path, 'ab')
+            else:
+                # 처음 보는 방이면 스냅샷 없이 0세대 로그부터 시작
+                generation = self.generations.setdefault(room, 0)
+                log = open(path, 'wb')
+                log.write(LOG_HEADER.pack(LOG_MAGIC, generation))
+            self.logs[room] = log
+        return log
+
+    def write_snapshot(self, room, first_seq, checkpoint, lines):
+        generation = self.generations.get(room, 0) + 1
+        snapshot_path = room_path(self.directory, room, SNAPSHOT_SUFFIX)
+        log_path = room_path(self.directory, room, LOG_SUFFIX)
+        checkpoint = checkpoint or b''
+        try:
+            with open(snapshot_path + '.tmp', 'wb') as f:
+                f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, generation,
+                                             first_seq, len(checkpoint)))
+                f.write(checkpoint)
+                f.write(b''.join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(snapshot_path + '.tmp', snapshot_path)
+            # 새 스냅샷이 디스크에 남은 뒤에 로그를 비워야 전원 장애 때 이전 로그의 선을 잃지 않음
+            sync_directory(self.directory)
+
+            old = self.logs.pop(room, None)
+            if old is not None:
+                old.close()
+            with open(log_path + '.tmp', 'wb') as f:
+                f.write(LOG_HEADER.pack(LOG_MAGIC, generation))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(log_path + '.tmp', log_path)
+            sync_directory(self.directory)
+        except OSError as e:
+            print(f"보드 스냅샷 쓰기 실패({room}): {e}")
+            return
+        self.generations[room] = generation
+        self.snapshots += 1
+
+    def sync(self, force=False):
+        # 로그를 디스크까지 내림 (프로세스가 죽어도 OS 버퍼에 남지만 전원 장애 대비)
+        now = time.monotonic()
+        if not force and now - self.synced_at < FSYNC_INTERVAL:
+            return
+        self.synced_at = now
+        for room, log in self.logs.items():
+            try:
+                os.fsync(log.fileno())
+            except OSError as e:
+                print(f"보드 로그 fsync 실패({room}): {e}")
+
+
+def room_path(directory, room, suffix):
+    return os.path.join(directory, room.encode('utf-8').hex() + suffix)
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def sync_directory(directory):
+    # os.replace로 바꾼 파일 이름을 디스크까지 내림 (디렉터리를 열 수 없는 Windows는 건너뜀)
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def map_file(path):
+    # 파일 전체를 읽기 전용으로 메모리 매핑 (없거나 비어 있으면 None)
+    # 프레임은 이 매핑의 memoryview 조각으로 보드에 들어가므로 복사하지 않는다
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except FileNotFoundError:
+        return None
+
+
+def split_frames(view, offset):
+    # view[offset:]의 프레임 목록 (타입 코드, memoryview)과 마지막 온전한 프레임의 끝 위치
+    # 쓰다가 죽어서 잘린 마지막 프레임이나 깨진 헤더 뒤는 버린다
+    frames = []
+    size = len(view)
+    while size - offset >= HEADER_SIZE:
+        version, code, length = FRAME_HEADER.unpack_from(view, offset)
+        end = offset + HEADER_SIZE + length
+        if version != PROTOCOL_VERSION or end > size:
+            break
+        frames.append((code, view[offset:end]))
+        offset = end
+    return frames, offset
+
+
+def load_board(directory, room, repair=False):
+    # 스냅샷과 같은 세대의 로그를 이어서 보드 하나를 복원 -> (보드, 세대)
+    # repair: 이어 쓸 프로세스라면 잘린 로그 꼬리를 잘라내고, 없거나 이전 세대인 로그는
+    # 스냅샷 세대로 새로 만든다 (읽기만 하는 워커는 파일을 건드리지 않음)
+    board = Board()
+    generation = 0
+    snapshot = map_file(room_path(directory, room, SNAPSHOT_SUFFIX))
+    if snapshot is not None and len(snapshot) >= SNAPSHOT_HEADER.size:
+        magic, generation, first_seq, checkpoint_size = \
+            SNAPSHOT_HEADER.unpack_from(snapshot)
+        if magic == SNAPSHOT_MAGIC:
+            offset = SNAPSHOT_HEADER.size
+            checkpoint = snapshot[offset:offset + checkpoint_size] or None
+            frames, _ = split_frames(snapshot, offset + checkpoint_size)
+            board.load(first_seq, checkpoint, [frame for _, frame in frames])
+        else:
+            generation = 0
+
+    log_path = room_path(directory, room, LOG_SUFFIX)
+    log = map_file(log_path)
+    if log is not None and len(log) >= LOG_HEADER.size:
+        magic, log_generation = LOG_HEADER.unpack_from(log)
+        if magic == LOG_MAGIC and log_generation == generation:
+            frames, end = split_frames(log, LOG_HEADER.size)
+            for code, frame in frames:
+                if code in DRAWING_CODES:
+                    board.add_line(frame, copy=False)
+                elif code == CLEAR_CODE:
+                    board.clear()
+            if repair and end < len(log):
+                # 잘린 꼬리를 잘라내야 이어 쓴 선이 그 뒤에 묻히지 않음
+                # (매핑은 end 앞쪽만 쓰므로 파일을 줄여도 안전)
+                os.truncate(log_path, end)
+            return board, generation
+    # 로그가 없거나 이전 세대 - 스냅샷만으로 복원
+    if repair:
+        with open(log_path + '.tmp', 'wb') as f:
+            f.write(LOG_HEADER.pack(LOG_MAGIC, generation))
+        os.replace(log_path + '.tmp', log_path)
+    return board, generation
+
+
+def load_boards(directory, repair=False):
+    # 디렉터리의 모든 보드 복원 -> ({방 이름: 보드}, {방 이름: 이어 쓸 로그 세대})
+    boards = {}
+    generations = {}
+    if not os.path.isdir(directory):
+        return boards, generations
+    started = time.perf_counter()
+    names = set()
+    for name in os.listdir(directory):
+        stem, suffix = os.path.splitext(name)
+        if suffix in (SNAPSHOT_SUFFIX, LOG_SUFFIX):
+            names.add(stem)
+    for stem in sorted(names):
+        try:
+            room = bytes.fromhex(stem).decode('utf-8')
+        except ValueError:
+            continue
+        try:
+            board, generation = load_board(directory, room, repair)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"보드 복원 실패({room}): {e}")
+            continue
+        if board.lines or board.checkpoint is not None:
+            boards[room] = board
+        generations[room] = generation
+    if boards:
+        print(f"보드 {len(boards)}개 복원: 선 "
+              f"{sum(len(board.lines) for board in boards.values())}개, "
+              f"{(time.perf_counter() - started) * 1000:.0f}ms")
+    return boards, generations
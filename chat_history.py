@@ -0,0 +1,250 @@
+import sqlite3
+import time
+
+from protocol import decode_frame
+from writer_thread import WriterThread
+
+# 한 번에 돌려줄 채팅 기록 수 (클라이언트가 더 달라고 해도 MAX_PAGE_SIZE까지만)
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# 쓰기 스레드가 한 트랜잭션에 모아 넣는 최대 메시지 수
+WRITE_BATCH = 500
+# 기록 번호로 받을 수 있는 최대값 (SQLite 정수 범위, 넘으면 OverflowError)
+MAX_MESSAGE_ID = 2 ** 63 - 1
+
+# 검색 - 방에서 가장 최근에 일치한 SEARCH_CANDIDATES개 안에서만 bm25 순위를 매긴다
+# (흔한 단어도 전체 일치 건수와 관계없이 몇 ms 안에 끝나도록)
+# 그보다 오래된 일치는 순위 없이 최근 것부터 기록 번호 순으로 이어서 돌려준다
+SEARCH_CANDIDATES = 1000
+MAX_SEARCH_TERMS = 8
+MAX_QUERY_LENGTH = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat (
+    id INTEGER PRIMARY KEY,
+    room TEXT NOT NULL,
+    ts REAL NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_room ON chat (room, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_fts USING fts5 (
+    message, content='chat', content_rowid='id',
+    tokenize='unicode61', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS chat_fts_insert AFTER INSERT ON chat BEGIN
+    INSERT INTO chat_fts (rowid, message) VALUES (new.id, new.message);
+END;
+"""
+
+SEARCH_SQL = f"""
+SELECT id, ts, message FROM (
+    SELECT f.rowid AS id, f.rank AS score, c.ts AS ts, c.message AS message
+    FROM chat_fts f CROSS JOIN chat c ON c.id = f.rowid
+    WHERE chat_fts MATCH ? AND c.room = ?
+    ORDER BY f.rowid DESC LIMIT {SEARCH_CANDIDATES}
+) ORDER BY score LIMIT ? OFFSET ?
+"""
+
+# 순위를 매기는 범위의 일치 수와 그중 가장 오래된 기록 번호
+SEARCH_WINDOW_SQL = f"""
+SELECT count(*), min(id) FROM (
+    SELECT f.rowid AS id
+    FROM chat_fts f CROSS JOIN chat c ON c.id = f.rowid
+    WHERE chat_fts MATCH ? AND c.room = ?
+    ORDER BY f.rowid DESC LIMIT {SEARCH_CANDIDATES}
+)
+"""
+
+SEARCH_OLDER_SQL = """
+SELECT f.rowid, c.ts, c.message
+FROM chat_fts f CROSS JOIN chat c ON c.id = f.rowid
+WHERE chat_fts MATCH ? AND c.room = ? AND f.rowid < ?
+ORDER BY f.rowid DESC LIMIT ?
+"""
+
+
+class ChatHistory(WriterThread):
+    # 방별 채팅 기록 저장소 (SQLite)
+    # 이벤트 루프는 큐에 넣기만 하고, 쓰기와 페이지 조회는 전용 스레드 하나가 순서대로 처리한다.
+    # 조회도 같은 스레드에서 하므로 방금 보낸 채팅이 다음 페이지에서 빠지는 일이 없다.
+    # 큐에 몰려 있던 쓰기는 한 트랜잭션으로 묶어서 넣는다.
+    # 여러 워커 프로세스가 같은 파일을 써도 되도록 WAL 모드로 연다.
+    # 검색용 FTS5 색인은 트리거로 같은 트랜잭션 안에서 함께 갱신된다.
+
+    batch_size = WRITE_BATCH
+    name = '채팅 기록'
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.db = None  # 기록 스레드의 연결
+        self.written = 0  # 저장한 메시지 수
+        self.pages = 0  # 처리한 페이지 조회 수
+        self.searches = 0  # 처리한 검색 수
+        self.readers = {'page': self.query, 'search': self.search_query}
+
+    def start(self):
+        # 파일을 열 수 없으면 서버 시작 단계에서 바로 알 수 있도록 먼저 한 번 열어 봄
+        self.connect().close()
+        super().start()
+
+    def append(self, room, frame):
+        # chat 프레임을 기록 (파싱은 쓰기 스레드에서)
+        self.tasks.put(('write', (room, time.time(), bytes(frame))))
+
+    def page(self, room, before, since, limit, callback, live=0):
+        # room의 기록 중 before번보다 앞의 최근 limit개를
+        # 오래된 것부터 callback(메시지 목록, 더 있는지)으로 돌려줌 - 쓰기 스레드에서 호출된다
+        # before가 None이면 since 시각(방에 들어온 시각) 이후 기록 중 live번째보다 앞
+        # (클라이언트가 실시간으로 받았다가 앞에서부터 지운 live개도 다시 가져가도록)
+        self.tasks.put(('page', (room, before, since, limit, callback, False, live)))
+
+    def history_after(self, room, after, limit, callback):
+        # room의 기록 중 after번 다음부터 limit개 (검색 결과로 옮겨 간 뒤 아래로 스크롤할 때)
+        self.tasks.put(('page', (room, after, None, limit, callback, True)))
+
+    def search(self, room, text, offset, limit, callback, before=None):
+        # room의 기록에서 text를 찾아 순위순으로 offset번째부터 limit개를
+        # callback(결과 목록, 더 있는지)으로 돌려줌 - 쓰기 스레드에서 호출된다
+        # 순위 범위를 넘으면 시간순 결과(ranked=False)가 이어지고, 그 다음 페이지는
+        # before(마지막으로 받은 시간순 결과의 번호)로 요청한다 (offset은 결과 번호로만 씀)
+        self.tasks.put(('search', (room, text, offset, limit, callback, before)))
+
+    def connect(self):
+        db = sqlite3.connect(self.path)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute('PRAGMA busy_timeout=5000')
+        indexed = db.execute("SELECT 1 FROM sqlite_master "
+                             "WHERE name = 'chat_fts'").fetchone()
+        db.executescript(SCHEMA)
+        if not indexed:
+            # 검색 색인이 생기기 전에 쌓인 기록도 색인
+            with db:
+                db.execute("INSERT INTO chat_fts (chat_fts) VALUES ('rebuild')")
+        return db
+
+    def setup(self):
+        self.db = self.connect()
+
+    def process(self, tasks):
+        writes = []
+        for kind, args in tasks:
+            if kind == 'write':
+                writes.append(args)
+                continue
+            # 조회 전에 앞서 들어온 쓰기를 먼저 반영
+            self.write(self.db, writes)
+            writes = []
+            try:
+                self.readers[kind](self.db, *args)
+            except Exception as e:
+                # 잘못된 요청 하나 때문에 기록 스레드가 멈추지 않도록
+                print(f"채팅 기록 요청 처리 중 오류({kind}): {e}")
+        self.write(self.db, writes)
+
+    def teardown(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def write(self, db, writes):
+        rows = []
+        for room, ts, frame in writes:
+            message = decode_frame(frame)
+            if message is not None and isinstance(message.get('message'), str):
+                rows.append((room, ts, message['message']))
+        if not rows:
+            return
+        try:
+            with db:
+                db.executemany(
+                    'INSERT INTO chat (room, ts, message) VALUES (?, ?, ?)', rows)
+        except Exception as e:
+            print(f"채팅 기록 저장 실패({len(rows)}개): {e}")
+            return
+        self.written += len(rows)
+
+    def query(self, db, room, anchor, since, limit, callback, newer=False,
+              live=0):
+        # anchor번보다 앞(newer면 뒤)의 기록을 오래된 것부터 limit개
+        # anchor가 None이면 since 시각 이후 live번째 기록보다 앞 (live가 0이면 since 시각 이전)
+        # 한 개 더 읽어서 그 너머에 기록이 더 있는지 판단하고,
+        # 실패해도 빈 페이지를 돌려줘서 클라이언트가 응답을 계속 기다리지 않게 함
+        try:
+            if newer:
+                rows = db.execute(
+                    'SELECT id, ts, message FROM chat WHERE room = ? AND id > ? '
+                    'ORDER BY id LIMIT ?', (room, anchor, limit + 1)).fetchall()
+            else:
+                if anchor is None and live:
+                    row = db.execute(
+                        'SELECT id FROM chat WHERE room = ? AND ts >= ? '
+                        'ORDER BY id LIMIT 1 OFFSET ?', (room, since, live)).fetchone()
+                    if row is not None:
+                        anchor = row[0]
+                if anchor is not None:
+                    rows = db.execute(
+                        'SELECT id, ts, message FROM chat WHERE room = ? AND id < ? '
+                        'ORDER BY id DESC LIMIT ?', (room, anchor, limit + 1)).fetchall()
+                else:
+                    rows = db.execute(
+                        'SELECT id, ts, message FROM chat WHERE room = ? AND ts < ? '
+                        'ORDER BY id DESC LIMIT ?', (room, since, limit + 1)).fetchall()
+        except (sqlite3.Error, OverflowError) as e:
+            print(f"채팅 기록 조회 실패: {e}")
+            rows = []
+        self.pages += 1
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if not newer:
+            rows.reverse()
+        messages = [{'id': id, 'ts': ts, 'message': message}
+                    for id, ts, message in rows]
+        self.reply(callback, messages, more)
+
+    def search_query(self, db, room, text, offset, limit, callback, before):
+        query = match_query(text)
+        ranked = []
+        older = []
+        if query is not None:
+            try:
+                if before is None:
+                    ranked = db.execute(SEARCH_SQL,
+                                        (query, room, limit + 1, offset)).fetchall()
+                    if len(ranked) <= limit:
+                        # 순위 범위가 이 페이지에서 끝남 - 범위가 꽉 찼으면 그 앞부터 이어서
+                        count, before = db.execute(SEARCH_WINDOW_SQL,
+                                                   (query, room)).fetchone()
+                        if count < SEARCH_CANDIDATES:
+                            before = None
+                if before is not None and len(ranked) <= limit:
+                    older = db.execute(SEARCH_OLDER_SQL,
+                                       (query, room, before,
+                                        limit + 1 - len(ranked))).fetchall()
+            except (sqlite3.Error, OverflowError) as e:
+                print(f"채팅 검색 실패({text!r}): {e}")
+        self.searches += 1
+        # offset: 검색 결과 안에서의 번호 (다음 페이지 요청과 결과 표시에 사용)
+        rows = [row + (True,) for row in ranked] + [row + (False,) for row in older]
+        hits = [{'id': id, 'ts': ts, 'message': message, 'offset': offset + i,
+                 'ranked': is_ranked}
+                for i, (id, ts, message, is_ranked) in enumerate(rows[:limit])]
+        self.reply(callback, hits, len(rows) > limit)
+
+    def reply(self, callback, results, more):
+        try:
+            callback(results, more)
+        except Exception as e:
+            print(f"채팅 기록 전달 중 오류: {e}")
+
+
+def match_query(text):
+    # 입력한 단어들을 모두 포함하는 FTS5 질의로 (각 단어는 그 단어로 시작하는 토큰과 일치)
+    # '회의'가 '회의에서'와 맞도록 접두어로 찾고, 한 글자는 너무 많이 맞으므로 그대로 찾는다.
+    # 따옴표로 감싸서 사용자가 넣은 FTS 문법 문자는 일반 글자로 다룬다.
+    terms = str(text)[:MAX_QUERY_LENGTH].split()[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    return ' '.join('"' + term.replace('"', '""') + '"' + ('*' if len(term) > 1 else '')
+                    for term in terms)
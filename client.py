@@ -2,26 +2,89 @@ import os
 import sys
 import socket
 import threading
+import time
 import json
+import base64
+from collections import OrderedDict, deque
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QPushButton, QLineEdit, QTextEdit,
                              QLabel, QColorDialog, QInputDialog, QMessageBox,
-                             QListView, QStyledItemDelegate)
-from PyQt5.QtGui import QPainter, QPen, QColor, QTextDocument, QTextOption, QPixmap
-from PyQt5.QtCore import Qt, QPoint, pyqtSignal, QEvent, QCoreApplication, QSize, QMargins, QAbstractListModel
+                             QListView, QStyledItemDelegate, QAbstractItemView,
+                             QListWidget, QListWidgetItem, QStackedWidget)
+from PyQt5.QtGui import QPainter, QPen, QColor, QTextDocument, QTextOption, QPixmap, QImage, QRegion
+from PyQt5.QtCore import Qt, QPoint, pyqtSignal, QEvent, QCoreApplication, QSize, QMargins, QAbstractListModel, QModelIndex, QBuffer, QByteArray, QIODevice, QRect, QTimer, QObject
 import ssl
+from protocol import (DEFAULT_ROOM, PROTOCOL_VERSION, CompressionStats,
+                      FrameDecoder, LegacyDecoder, compress_frame,
+                      encode_message, is_framed_stream, encode_binary_stroke,
+                      normalize_room)
+from stroke_store import SegmentGrid, StrokeStore
 
 USER_ME = 0  # 자신의 메시지
 USER_THEM = 1  # 상대방의 메시지
 
 BUBBLE_COLORS = {USER_ME: "#DCF8C6", USER_THEM: "#E8E8E8"}  # 말풍선 색상
+HIT_BORDER_COLOR = "#F5A623"  # 검색 결과로 찾아간 메시지의 말풍선 테두리
 USER_TRANSLATE = {USER_ME: QPoint(20, 0), USER_THEM: QPoint(0, 0)}  # 말풍선 위치 조정
 
 BUBBLE_PADDING = QMargins(10, 5, 20, 5)
 TEXT_PADDING = QMargins(25, 15, 45, 15)
 
+# 말풍선 텍스트 레이아웃 캐시 최대 개수
+LAYOUT_CACHE_SIZE = 512
+
+# 채팅창에 보관할 최대 메시지 수 (넘으면 가장 오래된 것부터 지움)
+MESSAGE_HISTORY_LIMIT = 1000
+# 채팅창을 맨 위까지 올렸을 때 서버에서 가져올 이전 기록 수
+HISTORY_PAGE_SIZE = 50
+# 기록 요청/응답의 view - 실시간 채팅창인지, 검색 결과 위치를 보여 주는 창인지
+VIEW_LIVE = 'live'
+VIEW_CONTEXT = 'context'
+
+# 캔버스가 벡터로 들고 있을 최대 선 수 - 넘으면 오래된 선을 체크포인트 이미지로 접음
+CHECKPOINT_LINES = 5000
+CHECKPOINT_KEEP = 1000  # 접은 뒤 벡터로 남겨 둘 최근 선 수
+
+# 마우스로 그린 선 조각을 모아 보내는 주기(ms)와 점 단순화 허용 오차(px, 0이면 단순화 안 함)
+STROKE_FLUSH_MS = 30
+STROKE_TOLERANCE = 0.75
+
+# 한 번에 받아 그린 메시지가 이보다 많으면 메시지별 영역 대신 전체를 감싸는 사각형 하나만 다시 그림
+DIRTY_RECTS_MAX = 64
+
+# 이벤트 루프 지연(수신 스레드가 넣은 뒤 GUI가 꺼내기까지) 통계로 들고 있을 최근 배치 수
+EVENT_LAG_SAMPLES = 200
+
 
 class MessageDelegate(QStyledItemDelegate):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # (텍스트, 폭) -> 레이아웃이 끝난 QTextDocument - 오래 안 쓴 것부터 버림
+        # sizeHint/paint가 행마다 HTML을 다시 파싱하고 배치하지 않도록 재사용한다.
+        # 창 크기가 바뀌면 폭이 달라져 새로 배치되고, 이전 폭의 항목은 자연히 밀려난다.
+        self.layouts = OrderedDict()
+
+    def text_layout(self, text, width):
+        key = (text, width)
+        doc = self.layouts.get(key)
+        if doc is not None:
+            self.layouts.move_to_end(key)
+            return doc
+
+        toption = QTextOption()
+        toption.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+
+        doc = QTextDocument()
+        doc.setDefaultTextOption(toption)
+        doc.setHtml(f'<span style="color: black;">{text}</span>')
+        doc.setTextWidth(width)
+        doc.setDocumentMargin(0)
+
+        self.layouts[key] = doc
+        if len(self.layouts) > LAYOUT_CACHE_SIZE:
+            self.layouts.popitem(last=False)
+        return doc
+
     def paint(self, painter, option, index):
         painter.save()
         user, text, msg_type = index.model().data(index, Qt.DisplayRole)
@@ -45,20 +108,14 @@ class MessageDelegate(QStyledItemDelegate):
         bubblerect = option.rect.marginsRemoved(BUBBLE_PADDING)
         textrect = option.rect.marginsRemoved(TEXT_PADDING)
 
-        painter.setPen(Qt.NoPen)
+        painter.setPen(QPen(QColor(HIT_BORDER_COLOR), 3) if msg_type == 'hit'
+                       else Qt.NoPen)
         color = QColor(BUBBLE_COLORS[user])
         painter.setBrush(color)
         painter.drawRoundedRect(bubblerect, 15, 15)
 
         painter.setPen(Qt.black)
-        toption = QTextOption()
-        toption.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
-
-        doc = QTextDocument()
-        doc.setDefaultTextOption(toption)
-        doc.setHtml(f'<span style="color: black;">{text}</span>')
-        doc.setTextWidth(textrect.width())
-        doc.setDocumentMargin(0)
+        doc = self.text_layout(text, textrect.width())
 
         painter.translate(textrect.topLeft())
         doc.drawContents(painter)
@@ -73,15 +130,7 @@ class MessageDelegate(QStyledItemDelegate):
 
         # 일반 채팅 메시지는 기존 크기 계산 방식 사용
         textrect = option.rect.marginsRemoved(TEXT_PADDING)
-
-        toption = QTextOption()
-        toption.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
-
-        doc = QTextDocument()
-        doc.setDefaultTextOption(toption)
-        doc.setHtml(f'<span style="color: black;">{text}</span>')
-        doc.setTextWidth(textrect.width())
-        doc.setDocumentMargin(0)
+        doc = self.text_layout(text, textrect.width())
 
         textrect.setHeight(int(doc.size().height()))
         textrect = textrect.marginsAdded(TEXT_PADDING)
@@ -89,21 +138,110 @@ class MessageDelegate(QStyledItemDelegate):
 
 
 class MessageModel(QAbstractListModel):
-    def __init__(self):
+    # 채팅 메시지 목록 - 최대 limit개를 유지하는 링 버퍼
+    # 행 추가/삭제를 beginInsertRows/beginRemoveRows로 알려서 뷰가 바뀐 행만 다시 배치하고,
+    # 한 번에 몰려온 메시지는 이벤트 루프가 한 바퀴 돌 때 한 번에 추가한다.
+    # 서버에서 가져온 이전 기록은 앞쪽에 붙이며, 행마다 (who, text, msg_type, 기록 번호)를 갖는다.
+    # (실시간으로 받은 메시지는 기록 번호가 None - 앞에서 지운 실시간 채팅 수로 위치를 알림)
+
+    def __init__(self, limit=MESSAGE_HISTORY_LIMIT):
         super().__init__()
-        self.messages = []
+        self.limit = limit
+        self.messages = deque()
+        self.pending = []  # 아직 뷰에 알리지 않은 메시지
+        self.more_history = True  # 서버에 더 오래된 기록이 남아 있을 수 있는지
+        self.more_newer = False  # 더 최근 기록이 남아 있는지 (검색 결과 위치를 볼 때만)
+        self.anchor = None  # 비어 있을 때 앞뒤 기록을 가져올 기준 번호 (검색 결과 위치)
+        self.evicted_live = 0  # limit을 넘어 앞에서 지운 실시간 채팅 수
 
     def data(self, index, role):
         if role == Qt.DisplayRole:
-            return self.messages[index.row()]
+            return self.messages[index.row()][:3]
 
-    def rowCount(self, index):
-        return len(self.messages)
+    def rowCount(self, index=QModelIndex()):
+        return 0 if index.isValid() else len(self.messages)
 
     def add_message(self, who, text, msg_type='chat'):
         if text:
-            self.messages.append((who, text, msg_type))
-            self.layoutChanged.emit()
+            if not self.pending:
+                QTimer.singleShot(0, self.flush_pending)
+            self.pending.append((who, text, msg_type, None))
+
+    def flush_pending(self):
+        pending, self.pending = self.pending, []
+        self.add_messages(pending)
+
+    def add_messages(self, messages):
+        # 여러 메시지를 한 번의 행 삽입으로 추가하고 넘치는 앞쪽 행은 지움
+        if len(messages) > self.limit:
+            self.count_evicted(messages[:-self.limit])
+            messages = messages[-self.limit:]
+        if not messages:
+            return
+        first = len(self.messages)
+        self.beginInsertRows(QModelIndex(), first, first + len(messages) - 1)
+        self.messages.extend(messages)
+        self.endInsertRows()
+
+        excess = len(self.messages) - self.limit
+        if excess > 0:
+            self.beginRemoveRows(QModelIndex(), 0, excess - 1)
+            self.count_evicted([self.messages.popleft() for _ in range(excess)])
+            self.endRemoveRows()
+            # 지운 행은 다시 위로 스크롤하면 서버에서 가져옴
+            self.more_history = True
+
+    def count_evicted(self, rows):
+        # 지운 행 중 실시간으로 받은 채팅 수 (서버에는 기록되어 있으므로 다시 가져올 수 있음)
+        self.evicted_live += sum(1 for _, _, msg_type, message_id in rows
+                                 if message_id is None and msg_type == 'chat')
+
+    def prepend_messages(self, messages, more):
+        # 서버에서 받은 이전 기록(오래된 것부터)을 맨 앞에 추가
+        # 사용자가 직접 위로 스크롤해서 가져온 것이므로 limit을 넘어도 지우지 않고,
+        # 다음에 새 메시지가 들어올 때 다시 limit에 맞춘다
+        self.more_history = more
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self.messages.extendleft(reversed(messages))
+        self.endInsertRows()
+
+    def append_history(self, messages, more):
+        # 기준 번호 다음의 기록(오래된 것부터)을 맨 뒤에 추가
+        self.more_newer = more
+        if not messages:
+            return
+        first = len(self.messages)
+        self.beginInsertRows(QModelIndex(), first, first + len(messages) - 1)
+        self.messages.extend(messages)
+        self.endInsertRows()
+
+    def older_anchor(self):
+        # 이전 기록 요청의 기준
+        # 맨 앞 행이 실시간 메시지면 방에 들어온 뒤의 채팅 중 앞에서 지운 것 너머부터
+        # (지운 것이 없으면 방에 들어오기 전부터)
+        if self.messages and self.messages[0][3] is not None:
+            return {'before': self.messages[0][3]}
+        if not self.messages and self.anchor is not None:
+            return {'before': self.anchor + 1}
+        return {'before': None, 'live': self.evicted_live}
+
+    def newest_history_id(self):
+        # 다음 기록 요청의 기준
+        if self.messages:
+            return self.messages[-1][3]
+        return self.anchor
+
+    def clear(self, anchor=None):
+        self.beginResetModel()
+        self.messages.clear()
+        self.pending = []
+        self.anchor = anchor
+        self.evicted_live = 0
+        self.more_history = True
+        self.more_newer = anchor is not None
+        self.endResetModel()
 
 
 class CustomEvent(QEvent):
@@ -115,8 +253,87 @@ class CustomEvent(QEvent):
         self.data = data
 
 
+def simplify_points(points, tolerance):
+    # Ramer-Douglas-Peucker: 직선에서 tolerance 이내로 벗어난 중간 점을 제거
+    if tolerance <= 0 or len(points) < 3:
+        return points
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = points[first], points[last]
+        dx, dy = x2 - x1, y2 - y1
+        length = (dx * dx + dy * dy) ** 0.5
+        farthest, max_distance = None, tolerance
+        for i in range(first + 1, last):
+            x, y = points[i]
+            if length:
+                distance = abs(dy * (x - x1) - dx * (y - y1)) / length
+            else:
+                distance = ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+            if distance > max_distance:
+                farthest, max_distance = i, distance
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+class StrokeBatcher(QObject):
+    # 마우스 이동마다 나오는 선 조각을 모아 폴리라인(stroke) 메시지 하나로 보냄
+    # 첫 점이 들어온 뒤 interval ms가 지나거나 마우스를 떼면 보내고,
+    # 다음 묶음이 이어지도록 마지막 점은 남겨 둔다.
+    stroke_ready = pyqtSignal(dict)
+
+    def __init__(self, interval=STROKE_FLUSH_MS, tolerance=STROKE_TOLERANCE,
+                 parent=None):
+        super().__init__(parent)
+        self.tolerance = tolerance
+        self.points = []
+        self.pen = None  # (색, 굵기, 모드)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+    def add_line(self, data):
+        pen = (data['color'], data['width'], data['mode'])
+        start = (data['x1'], data['y1'])
+        if self.points and (pen != self.pen or self.points[-1] != start):
+            # 펜이 바뀌었거나 끊어진 선이면 새 폴리라인 시작
+            self.end_stroke()
+        if not self.points:
+            self.pen = pen
+            self.points.append(start)
+        self.points.append((data['x2'], data['y2']))
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        self.timer.stop()
+        if len(self.points) < 2:
+            return
+        points = simplify_points(self.points, self.tolerance)
+        color, width, mode = self.pen
+        self.stroke_ready.emit({
+            'type': 'stroke',
+            'points': [value for point in points for value in point],
+            'color': color,
+            'width': width,
+            'mode': mode
+        })
+        self.points = self.points[-1:]
+
+    def end_stroke(self):
+        self.flush()
+        self.points = []
+
+
 class DrawingCanvas(QWidget):
     line_drawn = pyqtSignal(dict)
+    stroke_finished = pyqtSignal()  # 마우스를 떼서 한 획이 끝남
 
     def __init__(self):
         super().__init__()
@@ -126,7 +343,15 @@ class DrawingCanvas(QWidget):
         self.drawing_mode = 'pen'  # 'pen' 또는 'eraser' 모드
         self.setMinimumSize(600, 400)
         self.setStyleSheet("background-color: white;")
-        self.lines = []
+        self.lines = StrokeStore()  # 체크포인트 이후의 최근 선
+        self.pens = {}  # 저장소의 펜 번호 -> QPen
+        self.index = SegmentGrid()  # 영역 -> 그 영역에 걸치는 선 위치
+        self.checkpoint = None  # 오래된 선을 그려 둔 이미지 (QImage)
+        # 화면 밖 백버퍼 - 체크포인트와 모든 선이 이미 그려져 있고 paintEvent는 복사만 함
+        self.backing = None
+        # 이번 프레임에 바뀐 영역 - 모아 두었다가 이벤트 루프가 한 바퀴 돌 때 한 번에 update
+        self.dirty = QRegion()
+        self.dirty_pending = False
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
@@ -141,13 +366,13 @@ class DrawingCanvas(QWidget):
                 Qt.white) if self.drawing_mode == 'eraser' else self.current_color
 
             # 선 정보 저장
-            line = {
-                'start': self.last_point,
-                'end': current_point,
-                'color': color,
-                'width': 10 if self.drawing_mode == 'eraser' else self.line_width
-            }
-            self.lines.append(line)
+            start = len(self.lines)
+            self.lines.append(
+                self.last_point.x(), self.last_point.y(),
+                current_point.x(), current_point.y(), color.name(),
+                10 if self.drawing_mode == 'eraser' else self.line_width,
+                self.drawing_mode)
+            self.add_lines(start)
 
             # 데이터 전송
             data = {
@@ -163,49 +388,181 @@ class DrawingCanvas(QWidget):
             self.line_drawn.emit(data)
 
             self.last_point = current_point
-            self.update()
 
     def mouseReleaseEvent(self, event):
         if event.button() == Qt.LeftButton:
             self.last_point = None
+            self.stroke_finished.emit()
 
     def paintEvent(self, event):
+        # 백버퍼에서 다시 그려야 하는 영역만 복사
         painter = QPainter(self)
+        backing = self.backing_store()
+        for rect in event.region().rects():
+            painter.drawImage(rect, backing, rect)
+
+    def draw_lines(self, painter, start=0, stop=None):
+        self.draw_segments(painter, self.lines.segments(start, stop))
+
+    def draw_segments(self, painter, segments):
+        # 선들을 순서대로 그림 - 펜이 바뀔 때만 다시 설정
+        current = None
+        for pen, x1, y1, x2, y2 in segments:
+            if pen != current:
+                current = pen
+                painter.setPen(self.qpen(pen))
+            painter.drawLine(x1, y1, x2, y2)
+
+    def qpen(self, pen):
+        qpen = self.pens.get(pen)
+        if qpen is None:
+            color, width, _ = self.lines.pens[pen]
+            qpen = QPen(QColor(color))
+            qpen.setWidth(width)
+            qpen.setCapStyle(Qt.RoundCap)
+            self.pens[pen] = qpen
+        return qpen
+
+    def backing_store(self):
+        # 백버퍼가 없거나 캔버스보다 작을 때만 선 로그로부터 다시 그림
+        # (캔버스가 줄어들 때는 그대로 두어 다시 커질 때 새로 그리지 않게 함)
+        backing = self.backing
+        if backing is None:
+            self.backing = backing = self.render_image()
+        elif self.width() > backing.width() or self.height() > backing.height():
+            self.backing = backing = self.grow_backing(backing)
+        return backing
+
+    def grow_backing(self, old):
+        # 기존 백버퍼를 복사하고 새로 드러난 영역에 걸치는 선만 색인으로 찾아 그림
+        # (체크포인트는 항상 기존 백버퍼 안에 들어 있음)
+        width = max(self.width(), old.width())
+        height = max(self.height(), old.height())
+        image = QImage(width, height, QImage.Format_RGB32)
+        image.fill(Qt.white)
+        painter = QPainter(image)
         painter.setRenderHint(QPainter.Antialiasing)
+        painter.drawImage(0, 0, old)
+        exposed = QRegion(0, 0, width, height) - QRegion(old.rect())
+        for rect in exposed.rects():
+            self.draw_region(painter, rect)
+        painter.end()
+        return image
+
+    def lines_in_rect(self, rect):
+        # rect와 경계 상자가 겹치는 선의 저장소 위치 (그린 순서)
+        return self.index.query(rect.left(), rect.top(),
+                                rect.right(), rect.bottom())
+
+    def draw_region(self, painter, rect):
+        # rect 안쪽만 다시 그림 - 전체 선이 아니라 색인에서 찾은 선만 순회
+        painter.save()
+        painter.setClipRect(rect)
+        self.draw_segments(painter,
+                           self.lines.segments_at(self.lines_in_rect(rect)))
+        painter.restore()
 
-        # 배경 그리기
-        painter.fillRect(self.rect(), Qt.white)
+    def render_image(self, count=None):
+        # 체크포인트와 앞쪽 선 count개(없으면 전부)를 캔버스 크기의 이미지 하나로 그림
+        width = max(self.width(), self.checkpoint.width() if self.checkpoint else 0)
+        height = max(self.height(), self.checkpoint.height() if self.checkpoint else 0)
+        image = QImage(width, height, QImage.Format_RGB32)
+        image.fill(Qt.white)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        if self.checkpoint is not None:
+            painter.drawImage(0, 0, self.checkpoint)
+        self.draw_lines(painter, 0, count)
+        painter.end()
+        return image
+
+    def add_lines(self, start, rects=None):
+        # 저장소에 start번부터 새로 추가된 선을 백버퍼에만 그려 넣음
+        # rects가 없으면 새 선 전체를 감싸는 사각형을 다시 그릴 영역으로 잡음
+        if self.backing is not None:
+            painter = QPainter(self.backing)
+            painter.setRenderHint(QPainter.Antialiasing)
+            self.draw_lines(painter, start)
+            painter.end()
+        if rects is None:
+            rects = [lines_rect(self.lines, start)]
+        self.index.add(self.lines, start)
+        self.fold_lines()
+        for rect in rects:
+            self.mark_dirty(rect)
+
+    def mark_dirty(self, rect):
+        self.dirty += rect
+        if not self.dirty_pending:
+            self.dirty_pending = True
+            QTimer.singleShot(0, self.flush_dirty)
+
+    def flush_dirty(self):
+        # 모아 둔 영역만 다시 그리도록 요청
+        self.dirty_pending = False
+        if not self.dirty.isEmpty():
+            self.update(self.dirty)
+            self.dirty = QRegion()
+
+    def fold_lines(self):
+        # 선이 너무 많이 쌓이면 오래된 선을 체크포인트 이미지로 접고 벡터는 최근 것만 남김
+        # 그래서 메모리와 다시 그리는 비용이 세션 길이가 아니라 캔버스 크기에 묶인다
+        if len(self.lines) <= CHECKPOINT_LINES:
+            return
+        count = len(self.lines) - CHECKPOINT_KEEP
+        self.checkpoint = self.render_image(count)
+        self.lines.truncate_front(count)
+        self.index.rebuild(self.lines)
+
+    def set_checkpoint(self, image):
+        # 서버 스냅샷의 체크포인트 이미지로 캔버스를 초기화
+        self.lines.clear()
+        self.index.clear()
+        self.checkpoint = image
+        self.backing = None
+        self.update()
 
-        # 저장된 모든 선 그리기
-        for line in self.lines:
-            pen = QPen()
-            pen.setColor(line['color'])
-            pen.setWidth(line['width'])
-            pen.setCapStyle(Qt.RoundCap)
-            painter.setPen(pen)
-            painter.drawLine(line['start'], line['end'])
+    def checkpoint_png(self):
+        # 현재 캔버스 전체를 PNG(base64 문자열)로 인코딩
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        self.backing_store().save(buffer, 'PNG')
+        return base64.b64encode(bytes(data)).decode('ascii')
 
     def clear(self):
         self.lines.clear()  # 모든 선 지우기
+        self.index.clear()
+        self.checkpoint = None
+        self.backing = None
         self.update()
 
+    def load_lines(self, messages):
+        # line/stroke 메시지들을 한 번에 추가하고 한 번만 다시 그림
+        # 여러 사람이 떨어진 곳에 그린 선이 큰 사각형 하나로 묶이지 않도록 메시지마다 영역을 잡음
+        start = len(self.lines)
+        rects = [] if len(messages) <= DIRTY_RECTS_MAX else None
+        for data in messages:
+            begin = len(self.lines)
+            self.lines.append_message(data)
+            if rects is not None:
+                rects.append(lines_rect(self.lines, begin))
+        self.add_lines(start, rects)
+
     def draw_remote_line(self, data):
         # 원격 클라이언트의 선 그리기
-        start = QPoint(data['x1'], data['y1'])
-        end = QPoint(data['x2'], data['y2'])
-        color = QColor(data['color'])
-        width = data['width']
-        mode = data.get('mode', 'pen')  # 모드 정보 추가
-
-        line = {
-            'start': start,
-            'end': end,
-            'color': color,
-            'width': width,
-            'mode': mode
-        }
-        self.lines.append(line)
-        self.update()
+        self.load_lines([data])
+
+
+def lines_rect(lines, start):
+    # 저장소의 start번 이후 선들을 감싸는 사각형 (펜 굵기와 안티앨리어싱 여백 포함)
+    bounds = lines.bounds(start)
+    if bounds is None:
+        return QRect()
+    left, top, right, bottom, width = bounds
+    pad = width // 2 + 2
+    return QRect(QPoint(left, top), QPoint(right, bottom)).adjusted(
+        -pad, -pad, pad, pad)
 
 
 class DrawingClient(QMainWindow):
@@ -215,6 +572,29 @@ class DrawingClient(QMainWindow):
         if not self.nickname:
             sys.exit()
 
+        self.framed = False  # 서버와 프레임 프로토콜 협상 여부
+        self.binary_strokes = False  # stroke를 바이너리(stroke_bin)로 보낼지 여부
+        # 보낸 stroke 수와 JSON/실제 전송 바이트 합 (바이너리 인코딩 효과 측정)
+        self.stroke_bytes = {'strokes': 0, 'json': 0, 'sent': 0}
+        self.compress = False  # 큰 프레임을 압축해서 보낼지 (서버가 welcome으로 알려 줌)
+        self.history_supported = False  # 서버가 채팅 기록 요청을 받는지 (welcome으로 알려 줌)
+        self.history_pending = set()  # 응답을 기다리는 기록 요청 (view, 최근 방향인지)
+        self.search_text = ''  # 지금 결과를 보여 주는 검색어
+        self.search_more = False  # 다음 검색 결과 페이지가 있는지
+        self.search_pending = False
+        self.search_count = 0  # 받은 검색 결과 수 (다음 페이지의 offset)
+        self.search_before = None  # 마지막으로 받은 시간순 결과의 번호 (다음 페이지 기준)
+        self.context_hit = None  # 검색 결과에서 골라 찾아간 메시지 번호
+        self.compression = CompressionStats()
+        # 수신 스레드 -> GUI 스레드 메시지 큐
+        # 큐가 비어 있다가 처음 채워질 때만 이벤트를 하나 보내고, GUI는 그때까지 쌓인 것을 한 번에 처리
+        self.inbox = []
+        self.inbox_lock = threading.Lock()
+        self.inbox_since = None  # 큐가 채워지기 시작한 시각 (비어 있으면 None)
+        self.event_lag = deque(maxlen=EVENT_LAG_SAMPLES)  # (지연 초, 배치 크기)
+        self.room = DEFAULT_ROOM
+        self.local_port = ''
+
         self.initUI()
         self.setupNetwork()
 
@@ -236,9 +616,21 @@ class DrawingClient(QMainWindow):
 
         # 상단 정보 라벨 추가
         info_layout = QHBoxLayout()
-        self.info_label = QLabel(f'닉네임: {self.nickname} | 포트: ()')
+        self.info_label = QLabel()
         self.info_label.setStyleSheet('font-weight: bold; padding-left: 10px;')
+        self.update_info_label()
         info_layout.addWidget(self.info_label)
+
+        # 방 이동 입력
+        info_layout.addStretch()
+        self.room_input = QLineEdit(self.room)
+        self.room_input.setFixedWidth(150)
+        self.room_input.setPlaceholderText('방 이름')
+        self.room_input.returnPressed.connect(self.change_room)
+        self.room_btn = QPushButton('방 이동')
+        self.room_btn.clicked.connect(self.change_room)
+        info_layout.addWidget(self.room_input)
+        info_layout.addWidget(self.room_btn)
         layout.addLayout(info_layout)
 
         # 하위 레이아웃 생성
@@ -251,7 +643,17 @@ class DrawingClient(QMainWindow):
 
         # 캔버스
         self.canvas = DrawingCanvas()
-        self.canvas.line_drawn.connect(self.send_data)
+        self.canvas.line_drawn.connect(self.send_line)
+
+        # 프레임 모드 서버에는 선 조각을 폴리라인으로 모아서 보냄
+        self.stroke_batcher = StrokeBatcher(parent=self)
+        self.stroke_batcher.stroke_ready.connect(self.send_data)
+        self.canvas.stroke_finished.connect(self.stroke_batcher.end_stroke)
+
+        # 이벤트 루프 지연 표시 갱신
+        self.lag_timer = QTimer(self)
+        self.lag_timer.timeout.connect(self.update_info_label)
+        self.lag_timer.start(1000)
         left_layout.addWidget(self.canvas)
 
         # 도구 버튼들
@@ -339,10 +741,35 @@ class DrawingClient(QMainWindow):
         right_frame = QWidget()
         right_layout = QVBoxLayout(right_frame)
 
+        # 채팅 기록 검색
+        search_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText('채팅 기록 검색')
+        self.search_input.returnPressed.connect(self.start_search)
+        self.search_close_btn = QPushButton('닫기')
+        self.search_close_btn.clicked.connect(self.close_search)
+        self.search_close_btn.hide()
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.search_close_btn)
+        right_layout.addLayout(search_layout)
+
+        # 검색 결과 - 누르면 그 메시지 앞뒤 기록만 가져와서 보여 줌
+        self.search_results = QListWidget()
+        self.search_results.setMaximumHeight(150)
+        self.search_results.itemClicked.connect(self.jump_to_hit)
+        self.search_results.verticalScrollBar().valueChanged.connect(
+            self.on_search_scrolled)
+        self.search_results.hide()
+        right_layout.addWidget(self.search_results)
+
         self.chat_box = QListView()
         self.chat_box.setItemDelegate(MessageDelegate())
         self.message_model = MessageModel()
         self.chat_box.setModel(self.message_model)
+        # 메시지는 모아서 추가되므로 실제로 행이 들어온 뒤에 스크롤 위치를 맞춤
+        self.message_model.rowsInserted.connect(self.on_chat_rows_inserted)
+        # 맨 위까지 올리면 이전 기록을 한 페이지씩 가져옴
+        self.chat_box.verticalScrollBar().valueChanged.connect(self.on_chat_scrolled)
         self.chat_box.setSpacing(2)  # 메시지 간 간격 설정
 
         # 스타일 설정
@@ -354,7 +781,23 @@ class DrawingClient(QMainWindow):
                 background: white;
             }
         """)
-        right_layout.addWidget(self.chat_box)
+
+        # 검색 결과 위치의 앞뒤 기록 (실시간 채팅창과 따로 두어 새 메시지와 섞이지 않게 함)
+        self.context_box = QListView()
+        self.context_box.setItemDelegate(MessageDelegate())
+        self.context_model = MessageModel()
+        self.context_box.setModel(self.context_model)
+        self.context_box.setSpacing(2)
+        self.context_box.setStyleSheet(self.chat_box.styleSheet())
+        self.context_box.verticalScrollBar().valueChanged.connect(
+            self.on_context_scrolled)
+
+        self.history_models = {VIEW_LIVE: self.message_model,
+                               VIEW_CONTEXT: self.context_model}
+        self.chat_stack = QStackedWidget()
+        self.chat_stack.addWidget(self.chat_box)
+        self.chat_stack.addWidget(self.context_box)
+        right_layout.addWidget(self.chat_stack)
 
         # 메시지 입력
         msg_layout = QHBoxLayout()
@@ -386,15 +829,27 @@ class DrawingClient(QMainWindow):
                 self.client, server_hostname='localhost')
 
             # 서버에서 할당된 포트 번호 가져오기
-            local_port = self.client.getsockname()[1]
+            self.local_port = self.client.getsockname()[1]
 
             # 정보 라벨 업데이트
-            self.info_label.setText(f'닉네임: {self.nickname} | 포트: {local_port}')
+            self.update_info_label()
 
-            # 닉네임 처리
+            # 닉네임 처리 - 지원하는 프로토콜 버전과 입장할 방을 함께 알림
             response = self.client.recv(1024).decode('utf-8')
             if response == 'NICK':
-                self.client.send(self.nickname.encode('utf-8'))
+                hello = {'nickname': self.nickname, 'proto': PROTOCOL_VERSION,
+                         'room': self.room, 'stroke_bin': True,
+                         'compress': True}
+                self.client.send(json.dumps(hello).encode('utf-8'))
+
+            # 서버의 첫 응답으로 프레임 모드 여부 판별
+            # (새 서버는 welcome 프레임, 예전 서버는 입장 메시지 JSON을 보냄)
+            first_data = self.client.recv(4096)
+            self.framed = is_framed_stream(first_data)
+            self.decoder = (FrameDecoder(self.compression) if self.framed
+                            else LegacyDecoder())
+            for message in self.decoder.feed_messages(first_data):
+                self.handle_received_message(message)
 
             # threading.Thread 사용
             self.network_thread = threading.Thread(target=self.receive)
@@ -407,30 +862,17 @@ class DrawingClient(QMainWindow):
             self.handle_error(str(e))
 
     def receive(self):
-        buffer = ""
         while True:
             try:
-                data = self.client.recv(1024).decode('utf-8')
+                data = self.client.recv(65536)
                 if not data:
                     print("서버와의 연결이 끊어졌습니다.")
                     break
 
-                buffer += data
-                while True:
-                    try:
-                        json_end = buffer.find('}')
-                        if json_end == -1:
-                            break
-
-                        message = buffer[:json_end + 1]
-                        buffer = buffer[json_end + 1:]
-
-                        data = json.loads(message)
-                        # QThread가 아니므로 직접 호출
-                        self.handle_received_message(data)
-
-                    except json.JSONDecodeError:
-                        break
+                # 잘리거나 여러 개가 붙어 온 메시지를 디코더가 한 번에 분리
+                for message in self.decoder.feed_messages(data):
+                    # QThread가 아니므로 직접 호출
+                    self.handle_received_message(message)
 
             except Exception as e:
                 print(f"수신 오류: {e}")
@@ -444,16 +886,81 @@ class DrawingClient(QMainWindow):
         # sys.exit()
 
     def handle_received_message(self, data):
-        # 메인 스레드에서 안전하게 UI 업데이트
-        QApplication.instance().postEvent(self, CustomEvent(data))
+        # 메인 스레드에서 안전하게 UI 업데이트 - 큐에 넣고, 비어 있던 큐일 때만 이벤트를 보냄
+        with self.inbox_lock:
+            self.inbox.append(data)
+            if self.inbox_since is not None:
+                return
+            self.inbox_since = time.perf_counter()
+        QApplication.instance().postEvent(self, CustomEvent(None))
+
+    def drain_inbox(self):
+        # 쌓인 메시지를 한꺼번에 꺼내 처리 (이어서 온 line/stroke는 캔버스에 한 번에 추가)
+        with self.inbox_lock:
+            messages = self.inbox
+            since = self.inbox_since
+            self.inbox = []
+            self.inbox_since = None
+        if not messages:
+            return
+        self.event_lag.append((time.perf_counter() - since, len(messages)))
+        # 메시지 하나가 잘못되어도 나머지는 처리하도록 메시지마다 예외를 잡음
+        # (슬롯 밖으로 예외가 나가면 PyQt5가 프로그램을 끝낼 수 있음)
+        drawing = []
+        for data in messages:
+            if data.get('type') in ('line', 'stroke'):
+                drawing.append(data)
+                continue
+            self.load_drawing(drawing)
+            drawing = []
+            try:
+                self.handle_message(data)
+            except Exception as e:
+                print(f"메시지 처리 오류({data.get('type')}): {e}")
+        self.load_drawing(drawing)
+
+    def load_drawing(self, drawing):
+        if not drawing:
+            return
+        try:
+            self.canvas.load_lines(drawing)
+        except Exception as e:
+            print(f"그리기 메시지 처리 오류: {e}")
+
+    def send_line(self, data):
+        # 예전 서버는 stroke를 모르는 클라이언트에게도 그대로 전달하므로 선 조각으로 보냄
+        if self.framed:
+            self.stroke_batcher.add_line(data)
+        else:
+            self.send_data(data)
 
     def send_data(self, data):
         # 서버로 데이터를 전송하는 메서드
         try:
-            self.client.send(json.dumps(data).encode('utf-8'))
+            if self.framed:
+                frame = encode_message(data)
+                if data['type'] == 'stroke':
+                    frame = self.encode_stroke(data, frame)
+                if self.compress:
+                    frame = compress_frame(frame, self.compression)
+                self.client.sendall(frame)
+            else:
+                self.client.sendall(json.dumps(data).encode('utf-8'))
         except Exception as e:
             print(f"전송 오류: {e}")
 
+    def encode_stroke(self, data, json_frame):
+        # 서버가 바이너리 stroke를 받아 주면 바이너리로 바꾸고 JSON 대비 크기를 기록
+        frame = json_frame
+        if self.binary_strokes:
+            frame = encode_binary_stroke(data) or json_frame
+        stats = self.stroke_bytes
+        stats['strokes'] += 1
+        stats['json'] += len(json_frame)
+        stats['sent'] += len(frame)
+        self.update_info_label()
+        return frame
+
     def send_message(self):
         # 채팅 메시지를 전송하는 메서드
         message = self.msg_input.text().strip()
@@ -465,6 +972,211 @@ class DrawingClient(QMainWindow):
             self.send_data(data)
             self.msg_input.clear()
 
+    def update_info_label(self):
+        text = f'닉네임: {self.nickname} | 포트: {self.local_port} | 방: {self.room}'
+        stats = self.stroke_bytes
+        if stats['strokes']:
+            # 획당 평균 전송 크기 (JSON으로 보냈을 때와 비교)
+            text += (f" | 획당 {stats['sent'] / stats['strokes']:.0f}B "
+                     f"(JSON {stats['json'] / stats['strokes']:.0f}B)")
+        stats = self.compression
+        if stats.raw_out or stats.raw_in:
+            # 압축 대상 프레임의 압축 후/전 크기 비율 (송신, 수신)
+            sent = f"{stats.wire_out / stats.raw_out:.0%}" if stats.raw_out else '-'
+            received = f"{stats.wire_in / stats.raw_in:.0%}" if stats.raw_in else '-'
+            text += f" | 압축 송신 {sent} 수신 {received}"
+        if self.event_lag:
+            # 최근 배치들의 이벤트 루프 지연과 한 번에 처리한 메시지 수
+            lags = [lag for lag, _ in self.event_lag]
+            sizes = [size for _, size in self.event_lag]
+            text += (f" | 지연 평균 {sum(lags) / len(lags) * 1000:.1f}ms "
+                     f"최대 {max(lags) * 1000:.1f}ms "
+                     f"(배치 평균 {sum(sizes) / len(sizes):.1f}개)")
+        self.info_label.setText(text)
+
+    def change_room(self):
+        # 다른 방(보드)으로 이동 요청 - 서버의 room_changed 응답으로 전환됨
+        room = normalize_room(self.room_input.text())
+        if room != self.room:
+            self.stroke_batcher.end_stroke()
+            self.send_data({'type': 'join_room', 'room': room})
+
+    def on_room_changed(self, room):
+        self.room = room
+        self.room_input.setText(room)
+        self.update_info_label()
+        self.canvas.clear()
+        # 채팅 기록은 방마다 따로이므로 새 방의 기록을 다시 가져옴
+        self.close_search()
+        self.history_pending.clear()
+        self.message_model.clear()
+        self.display_chat_message(f"'{room}' 방으로 이동했습니다.", 'join_exit')
+        self.request_history()
+
+    def request_history(self, view=VIEW_LIVE, newer=False):
+        # 지금 가진 가장 오래된(newer면 가장 최근) 메시지 너머의 기록 한 페이지 요청
+        # 같은 방향의 요청은 응답이 올 때까지 한 번만 보냄
+        model = self.history_models[view]
+        if not self.history_supported or (view, newer) in self.history_pending:
+            return
+        if newer:
+            if not model.more_newer:
+                return
+            anchor = {'after': model.newest_history_id()}
+        else:
+            if not model.more_history:
+                return
+            anchor = model.older_anchor()
+        self.history_pending.add((view, newer))
+        self.send_data(dict(type='history', view=view, limit=HISTORY_PAGE_SIZE,
+                            **anchor))
+
+    def on_history(self, data):
+        view = data.get('view') or VIEW_LIVE
+        model = self.history_models.get(view)
+        newer = data.get('after') is not None
+        self.history_pending.discard((view, newer))
+        # 방을 옮겼거나 이미 같은 페이지를 받은 뒤에 온 응답은 버림
+        if model is None or data.get('room') != self.room:
+            return
+        if newer and data['after'] != model.newest_history_id():
+            return
+        if not newer:
+            anchor = model.older_anchor()
+            if {key: data.get(key) for key in anchor} != anchor:
+                return
+
+        rows = []
+        for message in data.get('messages', []):
+            who, content = self.chat_row(message['message'])
+            hit = view == VIEW_CONTEXT and message['id'] == self.context_hit
+            rows.append((who, content, 'hit' if hit else 'chat', message['id']))
+        if newer:
+            model.append_history(rows, data.get('more', False))
+        elif view == VIEW_CONTEXT:
+            first_page = model.rowCount() == 0
+            model.prepend_messages(rows, data.get('more', False))
+            if first_page and rows:
+                # 찾아간 메시지가 가운데 오도록 (첫 페이지의 마지막 행)
+                self.context_box.scrollTo(model.index(len(rows) - 1),
+                                          QAbstractItemView.PositionAtCenter)
+            elif rows and len(rows) < model.rowCount():
+                self.context_box.scrollTo(model.index(len(rows)),
+                                          QAbstractItemView.PositionAtTop)
+        else:
+            model.prepend_messages(rows, data.get('more', False))
+
+    def on_chat_scrolled(self, value):
+        if value == self.chat_box.verticalScrollBar().minimum():
+            self.request_history()
+
+    def on_context_scrolled(self, value):
+        scroll_bar = self.context_box.verticalScrollBar()
+        if value == scroll_bar.minimum():
+            self.request_history(VIEW_CONTEXT)
+        elif value == scroll_bar.maximum():
+            self.request_history(VIEW_CONTEXT, newer=True)
+
+    def start_search(self):
+        # 지금 방의 채팅 기록 검색 (결과는 순위순으로 한 페이지씩)
+        text = self.search_input.text().strip()
+        if not text or not self.history_supported:
+            return
+        self.search_text = text
+        self.search_results.clear()
+        self.search_results.show()
+        self.search_close_btn.show()
+        self.search_more = True
+        self.search_pending = False
+        self.search_count = 0
+        self.search_before = None
+        self.request_search()
+
+    def request_search(self):
+        if self.search_pending or not self.search_more:
+            return
+        self.search_pending = True
+        self.send_data({'type': 'search', 'query': self.search_text,
+                        'offset': self.search_count,
+                        'before': self.search_before,
+                        'limit': HISTORY_PAGE_SIZE})
+
+    def on_search(self, data):
+        # 검색어를 바꿨거나 방을 옮긴 뒤에 온 응답은 버림
+        if data.get('room') != self.room or \
+                data.get('query') != self.search_text or \
+                data.get('offset') != self.search_count:
+            return
+        self.search_pending = False
+        self.search_more = data.get('more', False)
+        for hit in data.get('hits', []):
+            self.search_count += 1
+            if not hit.get('ranked', True):
+                # 서버는 최근 일치 일부만 순위를 매기고, 그보다 오래된 것은 시간순으로 보냄
+                if self.search_before is None:
+                    item = QListWidgetItem('― 여기부터는 순위 없이 최근 순 ―')
+                    item.setFlags(Qt.NoItemFlags)
+                    self.search_results.addItem(item)
+                self.search_before = hit['id']
+            when = time.strftime('%m-%d %H:%M', time.localtime(hit['ts']))
+            item = QListWidgetItem(f"{hit['offset'] + 1}. [{when}] {hit['message']}")
+            item.setData(Qt.UserRole, hit['id'])
+            self.search_results.addItem(item)
+        if self.search_results.count() == 0:
+            item = QListWidgetItem('검색 결과가 없습니다.')
+            item.setFlags(Qt.NoItemFlags)
+            self.search_results.addItem(item)
+
+    def on_search_scrolled(self, value):
+        if value == self.search_results.verticalScrollBar().maximum():
+            self.request_search()
+
+    def jump_to_hit(self, item):
+        # 고른 메시지 앞뒤 기록만 가져와서 보여 줌 (전체 기록을 불러오지 않음)
+        hit = item.data(Qt.UserRole)
+        if hit is None:
+            return
+        self.context_hit = hit
+        self.history_pending = {key for key in self.history_pending
+                                if key[0] != VIEW_CONTEXT}
+        self.context_model.clear(anchor=hit)
+        self.chat_stack.setCurrentWidget(self.context_box)
+        self.request_history(VIEW_CONTEXT)
+        self.request_history(VIEW_CONTEXT, newer=True)
+
+    def close_search(self):
+        # 검색 결과를 닫고 실시간 채팅창으로 돌아감
+        self.search_text = ''
+        self.search_more = False
+        self.search_pending = False
+        self.search_count = 0
+        self.search_before = None
+        self.search_results.clear()
+        self.search_results.hide()
+        self.search_close_btn.hide()
+        self.context_hit = None
+        self.context_model.clear()
+        self.chat_stack.setCurrentWidget(self.chat_box)
+
+    def on_chat_rows_inserted(self, parent, first, last):
+        if first == 0 and last + 1 < self.message_model.rowCount():
+            # 위에 이전 기록이 붙은 경우 - 보고 있던 메시지가 그대로 보이도록
+            self.chat_box.scrollTo(self.message_model.index(last + 1),
+                                   QAbstractItemView.PositionAtTop)
+        else:
+            self.chat_box.scrollToBottom()
+
+    def load_snapshot(self, messages):
+        lines = []
+        for message in messages:
+            if message.get('type') == 'checkpoint':
+                image = QImage.fromData(base64.b64decode(message['image']), 'PNG')
+                if not image.isNull():
+                    self.canvas.set_checkpoint(image)
+            else:
+                lines.append(message)
+        self.canvas.load_lines(lines)
+
     def choose_color(self):
         color = QColorDialog.getColor()
         if color.isValid():
@@ -484,6 +1196,7 @@ class DrawingClient(QMainWindow):
             self.canvas.current_color = color
 
     def clear_canvas(self):
+        self.stroke_batcher.end_stroke()  # 모아 둔 선이 clear 뒤에 도착하지 않도록 먼저 보냄
         self.canvas.clear()
         data = {'type': 'clear'}
         self.send_data(data)
@@ -505,24 +1218,47 @@ class DrawingClient(QMainWindow):
         event.accept()
 
     def event(self, event):
-        # 커스텀 이벤트 처리
+        # 커스텀 이벤트 처리 - 수신 큐에 쌓인 메시지를 모두 처리
         if event.type() == CustomEvent.EVENT_TYPE:
-            data = event.data
-            if data['type'] == 'line':
-                # 모드 정보 추가
-                data['mode'] = data.get('mode', 'pen')
-                self.canvas.draw_remote_line(data)
-            elif data['type'] == 'chat':
-                self.display_chat_message(data['message'], data['type'])
-            elif data['type'] == 'clear':
-                self.canvas.clear()
-            elif data['type'] == 'join_exit':
-                self.display_chat_message(data['message'], data['type'])
-            elif data['type'] == 'err':
-                self.show_error_message(data['message'])
+            self.drain_inbox()
             return True
         return super().event(event)
 
+    def handle_message(self, data):
+        msg_type = data.get('type')
+        if msg_type == 'line':
+            # 모드 정보 추가
+            data['mode'] = data.get('mode', 'pen')
+            self.canvas.draw_remote_line(data)
+        elif msg_type == 'stroke':
+            self.canvas.load_lines([data])
+        elif msg_type == 'welcome':
+            self.binary_strokes = data.get('stroke_bin', False)
+            self.compress = data.get('compress', False)
+            self.history_supported = data.get('history', False)
+            self.request_history()
+        elif msg_type == 'history':
+            self.on_history(data)
+        elif msg_type == 'search':
+            self.on_search(data)
+        elif msg_type == 'chat':
+            self.display_chat_message(data['message'], msg_type)
+        elif msg_type == 'snapshot':
+            # 방에 들어올 때 서버가 보내는 현재 보드 (맨 앞에 체크포인트 이미지가 올 수 있음)
+            self.load_snapshot(data['lines'])
+        elif msg_type == 'checkpoint_request':
+            # 서버가 보드 로그를 줄일 수 있도록 지금까지 그린 보드를 이미지로 보냄
+            self.send_data({'type': 'checkpoint', 'seq': data['seq'],
+                            'image': self.canvas.checkpoint_png()})
+        elif msg_type == 'clear':
+            self.canvas.clear()
+        elif msg_type == 'join_exit':
+            self.display_chat_message(data['message'], msg_type)
+        elif msg_type == 'room_changed':
+            self.on_room_changed(data['room'])
+        elif msg_type == 'err':
+            self.show_error_message(data['message'])
+
     def show_error_message(self, message):
         QMessageBox.warning(self, '오류', message)
         QCoreApplication.instance().quit()
@@ -531,18 +1267,20 @@ class DrawingClient(QMainWindow):
         if type == 'join_exit':
             self.message_model.add_message(USER_THEM, message, 'join_exit')
         else:
-            if ':' in message:
-                nickname, content = message.split(':', 1)
-                is_my_message = nickname.strip() == self.nickname
-                who = USER_ME if is_my_message else USER_THEM
-                content = content if is_my_message else message
-            else:
-                who = USER_THEM
-                content = message
-
+            who, content = self.chat_row(message)
             self.message_model.add_message(who, content, 'chat')
 
-        self.chat_box.scrollToBottom()
+    def chat_row(self, message):
+        # '닉네임: 내용' 채팅을 (누구의 메시지인지, 표시할 내용)으로
+        if ':' in message:
+            nickname, content = message.split(':', 1)
+            is_my_message = nickname.strip() == self.nickname
+            who = USER_ME if is_my_message else USER_THEM
+            content = content if is_my_message else message
+        else:
+            who = USER_THEM
+            content = message
+        return who, content
 
     def set_preset_color(self, color, button):
         # 모든 버튼의 테두리 초기화
@@ -0,0 +1,413 @@
+import asyncio
+import json
+import os
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+
+from protocol import (HEADER_SIZE, FrameDecoder, decode_frame, encode_message,
+                      frame_header, type_code)
+from server_core import Observable, ServerCore
+
+# 멀티 프로세스 모드
+# 워커 프로세스 N개가 SO_REUSEPORT로 같은 포트를 나눠 받고,
+# 감독 프로세스의 유닉스 소켓 버스를 통해 방 메시지를 서로 전달한다.
+# 버스 메시지도 protocol.py의 프레임 형식을 그대로 쓴다.
+#   bus_publish : 방 이름 길이(2바이트) + 방 이름 + 클라이언트 프레임 원본
+#   bus_event   : 워커 -> 감독, 클라이언트 입장/퇴장/방 이동
+#   bus_stats   : 워커 -> 감독, 주기적인 접속자/대기열/핸드셰이크/소켓 통계
+#   bus_control : 감독 -> 워커, 연결 끊기/종료 요청
+#   bus_checkpoint : bus_publish 안에 담겨 오가는 보드 체크포인트 요청/응답/적용
+#                    (체크포인트는 0번 워커만 접고 다른 워커는 따라 접음 - ServerCore)
+BUS_PUBLISH = type_code('bus_publish')
+BUS_EVENT = type_code('bus_event')
+BUS_STATS = type_code('bus_stats')
+BUS_CONTROL = type_code('bus_control')
+BUS_CHECKPOINT = type_code('bus_checkpoint')
+
+ROOM_LENGTH = struct.Struct('!H')
+
+
+def default_bus_path(port):
+    return os.path.join(tempfile.gettempdir(), f'sns_whiteboard_{port}.sock')
+
+
+def encode_publish(room, frame):
+    room_bytes = room.encode('utf-8')
+    length = ROOM_LENGTH.size + len(room_bytes) + len(frame)
+    return b''.join((frame_header(BUS_PUBLISH, length),
+                     ROOM_LENGTH.pack(len(room_bytes)), room_bytes, frame))
+
+
+def decode_publish(bus_frame):
+    # (방 이름, 내부 프레임 타입 코드, 내부 프레임 memoryview)
+    payload = bus_frame[HEADER_SIZE:]
+    (room_length,) = ROOM_LENGTH.unpack_from(payload)
+    start = ROOM_LENGTH.size
+    room = str(payload[start:start + room_length], 'utf-8')
+    inner = payload[start + room_length:]
+    return room, inner[1], inner
+
+
+class BusClient(asyncio.Protocol):
+    # 워커 프로세스 쪽 버스 연결
+    # ServerCore의 옵저버로 등록되어 입장/퇴장을 감독 프로세스에 알린다
+
+    def __init__(self, core, worker_id):
+        self.core = core
+        self.worker_id = worker_id
+        self.transport = None
+        self.decoder = FrameDecoder()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.core.bus = self
+        self.core.add_observer(self)
+        self.send_event('hello', pid=os.getpid())
+
+    def data_received(self, data):
+        for code, frame in self.decoder.feed(data):
+            if code == BUS_PUBLISH:
+                # 다른 워커의 방 메시지를 이 프로세스의 방 멤버에게만 전달
+                room, inner_code, inner = decode_publish(frame)
+                if inner_code == BUS_CHECKPOINT:
+                    self.core.handle_bus_checkpoint(room, decode_frame(inner))
+                else:
+                    self.core.deliver(inner_code, inner, room)
+            elif code == BUS_CONTROL:
+                self.handle_control(decode_frame(frame))
+
+    def connection_lost(self, exc):
+        # 감독 프로세스가 사라지면 워커도 종료
+        print(f"[워커 {self.worker_id}] 버스 연결이 끊어져 종료합니다.")
+        self.core.bus = None
+        self.core.stop_in_loop()
+
+    def publish(self, room, frame):
+        if not self.transport.is_closing():
+            self.transport.write(encode_publish(room, frame))
+
+    def send(self, data):
+        if not self.transport.is_closing():
+            self.transport.write(encode_message(data))
+
+    def send_event(self, event, **fields):
+        self.send(dict(type='bus_event', event=event, worker=self.worker_id,
+                       **fields))
+
+    def on_socket_stats(self, sockets):
+        # 코어의 주기적인 소켓 통계에 맞춰 감독 프로세스로 통계 전송
+        core = self.core
+        self.send({
+            'type': 'bus_stats',
+            'worker': self.worker_id,
+            'clients': core.client_count(),
+            'rooms': list(core.rooms),
+            'queues': core.queue_depths(),
+            'handshake': core.handshake_stats(),
+            'board': core.board_stats(),
+            'compression': core.compression_stats(),
+            'sockets': sockets,
+        })
+
+    def handle_control(self, data):
+        if data is None:
+            return
+        action = data.get('action')
+        if action == 'disconnect':
+            self.core._disconnect_client(data.get('id'))
+        elif action == 'shutdown':
+            self.core.stop_in_loop()
+
+    def on_client_joined(self, connection_id, nickname, port, room):
+        self.send_event('joined', id=connection_id, nickname=nickname,
+                        port=port, room=room)
+
+    def on_client_left(self, connection_id):
+        self.send_event('left', id=connection_id)
+
+    def on_client_room_changed(self, connection_id, room):
+        self.send_event('room_changed', id=connection_id, room=room)
+
+
+class WorkerLink(asyncio.Protocol):
+    # 감독 프로세스 쪽에서 본 워커 하나와의 버스 연결
+
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+        self.transport = None
+        self.worker_id = None
+        self.decoder = FrameDecoder()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        for code, frame in self.decoder.feed(data):
+            if code == BUS_PUBLISH:
+                # 파싱 없이 다른 워커들에게 그대로 전달
+                self.supervisor.forward(frame, self)
+            else:
+                message = decode_frame(frame)
+                if message is not None:
+                    self.supervisor.handle_worker_message(self, message)
+
+    def connection_lost(self, exc):
+        self.supervisor.worker_lost(self)
+
+    def send(self, data):
+        if not self.transport.is_closing():
+            self.transport.write(encode_message(data))
+
+
+class ClusterSupervisor(Observable):
+    # 워커 프로세스를 띄우고 버스를 중계하는 감독 객체
+    # ServerCore와 같은 조회/제어 메서드를 제공하므로 ServerWindow가 그대로 붙을 수 있다.
+    # 옵저버 콜백은 버스 이벤트 루프 스레드에서 호출된다.
+
+    def __init__(self, workers, options, bus_path=None):
+        super().__init__()
+        self.workers = workers
+        self.options = options  # 각 워커의 ServerCore 인자
+        self.port = options.get('port', 3000)
+        self.bus_path = bus_path or default_bus_path(self.port)
+
+        self.links = {}  # 워커 번호 -> WorkerLink
+        # 워커마다 연결 번호가 따로 매겨지므로 감독 프로세스에서 전체 번호를 새로 부여
+        self.members = {}  # (워커 번호, 워커 내 연결 번호) -> 전체 연결 번호
+        self.member_keys = {}  # 전체 연결 번호 -> (워커 번호, 워커 내 연결 번호)
+        self.member_rooms = {}  # 전체 연결 번호 -> 방 이름
+        self.last_connection_id = 0
+        self.worker_stats = {}  # 워커 번호 -> 마지막 bus_stats
+        self.processes = []
+
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        if os.path.exists(self.bus_path):
+            os.unlink(self.bus_path)
+
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(
+            self.loop.create_unix_server(lambda: WorkerLink(self),
+                                         self.bus_path))
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        # 워커는 Qt를 불러오지 않도록 이 모듈을 별도 인터프리터로 실행
+        options = json.dumps(self.options)
+        for worker_id in range(self.workers):
+            self.processes.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), 'worker',
+                 str(worker_id), self.bus_path, options]))
+        print(f"워커 {self.workers}개로 서버가 시작되었습니다...")
+
+    def call_in_loop(self, callback, *args):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def forward(self, frame, source):
+        for link in list(self.links.values()):
+            if link is not source and not link.transport.is_closing():
+                link.transport.write(frame)
+
+    def handle_worker_message(self, link, message):
+        msg_type = message.get('type')
+        worker = message.get('worker')
+        if msg_type == 'bus_stats':
+            self.worker_stats[worker] = message
+            self.notify('socket_stats', self.socket_stats())
+            return
+        if msg_type != 'bus_event':
+            return
+
+        event = message.get('event')
+        key = (worker, message.get('id'))
+        if event == 'hello':
+            link.worker_id = worker
+            self.links[worker] = link
+            print(f"워커 {worker} 연결됨 (pid {message.get('pid')})")
+        elif event == 'joined':
+            self.last_connection_id += 1
+            connection_id = self.last_connection_id
+            self.members[key] = connection_id
+            self.member_keys[connection_id] = key
+            self.member_rooms[connection_id] = message['room']
+            self.notify('client_joined', connection_id, message['nickname'],
+                        message['port'], message['room'])
+        elif event == 'left':
+            self.remove_member(key)
+        elif event == 'room_changed':
+            connection_id = self.members.get(key)
+            if connection_id is not None:
+                self.member_rooms[connection_id] = message['room']
+                self.notify('client_room_changed', connection_id,
+                            message['room'])
+
+    def remove_member(self, key):
+        connection_id = self.members.pop(key, None)
+        if connection_id is None:
+            return
+        del self.member_keys[connection_id]
+        del self.member_rooms[connection_id]
+        self.notify('client_left', connection_id)
+
+    def worker_lost(self, link):
+        worker = link.worker_id
+        if worker is None:
+            return
+        print(f"워커 {worker} 연결이 끊어졌습니다.")
+        if self.links.get(worker) is link:
+            del self.links[worker]
+        self.worker_stats.pop(worker, None)
+        for key in [key for key in self.members if key[0] == worker]:
+            self.remove_member(key)
+
+    def client_count(self):
+        return len(self.members)
+
+    def room_count(self):
+        return len(set(self.member_rooms.values()))
+
+    def worker_counts(self):
+        # 워커 번호 -> 접속자 수
+        counts = {worker: 0 for worker in self.links}
+        for worker, _ in list(self.members):
+            counts[worker] = counts.get(worker, 0) + 1
+        return counts
+
+    def queue_depths(self):
+        depths = {}
+        for worker, stats in list(self.worker_stats.items()):
+            # JSON을 거치면서 키가 문자열이 됨
+            for local_id, (depth, dropped) in stats['queues'].items():
+                connection_id = self.members.get((worker, int(local_id)))
+                if connection_id is not None:
+                    depths[connection_id] = (depth, dropped)
+        return depths
+
+    def socket_stats(self):
+        # 모든 워커의 마지막 소켓 통계를 합침 (워커 번호 추가)
+        sockets = []
+        for worker, stats in sorted(self.worker_stats.items()):
+            for entry in stats['sockets']:
+                sockets.append(dict(entry, worker=worker))
+        return sockets
+
+    def handshake_stats(self):
+        # 워커별 통계 합산 (평균은 건수 가중, p95/최대는 워커 중 최댓값)
+        merged = {'count': 0, 'pending': 0, 'failures': {'tls': 0, 'nick': 0}}
+        for phase in ('tls', 'nick'):
+            merged[f'{phase}_avg'] = 0.0
+            merged[f'{phase}_p95'] = 0.0
+            merged[f'{phase}_max'] = 0.0
+
+        for stats in list(self.worker_stats.values()):
+            hs = stats['handshake']
+            total = merged['count'] + hs['count']
+            for phase in ('tls', 'nick'):
+                if total:
+                    merged[f'{phase}_avg'] = (
+                        merged[f'{phase}_avg'] * merged['count']
+                        + hs[f'{phase}_avg'] * hs['count']) / total
+                merged[f'{phase}_p95'] = max(merged[f'{phase}_p95'],
+                                             hs[f'{phase}_p95'])
+                merged[f'{phase}_max'] = max(merged[f'{phase}_max'],
+                                             hs[f'{phase}_max'])
+            merged['count'] = total
+            merged['pending'] += hs['pending']
+            for phase, count in hs['failures'].items():
+                merged['failures'][phase] += count
+        return merged
+
+    def board_stats(self):
+        # 워커마다 같은 보드를 복제해 갖고 있으므로 보드 크기는 워커 중 최댓값,
+        # 스냅샷은 워커별 통계를 합산
+        merged = {'boards': 0, 'lines': 0, 'bytes': 0, 'compacted': 0,
+                  'checkpoint_bytes': 0, 'snapshots': 0, 'snapshot_bytes_avg': 0.0,
+                  'snapshot_bytes_max': 0, 'snapshot_ms_avg': 0.0,
+                  'snapshot_ms_p95': 0.0}
+        for stats in list(self.worker_stats.values()):
+            board = stats['board']
+            for key in ('boards', 'lines', 'bytes', 'compacted',
+                        'checkpoint_bytes', 'snapshot_bytes_max', 'snapshot_ms_p95'):
+                merged[key] = max(merged[key], board[key])
+            total = merged['snapshots'] + board['snapshots']
+            if total:
+                for key in ('snapshot_bytes_avg', 'snapshot_ms_avg'):
+                    merged[key] = (merged[key] * merged['snapshots']
+                                   + board[key] * board['snapshots']) / total
+            merged['snapshots'] = total
+        return merged
+
+    def compression_stats(self):
+        # 워커마다 자기 연결의 압축 통계를 갖고 있으므로 모두 합산
+        merged = {'compressed': 0, 'skipped': 0, 'raw_out': 0, 'wire_out': 0,
+                  'compress_ms': 0.0, 'inflated': 0, 'wire_in': 0, 'raw_in': 0,
+                  'inflate_ms': 0.0}
+        for stats in list(self.worker_stats.values()):
+            for key, value in stats['compression'].items():
+                merged[key] += value
+        return merged
+
+    def disconnect_client(self, connection_id):
+        # 스레드 안전: 연결이 있는 워커에게 연결 끊기를 요청
+        self.call_in_loop(self._disconnect_client, connection_id)
+
+    def _disconnect_client(self, connection_id):
+        key = self.member_keys.get(connection_id)
+        link = self.links.get(key[0]) if key else None
+        if link is not None:
+            link.send({'type': 'bus_control', 'action': 'disconnect',
+                       'id': key[1]})
+
+    def send_control(self, control):
+        for link in list(self.links.values()):
+            link.send(dict(type='bus_control', **control))
+
+    def shutdown(self, timeout=5):
+        # 스레드 안전: 모든 워커를 종료시키고 버스를 닫음
+        if self.loop is None or not self.loop.is_running():
+            return
+        self.call_in_loop(self.send_control, {'action': 'shutdown'})
+        for process in self.processes:
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                print(f"워커(pid {process.pid})가 응답하지 않아 강제 종료합니다.")
+                process.kill()
+
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        if os.path.exists(self.bus_path):
+            os.unlink(self.bus_path)
+
+
+def run_worker(worker_id, bus_path, options):
+    # 워커 프로세스 본체: SO_REUSEPORT 리슨 소켓 + 버스 연결
+    # 종료는 감독 프로세스가 버스로 지시하므로 터미널의 Ctrl+C는 무시
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # 보드는 워커마다 복제되므로 디스크 기록은 0번 워커만 (복원은 모두)
+    core = ServerCore(reuse_port=True, board_writer=worker_id == 0, **options)
+    core.start()
+    future = asyncio.run_coroutine_threadsafe(
+        core.loop.create_unix_connection(
+            lambda: BusClient(core, worker_id), bus_path),
+        core.loop)
+    future.result(10)
+    core.thread.join()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == 'worker':
+        run_worker(int(sys.argv[2]), sys.argv[3], json.loads(sys.argv[4]))
+    else:
+        print("사용법: python cluster.py worker <번호> <버스 경로> <옵션 JSON>")
+        sys.exit(1)
@@ -0,0 +1,443 @@
+import codecs
+import json
+import struct
+import sys
+import time
+import zlib
+from array import array
+from itertools import accumulate
+
+# 프레임 프로토콜
+# NICK 핸드셰이크에서 클라이언트가 {'nickname': ..., 'proto': 1} 을 보내면
+# 서버는 그 연결을 프레임 모드로 전환하고 첫 메시지로 welcome 프레임을 보낸다.
+# proto 필드가 없는 예전 클라이언트는 기존처럼 JSON 문자열을 그대로 주고받는다.
+#
+# 프레임 = 헤더(버전 1바이트, 메시지 타입 1바이트, 페이로드 길이 4바이트) + 페이로드
+PROTOCOL_VERSION = 1
+FRAME_HEADER = struct.Struct('!BBI')
+HEADER_SIZE = FRAME_HEADER.size
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# 헤더의 메시지 타입 코드 (새 타입은 뒤에만 추가할 것)
+# bus_* 타입은 워커 프로세스 사이의 로컬 버스(cluster.py)에서만 쓰인다
+MESSAGE_TYPES = ('other', 'line', 'chat', 'clear', 'join_exit', 'exit',
+                 'server_shutdown', 'welcome', 'join_room', 'room_changed',
+                 'bus_publish', 'bus_event', 'bus_stats', 'bus_control',
+                 'snapshot', 'checkpoint_request', 'checkpoint', 'stroke',
+                 'stroke_bin', 'history', 'search', 'bus_checkpoint')
+TYPE_CODES = {name: code for code, name in enumerate(MESSAGE_TYPES)}
+# 서버(와 워커 버스)만 보내는 타입 코드 - 클라이언트가 보내면 중계하지 않고 버린다
+# (history, search 응답은 같은 타입의 요청을 서버가 처리하므로 중계될 일이 없음)
+SERVER_CODES = frozenset(
+    code for name, code in TYPE_CODES.items()
+    if name.startswith('bus_') or name in (
+        'join_exit', 'server_shutdown', 'welcome', 'room_changed',
+        'snapshot', 'checkpoint_request'))
+TYPE_OTHER = 0
+# snapshot 프레임의 페이로드는 JSON이 아니라 선 프레임들을 이어 붙인 것 (board.py)
+SNAPSHOT_CODE = TYPE_CODES['snapshot']
+# stroke = 폴리라인 {'points': [x0, y0, x1, y1, ...], 'color', 'width', 'mode'}
+# 프레임 모드 클라이언트만 보내며, 예전 클라이언트에게는 서버가 line 메시지로 풀어서 보낸다
+STROKE_CODE = TYPE_CODES['stroke']
+# stroke_bin = stroke의 바이너리 형식 (NICK 핸드셰이크에서 'stroke_bin': true 로 협상)
+#   헤더: 색 RGB 3바이트, 굵기, 모드, 좌표 차이 바이트 수(1/2), 점 개수, 첫 점 x, y
+#   본문: 두 번째 점부터 앞 점과의 차이 (dx, dy)를 부호 있는 정수로 나열
+STROKE_BIN_CODE = TYPE_CODES['stroke_bin']
+BINARY_STROKE = struct.Struct('!3sBBBHhh')
+STROKE_MODES = ('pen', 'eraser')
+DELTA_TYPES = {1: 'b', 2: 'h'}
+
+# 연결이 받을 수 있는 그리기 메시지 수준 (서버가 낮은 수준으로 변환해서 보냄)
+DRAWING_LEGACY = 0  # line만 (예전 JSON 스트림)
+DRAWING_STROKE = 1  # line, stroke
+DRAWING_BINARY = 2  # line, stroke, stroke_bin
+
+# 압축 - NICK 핸드셰이크에서 'compress': true 로 협상하면 welcome에 같은 값이 돌아온다
+# 협상한 연결은 COMPRESS_THRESHOLD 이상인 프레임을 프레임 단위로 압축해서 보낸다.
+# 압축 프레임은 타입 코드에 COMPRESSED_FLAG를 켜고, 페이로드를 공유 사전(COMPRESS_DICT)을
+# 쓰는 raw deflate로 바꾼 것이다. 연결별 스트림 대신 프레임 단위로 압축하므로
+# 서버는 같은 프레임을 한 번만 압축해서 방의 모든 연결에 그대로 보낼 수 있다.
+COMPRESSED_FLAG = 0x80
+COMPRESS_THRESHOLD = 256
+COMPRESS_LEVEL = 6
+# 메시지 스키마에 자주 나오는 조각 (뒤쪽일수록 가까운 거리로 참조되므로 흔한 것을 뒤에 둠)
+COMPRESS_DICT = (
+    b'{"type": "join_exit", "message": "'
+    b'{"type": "checkpoint", "image": "iVBORw0KGgo'
+    b'{"type": "chat", "message": "'
+    b'"mode": "eraser"}'
+    b'"color": "#000000", "width": 2, "mode": "pen"}'
+    b'{"type": "stroke", "points": ['
+    b'{"type": "line", "x1": , "y1": , "x2": , "y2": , '
+    b'"color": "#ff0000", "width": 2, "mode": "pen"}'
+    b'{"type": "line", "x1": '
+)
+
+# 방(보드) - NICK 핸드셰이크의 'room' 필드로 고르고 join_room 메시지로 옮길 수 있다
+DEFAULT_ROOM = 'lobby'
+MAX_ROOM_NAME = 64
+
+# 선 좌표 범위 (클라이언트 선 저장소는 32비트 정수 배열)와 펜 굵기 범위
+MAX_COORDINATE = 2 ** 31 - 1
+MAX_PEN_WIDTH = 0xFF
+
+
+def normalize_room(room):
+    room = str(room).strip()[:MAX_ROOM_NAME] if room else ''
+    return room or DEFAULT_ROOM
+
+
+class ProtocolError(ValueError):
+    # 복구할 수 없는 스트림 오류 (연결을 끊어야 함)
+    pass
+
+
+def type_code(msg_type):
+    return TYPE_CODES.get(msg_type, TYPE_OTHER)
+
+
+def encode_payload(data):
+    return json.dumps(data).encode('utf-8')
+
+
+def frame_header(code, length):
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"프레임 크기 초과: {length}")
+    return FRAME_HEADER.pack(PROTOCOL_VERSION, code, length)
+
+
+def encode_frame(code, payload):
+    return frame_header(code, len(payload)) + payload
+
+
+def encode_message(data):
+    # dict 메시지 하나를 프레임으로 인코딩
+    return encode_frame(type_code(data.get('type')), encode_payload(data))
+
+
+class CompressionStats:
+    # 압축/해제한 프레임 수, 전/후 바이트, 걸린 시간 (CPU 대비 절약한 바이트 측정용)
+
+    def __init__(self):
+        self.compressed = 0  # 압축해서 보낸 프레임 수
+        self.skipped = 0  # 압축해 봤지만 줄지 않아 원본으로 보낸 프레임 수
+        self.raw_out = 0  # 압축 대상 프레임의 원래 바이트 합
+        self.wire_out = 0  # 실제로 보낸 바이트 합
+        self.compress_seconds = 0.0
+        self.inflated = 0  # 받아서 푼 프레임 수
+        self.wire_in = 0
+        self.raw_in = 0
+        self.inflate_seconds = 0.0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def compress_frame(frame, stats=None):
+    # 프레임 하나를 압축 프레임으로 (임계값보다 작거나 줄지 않으면 원래 프레임 그대로)
+    # 이미 압축한 프레임(미리 압축해 둔 스냅샷 등)도 그대로
+    if len(frame) < COMPRESS_THRESHOLD or frame[1] & COMPRESSED_FLAG:
+        return frame
+    started = time.perf_counter()
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                  zdict=COMPRESS_DICT)
+    payload = compressor.compress(frame[HEADER_SIZE:]) + compressor.flush()
+    result = frame
+    if len(payload) + HEADER_SIZE < len(frame):
+        result = encode_frame(frame[1] | COMPRESSED_FLAG, payload)
+    if stats is not None:
+        stats.compress_seconds += time.perf_counter() - started
+        stats.raw_out += len(frame)
+        stats.wire_out += len(result)
+        if result is frame:
+            stats.skipped += 1
+        else:
+            stats.compressed += 1
+    return result
+
+
+def inflate_frame(code, frame, stats=None):
+    # 압축 프레임을 풀어서 (원래 타입 코드, 헤더를 포함한 원래 프레임) 반환
+    started = time.perf_counter()
+    inflater = zlib.decompressobj(-zlib.MAX_WBITS, zdict=COMPRESS_DICT)
+    try:
+        payload = inflater.decompress(frame[HEADER_SIZE:], MAX_FRAME_SIZE)
+    except zlib.error as e:
+        raise ProtocolError(f"압축 해제 실패: {e}")
+    if inflater.unconsumed_tail or not inflater.eof:
+        # 풀었을 때 최대 프레임 크기를 넘거나 압축 스트림이 잘림
+        raise ProtocolError("잘못된 압축 프레임")
+    code &= ~COMPRESSED_FLAG
+    result = memoryview(encode_frame(code, payload))
+    if stats is not None:
+        stats.inflate_seconds += time.perf_counter() - started
+        stats.inflated += 1
+        stats.wire_in += len(frame)
+        stats.raw_in += len(result)
+    return code, result
+
+
+def stroke_to_lines(stroke):
+    # stroke 메시지를 이어지는 line 메시지 목록으로 변환
+    points = stroke['points']
+    lines = []
+    for i in range(2, len(points) - 1, 2):
+        lines.append({
+            'type': 'line',
+            'x1': points[i - 2], 'y1': points[i - 1],
+            'x2': points[i], 'y2': points[i + 1],
+            'color': stroke['color'],
+            'width': stroke['width'],
+            'mode': stroke.get('mode', 'pen'),
+        })
+    return lines
+
+
+def lines_frame(stroke):
+    # 예전 클라이언트용: stroke를 line JSON들을 이어 붙인 페이로드로 바꾼다
+    # 헤더는 길이만 맞춘 것으로, write_frame이 떼고 보내므로 스트림에는 나가지 않음
+    try:
+        lines = stroke_to_lines(stroke)
+    except (KeyError, TypeError, IndexError):
+        return None
+    payload = b''.join(encode_payload(line) for line in lines)
+    return memoryview(encode_frame(STROKE_CODE, payload))
+
+
+def downconvert_stroke(frame):
+    return lines_frame(decode_frame(frame))
+
+
+def encode_binary_stroke(stroke):
+    # stroke 메시지를 stroke_bin 프레임으로 인코딩 (표현할 수 없으면 None)
+    points = stroke['points']
+    color = stroke['color']
+    count = len(points) // 2
+    if len(points) % 2 or not 2 <= count <= 0xFFFF or len(color) != 7 or \
+            stroke.get('mode', 'pen') not in STROKE_MODES or \
+            not 0 <= stroke['width'] <= 0xFF:
+        return None
+    try:
+        deltas = [b - a for a, b in zip(points, points[2:])]
+    except TypeError:
+        return None
+    if all(-128 <= d <= 127 for d in deltas):
+        delta_size = 1
+    elif all(-32768 <= d <= 32767 for d in deltas):
+        delta_size = 2
+    else:
+        return None
+    try:
+        header = BINARY_STROKE.pack(
+            bytes.fromhex(color[1:]), stroke['width'],
+            STROKE_MODES.index(stroke.get('mode', 'pen')), delta_size, count,
+            points[0], points[1])
+        body = array(DELTA_TYPES[delta_size], deltas)
+    except (ValueError, TypeError, struct.error):
+        return None
+    if delta_size > 1 and sys.byteorder == 'little':
+        body.byteswap()
+    return encode_frame(STROKE_BIN_CODE, header + body.tobytes())
+
+
+def decode_binary_stroke(frame):
+    # stroke_bin 프레임을 stroke 메시지로 디코딩 (잘못된 프레임이면 None)
+    payload = frame[HEADER_SIZE:]
+    try:
+        color, width, mode, delta_size, count, x, y = \
+            BINARY_STROKE.unpack_from(payload)
+        body = array(DELTA_TYPES[delta_size])
+        body.frombytes(payload[BINARY_STROKE.size:])
+        mode = STROKE_MODES[mode]
+    except (struct.error, KeyError, ValueError, IndexError):
+        print("잘못된 바이너리 stroke")
+        return None
+    if len(body) != (count - 1) * 2:
+        print("잘못된 바이너리 stroke")
+        return None
+    if delta_size > 1 and sys.byteorder == 'little':
+        body.byteswap()
+    points = [x, y]
+    points[2:] = body
+    # x, y 좌표를 각각 누적해서 절대 좌표로 복원
+    points[0::2] = accumulate(points[0::2])
+    points[1::2] = accumulate(points[1::2])
+    return {'type': 'stroke', 'points': points, 'color': '#' + color.hex(),
+            'width': width, 'mode': mode}
+
+
+def convert_drawing(code, frame, level):
+    # 그리기 프레임을 level 수준의 연결이 받을 수 있는 형식으로 변환
+    # 변환이 필요 없으면 그대로, 잘못된 프레임이면 None
+    if code == STROKE_BIN_CODE and level < DRAWING_BINARY:
+        stroke = decode_binary_stroke(frame)
+        if stroke is None:
+            return None
+        if level == DRAWING_STROKE:
+            return memoryview(encode_message(stroke))
+        return lines_frame(stroke)
+    if code == STROKE_CODE and level < DRAWING_STROKE:
+        return downconvert_stroke(frame)
+    return frame
+
+
+def is_framed_stream(first_bytes):
+    # 핸드셰이크 직후 첫 바이트로 상대가 프레임 모드인지 판별
+    # (예전 서버는 '{'로 시작하는 JSON을 바로 보낸다)
+    return bool(first_bytes) and first_bytes[0] == PROTOCOL_VERSION
+
+
+class FrameDecoder:
+    # 바이트 스트림을 프레임 단위로 자르는 증분 디코더
+    # 잘린 프레임은 다음 feed까지 보관하고, 한 번에 여러 프레임이 와도 한 번에 처리한다.
+    # 프레임은 수신한 바이트를 복사하지 않는 memoryview로 돌려주므로
+    # 서버는 헤더만 보고 원본 바이트를 그대로 중계할 수 있다.
+    # 압축 프레임은 여기서 풀어서 돌려주므로 이후 처리는 압축 여부를 모른다.
+
+    def __init__(self, stats=None):
+        self.buffer = bytearray()
+        self.needed = 0  # buffer에 잘린 프레임이 있을 때 그 프레임을 끝내는 데 필요한 길이
+        self.stats = stats  # CompressionStats (압축 해제 통계, 없으면 기록 안 함)
+
+    def feed(self, data):
+        # 완성된 (타입 코드, 헤더를 포함한 프레임 memoryview) 목록 반환
+        if self.buffer:
+            # 이전에 잘린 프레임이 있을 때만 이어 붙이고, 그 프레임이 끝날 때까지는 모으기만 한다
+            # (큰 프레임이 잘게 나뉘어 와도 받을 때마다 버퍼 전체를 복사하지 않도록)
+            self.buffer += data
+            if len(self.buffer) < self.needed:
+                return []
+            data = bytes(self.buffer)
+            self.buffer.clear()
+
+        view = memoryview(data)
+        frames = []
+        offset = 0
+        size = len(view)
+        self.needed = HEADER_SIZE
+
+        while size - offset >= HEADER_SIZE:
+            version, code, length = FRAME_HEADER.unpack_from(view, offset)
+            if version != PROTOCOL_VERSION:
+                raise ProtocolError(f"지원하지 않는 프로토콜 버전: {version}")
+            if length > MAX_FRAME_SIZE:
+                raise ProtocolError(f"프레임 크기 초과: {length}")
+
+            end = offset + HEADER_SIZE + length
+            if end > size:
+                self.needed = HEADER_SIZE + length
+                break
+            frame = view[offset:end]
+            if code & COMPRESSED_FLAG:
+                code, frame = inflate_frame(code, frame, self.stats)
+            frames.append((code, frame))
+            offset = end
+
+        if offset < size:
+            self.buffer += view[offset:]
+        return frames
+
+    def feed_messages(self, data):
+        messages = []
+        for code, frame in self.feed(data):
+            if code == SNAPSHOT_CODE:
+                message = decode_snapshot(frame)
+            elif code == STROKE_BIN_CODE:
+                message = decode_binary_stroke(frame)
+            else:
+                message = decode_frame(frame)
+            if message is not None:
+                messages.append(message)
+        return messages
+
+
+def decode_frame(frame):
+    # 프레임 페이로드를 dict로 파싱 (잘못된 JSON이면 None)
+    payload = bytes(frame[HEADER_SIZE:])
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        print(f"잘못된 JSON 형식: {payload[:100]!r}")
+        return None
+    return message if isinstance(message, dict) else None
+
+
+def json_incomplete(error, size):
+    # 길이 size인 텍스트를 파싱하다 난 JSONDecodeError가 텍스트가 덜 와서 난 것인지
+    # (\uXXXX 이스케이프 중간에서 잘린 것 포함 - json.dumps는 한글을 이렇게 보냄)
+    if error.pos >= size or error.msg.startswith('Unterminated string'):
+        return True
+    # 이스케이프는 \ 다음 u와 16진수 4자리이고, 파서는 그 뒤에 한 글자가 더 있어야 읽는다
+    return error.msg.startswith('Invalid \\uXXXX') and error.pos + 5 >= size
+
+
+def valid_coordinates(values):
+    return all(type(value) is int and -MAX_COORDINATE <= value <= MAX_COORDINATE
+               for value in values)
+
+
+def valid_drawing(data):
+    # line/stroke 메시지를 그릴 수 있는지
+    # 좌표는 정수, stroke는 짝이 맞는 좌표로 점 두 개 이상, 굵기는 정수, 색은 문자열
+    width = data.get('width')
+    if not isinstance(data.get('color'), str) or type(width) is not int or \
+            not 0 <= width <= MAX_PEN_WIDTH:
+        return False
+    if data.get('type') == 'stroke':
+        points = data.get('points')
+        return isinstance(points, list) and len(points) >= 4 and \
+            len(points) % 2 == 0 and valid_coordinates(points)
+    return valid_coordinates(data.get(key) for key in ('x1', 'y1', 'x2', 'y2'))
+
+
+def decode_snapshot(frame):
+    # 보드 스냅샷을 {'type': 'snapshot', 'lines': [선 메시지, ...]} 로 변환
+    # 안쪽 선 프레임 하나가 잘못되어도 그 선만 빠진다
+    try:
+        lines = FrameDecoder().feed_messages(frame[HEADER_SIZE:])
+    except ProtocolError as e:
+        print(f"잘못된 스냅샷: {e}")
+        return None
+    return {'type': 'snapshot', 'lines': lines}
+
+
+class LegacyDecoder:
+    # 프레임이 없는 예전 JSON 스트림용 디코더
+    # 연속으로 붙어 오거나 중간에 잘린 JSON 객체를 순서대로 분리한다
+
+    def __init__(self):
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+
+    def feed_messages(self, data):
+        self.buffer += self.text_decoder.decode(data)
+        buffer = self.buffer
+        messages = []
+        pos = 0
+        size = len(buffer)
+
+        while pos < size:
+            start = buffer.find('{', pos)
+            if start == -1:
+                # 객체 시작이 없으면 나머지는 버림
+                pos = size
+                break
+            try:
+                message, pos = self.json_decoder.raw_decode(buffer, start)
+            except json.JSONDecodeError as e:
+                if json_incomplete(e, size):
+                    # 아직 끝까지 도착하지 않은 객체
+                    pos = start
+                    break
+                # 잘못된 JSON은 건너뛰고 다음 객체부터 다시 시작
+                print(f"잘못된 JSON 형식: {buffer[start:e.pos + 1]}")
+                pos = start + 1
+                continue
+            if isinstance(message, dict):
+                messages.append(message)
+
+        self.buffer = buffer[pos:]
+        if len(self.buffer) > MAX_FRAME_SIZE:
+            raise ProtocolError("JSON 메시지가 너무 깁니다.")
+        return messages
@@ -1,86 +1,150 @@
 import sys
 import socket
-import threading
-import json
-import ssl
 from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
-                             QHBoxLayout, QLabel, QTreeWidget, QTreeWidgetItem, QTextEdit, QMenu, QAction, QPushButton)
+                             QHBoxLayout, QLabel, QTableView, QAbstractItemView, QTextEdit, QMenu, QAction, QPushButton)
 from PyQt5.QtCore import Qt, QMetaObject, Q_ARG, Qt, pyqtSlot
-from PyQt5.QtCore import QTimer
-import subprocess
+from PyQt5.QtCore import QTimer, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from server_core import build_arg_parser, create_server
 
 
-class ServerWindow(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.clients = []
-        self.nicknames = []
-        self.client_connect_times = {}
-        self.ip_toggle_state = False  # IP 표시 상태 추적
-        self.initUI()
-        self.setupServer()
+def format_elapsed(connect_time):
+    # hh:mm:ss 형식으로 포맷팅
+    hours, remainder = divmod(
+        int((datetime.now() - connect_time).total_seconds()), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
-        # 경과 시간 업데이트를 위한 타이머 설정
-        self.elapsed_time_timer = QTimer()
-        self.elapsed_time_timer.timeout.connect(self.update_elapsed_times)
-        self.elapsed_time_timer.start(1000)  # 1초마다 업데이트
 
-        # 트리 위젯에 컨텍스트 메뉴 설정
-        self.tree.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.tree.customContextMenuRequested.connect(
-            self.show_tree_context_menu)
+class ClientTableModel(QAbstractTableModel):
+    # 접속자 표 모델
+    # 연결 번호 -> 행 번호 사전으로 추가/변경/삭제를 행 하나만 건드려 처리하고,
+    # 경과 시간은 data()에서 계산해 타이머마다 열 단위 dataChanged 한 번으로 갱신한다.
+    COLUMNS = ['닉네임', '방', '접속시간', '포트', '경과시간', '상태', '송신 대기열']
+    NICKNAME, ROOM, CONNECT_TIME, PORT, ELAPSED, STATUS, QUEUE = range(7)
 
-        # 레이아웃 초기화
-        self.layout = QVBoxLayout()  # QVBoxLayout으로 초기화
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []  # 행 순서대로 클라이언트 정보
+        self.row_of = {}  # 연결 번호 -> 행 번호
+        self.queue_depths = {}  # 연결 번호 -> (대기열 길이, 버린 수)
 
-        # 접속자 수 레이블
-        self.count_label = QLabel('현재 접속자 수: 0명')
-        self.layout.addWidget(self.count_label)
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
 
-        # 트리 위젯 설정
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(['닉네임', '접속시간', '포트', '경과시간', '상태'])
-        self.tree.setColumnWidth(0, 150)
-        self.tree.setColumnWidth(1, 200)
-        self.tree.setColumnWidth(2, 100)
-        self.tree.setColumnWidth(3, 100)
-        self.tree.setColumnWidth(4, 100)
-        self.layout.addWidget(self.tree)
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
 
-        # IP 주소 레이아웃 추가
-        ip_layout = QHBoxLayout()
-        self.ip_label = QLabel(f"서버 로컬 IP 주소: {self.get_internal_ip()}")
-        self.ip_toggle_button = QPushButton("IP 형식 변환")
-        self.ip_toggle_button.clicked.connect(self.toggle_ip_format)
-
-        # 서버 종료 버튼 추가
-        self.server_shutdown_button = QPushButton("서버 종료")
-        self.server_shutdown_button.clicked.connect(self.shutdown_server)
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
 
-        ip_layout.addWidget(self.ip_label)
-        ip_layout.addWidget(self.ip_toggle_button)
-        ip_layout.addWidget(self.server_shutdown_button)  # 버튼 추가
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        client = self.rows[index.row()]
+        column = index.column()
+        if role == Qt.UserRole:
+            return client['id']
+        if role != Qt.DisplayRole:
+            return None
 
-        self.layout.addLayout(ip_layout)  # IP 레이아웃 추가
+        if column == self.NICKNAME:
+            return client['nickname']
+        if column == self.ROOM:
+            return client['room']
+        if column == self.CONNECT_TIME:
+            return client['connect_time'].strftime("%Y-%m-%d %H:%M:%S")
+        if column == self.PORT:
+            return str(client['port'])
+        if column == self.ELAPSED:
+            # 종료된 연결은 마지막 경과 시간을 그대로 보여줌
+            return client['elapsed'] or format_elapsed(client['connect_time'])
+        if column == self.STATUS:
+            return client['status']
+        if column == self.QUEUE:
+            depth, dropped = self.queue_depths.get(client['id'], (0, 0))
+            return f"{depth} (버림 {dropped})" if dropped else str(depth)
+        return None
+
+    def client_id(self, index):
+        return self.rows[index.row()]['id'] if index.isValid() else None
+
+    def add_client(self, connection_id, nickname, port, room):
+        if connection_id in self.row_of:
+            return
+        row = len(self.rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.append({'id': connection_id, 'nickname': nickname,
+                          'room': room, 'port': port,
+                          'connect_time': datetime.now(), 'elapsed': None,
+                          'status': "연결됨"})
+        self.row_of[connection_id] = row
+        self.endInsertRows()
+
+    def set_value(self, connection_id, column, key, value):
+        row = self.row_of.get(connection_id)
+        if row is None:
+            return
+        self.rows[row][key] = value
+        index = self.index(row, column)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def set_room(self, connection_id, room):
+        self.set_value(connection_id, self.ROOM, 'room', room)
+
+    def mark_closed(self, connection_id):
+        row = self.row_of.get(connection_id)
+        if row is None:
+            return
+        client = self.rows[row]
+        client['elapsed'] = format_elapsed(client['connect_time'])
+        self.set_value(connection_id, self.STATUS, 'status', "종료됨")
+
+    def remove_client(self, connection_id):
+        row = self.row_of.pop(connection_id, None)
+        if row is None:
+            return
+        self.queue_depths.pop(connection_id, None)
+        last = len(self.rows) - 1
+        if row != last:
+            # 마지막 행을 지울 행 자리로 옮겨서 뒤쪽 행 번호가 밀리지 않게 함
+            moved = self.rows[last]
+            self.rows[row] = moved
+            self.row_of[moved['id']] = row
+            self.dataChanged.emit(self.index(row, 0),
+                                  self.index(row, len(self.COLUMNS) - 1))
+        self.beginRemoveRows(QModelIndex(), last, last)
+        self.rows.pop()
+        self.endRemoveRows()
+
+    def refresh_live_columns(self, queue_depths):
+        # 경과 시간과 송신 대기열 열만 한 번에 갱신
+        self.queue_depths = queue_depths
+        if not self.rows:
+            return
+        last = len(self.rows) - 1
+        for column in (self.ELAPSED, self.QUEUE):
+            self.dataChanged.emit(self.index(0, column),
+                                  self.index(last, column), [Qt.DisplayRole])
 
-        # 텍스트 박스 추가
-        self.netstat_textbox = QTextEdit(self)
-        self.netstat_textbox.setReadOnly(True)
-        self.layout.addWidget(self.netstat_textbox)  # 텍스트 박스 추가
 
-        # 메인 위젯 설정
-        main_widget = QWidget()
-        main_widget.setLayout(self.layout)  # 메인 위젯에 레이아웃 설정
-        self.setCentralWidget(main_widget)  # 중앙 위젯으로 설정
-
-        # 트리 위젯에 컨텍스트 메뉴 설정
-        self.tree.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.tree.customContextMenuRequested.connect(
-            self.show_tree_context_menu)
+class ServerWindow(QMainWindow):
+    # 서버 모니터 창
+    # 네트워크는 ServerCore(또는 ClusterSupervisor)가 담당하고,
+    # 이 창은 옵저버로 붙어서 상태를 표시하고 연결 끊기/종료만 요청한다.
+    def __init__(self, core):
+        super().__init__()
+        self.core = core
+        self.ip_toggle_state = False  # IP 표시 상태 추적
+        self.initUI()
+        self.core.add_observer(self)
 
-        # 초기 netstat 결과 업데이트
-        self.update_netstat()
+        # 경과 시간 업데이트를 위한 타이머 설정
+        self.elapsed_time_timer = QTimer()
+        self.elapsed_time_timer.timeout.connect(self.update_elapsed_times)
+        self.elapsed_time_timer.start(1000)  # 1초마다 업데이트
 
     def initUI(self):
         self.setWindowTitle('그림판 & 채팅 서버')
@@ -93,15 +157,34 @@ class ServerWindow(QMainWindow):
         self.count_label = QLabel('현재 접속자 수: 0명')
         self.layout.addWidget(self.count_label)
 
-        # 트리 위젯 설정
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(['닉네임', '접속시간', '포트', '경과시간', '상태'])
-        self.tree.setColumnWidth(0, 150)
-        self.tree.setColumnWidth(1, 200)
-        self.tree.setColumnWidth(2, 100)
-        self.tree.setColumnWidth(3, 100)
-        self.tree.setColumnWidth(4, 100)
-        self.layout.addWidget(self.tree)
+        # 핸드셰이크 지연 시간 레이블
+        self.handshake_label = QLabel('핸드셰이크: -')
+        self.layout.addWidget(self.handshake_label)
+
+        # 보드 상태/스냅샷 전송 레이블
+        self.board_label = QLabel('보드: -')
+        self.layout.addWidget(self.board_label)
+
+        # 프레임 압축 효과(절약한 바이트 대비 CPU 시간) 레이블
+        self.compression_label = QLabel('압축: -')
+        self.layout.addWidget(self.compression_label)
+
+        # 접속자 표 설정 (방 열 기준으로 정렬해서 같은 방끼리 모아 보여줌)
+        self.client_model = ClientTableModel(self)
+        self.proxy_model = QSortFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.client_model)
+        self.proxy_model.setDynamicSortFilter(True)
+
+        self.table = QTableView()
+        self.table.setModel(self.proxy_model)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(ClientTableModel.ROOM, Qt.AscendingOrder)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        for column, width in enumerate([150, 100, 160, 70, 90, 80, 100]):
+            self.table.setColumnWidth(column, width)
+        self.layout.addWidget(self.table)
 
         # IP 주소 레이아웃 추가
         ip_layout = QHBoxLayout()
@@ -119,194 +202,100 @@ class ServerWindow(QMainWindow):
 
         self.layout.addLayout(ip_layout)  # IP 레이아웃 추가
 
-        # 텍스트 박스 추가
-        self.netstat_textbox = QTextEdit(self)
-        self.netstat_textbox.setReadOnly(True)
-        self.layout.addWidget(self.netstat_textbox)  # 텍스트 박스 추가
+        # 소켓 통계 텍스트 박스 추가
+        self.stats_textbox = QTextEdit(self)
+        self.stats_textbox.setReadOnly(True)
+        self.stats_textbox.setLineWrapMode(QTextEdit.NoWrap)
+        self.stats_textbox.setFontFamily('monospace')
+        self.layout.addWidget(self.stats_textbox)  # 텍스트 박스 추가
 
         # 메인 위젯 설정
         main_widget = QWidget()
         main_widget.setLayout(self.layout)  # 메인 위젯에 레이아웃 설정
         self.setCentralWidget(main_widget)  # 중앙 위젯으로 설정
 
-        # 트리 위젯에 컨텍스트 메뉴 설정
-        self.tree.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.tree.customContextMenuRequested.connect(
-            self.show_tree_context_menu)
-
-        # 초기 netstat 결과 업데이트
-        self.update_netstat()
-
-    def setupServer(self):
-        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server.bind(('localhost', 3000))
-        self.server.listen(5)
-        print("서버가 시작되었습니다...")
-
-        # SSL 컨텍스트 생성
-        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-        context.load_cert_chain(
-            certfile='auth/certfile.pem', keyfile='auth/keyfile.pem')
-
-        # SSL 소켓으로 래핑
-        self.server = context.wrap_socket(self.server, server_side=True)
-
-        # 연결 수락 스레드 시작
-        accept_thread = threading.Thread(target=self.accept_connections)
-        accept_thread.daemon = True
-        accept_thread.start()
+        # 접속자 표에 컨텍스트 메뉴 설정
+        self.table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.table.customContextMenuRequested.connect(
+            self.show_table_context_menu)
+
+    def on_client_joined(self, connection_id, nickname, port, room):
+        # 이벤트 루프 스레드에서 호출됨 - GUI 업데이트를 메인 스레드에서 실행
+        QMetaObject.invokeMethod(self,
+                                 "add_client_slot",
+                                 Qt.QueuedConnection,
+                                 Q_ARG(int, connection_id),
+                                 Q_ARG(str, nickname),
+                                 Q_ARG(int, port),
+                                 Q_ARG(str, room))
+
+    def on_client_room_changed(self, connection_id, room):
+        QMetaObject.invokeMethod(self,
+                                 "move_client_slot",
+                                 Qt.QueuedConnection,
+                                 Q_ARG(int, connection_id),
+                                 Q_ARG(str, room))
+
+    def on_client_left(self, connection_id):
+        # 이벤트 루프 스레드에서 호출됨 - GUI 업데이트를 메인 스레드에서 실행
+        QMetaObject.invokeMethod(self,
+                                 "remove_client_slot",
+                                 Qt.QueuedConnection,
+                                 Q_ARG(int, connection_id))
 
     def update_client_count(self):
         # 접속자 수 업데이트
-        self.count_label.setText(f"현재 접속자 수: {len(self.clients)}명")
-
-    @pyqtSlot(str, int)
-    def add_client_to_tree_slot(self, nickname, port):
+        text = (f"현재 접속자 수: {self.core.client_count()}명 "
+                f"(방 {self.core.room_count()}개)")
+        if hasattr(self.core, 'worker_counts'):
+            # 멀티 프로세스 모드에서는 워커별 접속자 수도 표시
+            counts = self.core.worker_counts()
+            text += " | 워커별: " + ", ".join(
+                f"#{worker} {count}명" for worker, count in sorted(counts.items()))
+        self.count_label.setText(text)
+
+    @pyqtSlot(int, str, int, str)
+    def add_client_slot(self, connection_id, nickname, port, room):
         try:
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            connect_time = datetime.now()
-
-            # 클라이언트 접속 시간 저장
-            self.client_connect_times[nickname] = connect_time
-
-            item = QTreeWidgetItem([
-                nickname,
-                current_time,
-                str(port),
-                "0초",
-                "연결됨"
-            ])
-            self.tree.addTopLevelItem(item)
+            self.client_model.add_client(connection_id, nickname, port, room)
             self.update_client_count()
         except Exception as e:
-            print(f"트리 추가 중 오류: {e}")
+            print(f"접속자 추가 중 오류: {e}")
 
-    @pyqtSlot(str)
-    def remove_client_slot(self, nickname):
+    @pyqtSlot(int, str)
+    def move_client_slot(self, connection_id, room):
+        # 방 이동 - 방 열만 바꾸면 정렬 모델이 새 방 위치로 옮겨 줌
         try:
-            for i in range(self.tree.topLevelItemCount()):
-                item = self.tree.topLevelItem(i)
-                if item.text(0) == nickname:
-                    item.setText(4, "종료됨")  # 상태 컬럼 인덱스 변경
-
-                    # 클라이언트 접속 시간 제거
-                    if nickname in self.client_connect_times:
-                        del self.client_connect_times[nickname]
-
-                    # 2초 후에 항목 삭제하고 카운트 업데이트
-                    QTimer.singleShot(2000, lambda: self.delayed_remove(i))
-                    break
+            self.client_model.set_room(connection_id, room)
             self.update_client_count()
         except Exception as e:
-            print(f"트리 제거 중 오류: {e}")
+            print(f"접속자 방 이동 중 오류: {e}")
 
-    def delayed_remove(self, index):
-        # 지연된 트리 항목 제거
+    @pyqtSlot(int)
+    def remove_client_slot(self, connection_id):
         try:
-            self.tree.takeTopLevelItem(index)
+            self.client_model.mark_closed(connection_id)
+
+            # 2초 후에 행 삭제 (행 번호가 아니라 연결 번호로 찾으므로 그사이 행이 바뀌어도 안전)
+            QTimer.singleShot(2000, lambda: self.delayed_remove(connection_id))
             self.update_client_count()
         except Exception as e:
-            print(f"지연 제거 중 오류: {e}")
+            print(f"접속자 제거 중 오류: {e}")
 
-    def remove_client(self, client, nickname):
+    def delayed_remove(self, connection_id):
+        # 지연된 행 제거
         try:
-            if client in self.clients:
-                # GUI 업데이트를 메인 스레드에서 실행
-                QMetaObject.invokeMethod(self,
-                                         "remove_client_slot",
-                                         Qt.QueuedConnection,
-                                         Q_ARG(str, nickname))
-
-                # 클라이언트 리스트에서 제거
-                self.clients.remove(client)
-                if nickname in self.nicknames:
-                    self.nicknames.remove(nickname)
-
-                # 퇴장 메시지 브로드캐스트
-                exit_message = {
-                    'type': 'join_exit',
-                    'message': f"{nickname}님이 퇴장하셨습니다."
-                }
-                self.broadcast(json.dumps(exit_message).encode('utf-8'))
-
-                try:
-                    client.shutdown(socket.SHUT_RDWR)
-                except:
-                    pass
-                finally:
-                    client.close()
-
+            self.client_model.remove_client(connection_id)
+            self.update_client_count()
         except Exception as e:
-            print(f"클라이언트 제거 중 오류: {e}")
-
-    def accept_connections(self):
-        while True:
-            try:
-                client, address = self.server.accept()
-                print(f"새로운 연결: {address}")
-
-                # 닉네임 요청
-                client.send('NICK'.encode('utf-8'))
-                nickname = client.recv(1024).decode('utf-8').strip()
-
-                # JSON 형식인지 확인하고, JSON이면 닉네임만 추출
-                try:
-                    data = json.loads(nickname)
-                    if isinstance(data, dict) and 'nickname' in data:
-                        nickname = data['nickname']
-                except json.JSONDecodeError:
-                    pass
-
-                self.clients.append(client)
-                self.nicknames.append(nickname)
-
-                # GUI 업데이트 (포트 번호 추가)
-                QMetaObject.invokeMethod(self,
-                                         "add_client_to_tree_slot",
-                                         Qt.QueuedConnection,
-                                         Q_ARG(str, nickname),
-                                         Q_ARG(int, address[1]))  # 포트 번호 전달
-
-                # 입장 메시지 브로드캐스트
-                join_message = {
-                    'type': 'join_exit',
-                    'message': f"{nickname}님이 입장하셨습니다!"
-                }
-                self.broadcast(json.dumps(join_message).encode('utf-8'))
-
-                # 클라이언트 처리 스레드 시작
-                thread = threading.Thread(target=self.handle_client,
-                                          args=(client, nickname))
-                thread.daemon = True
-                thread.start()
-
-            except Exception as e:
-                print(f"연결 수락 중 오류: {e}")
-                break
-
-    def broadcast(self, message, exclude=None):
-        for client in self.clients:
-            if client != exclude:
-                try:
-                    client.send(message)
-                except:
-                    pass
+            print(f"지연 제거 중 오류: {e}")
 
     def closeEvent(self, event):
         # 타이머 중지
         self.elapsed_time_timer.stop()
 
-        # 기존 클로즈 이벤트 로직
-        for client in self.clients:
-            try:
-                client.close()
-            except:
-                pass
-
-        try:
-            self.server.close()
-        except:
-            pass
+        # 네트워크 코어 종료
+        self.core.shutdown()
 
         event.accept()
 
@@ -347,105 +336,85 @@ class ServerWindow(QMainWindow):
         except Exception as e:
             print(f"IP 변환 중 오류: {e}")
 
-    def handle_client(self, client, nickname):
-        # 클라이언트의 메시지를 처리하는 메서드
-        while True:
-            try:
-                message = client.recv(1024).decode('utf-8')
-                if not message:
-                    break
-
-                try:
-                    # JSON 메시지 파싱
-                    data = json.loads(message)
-                    # 모든 클라이언트에게 메시지 전달
-                    self.broadcast(json.dumps(data).encode('utf-8'))
-                except json.JSONDecodeError:
-                    print(f"잘못된 JSON 형식: {message}")
-
-            except Exception as e:
-                print(f"클라이언트 처리 중 오류: {e}")
-                break
-
-        # 연결이 끊어진 경우 클라이언트 제거
-        self.remove_client(client, nickname)
-
     def update_elapsed_times(self):
-        # 모든 클라이언트의 경과 시간 업데이트
-        for i in range(self.tree.topLevelItemCount()):
-            item = self.tree.topLevelItem(i)
-            nickname = item.text(0)
-
-            if nickname in self.client_connect_times:
-                connect_time = self.client_connect_times[nickname]
-                elapsed_time = datetime.now() - connect_time
-
-                # hh:mm:ss 형식으로 포맷팅
-                hours, remainder = divmod(
-                    int(elapsed_time.total_seconds()), 3600)
-                minutes, seconds = divmod(remainder, 60)
-
-                elapsed_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-
-                item.setText(3, elapsed_str)
-
-        # 트리뷰 업데이트 후 netstat 결과 업데이트
-        self.update_netstat()
-
-    def update_netstat(self):
-        # netstat 명령 실행
-        result = subprocess.run(
-            ['netstat', '-an'], capture_output=True, text=True)
-        # 3000 포트 관련 결과 필터링
-        filtered_result = "\n".join(
-            [line for line in result.stdout.splitlines() if '3000' in line])
-        # 텍스트 박스에 결과 업데이트
-        self.netstat_textbox.setPlainText(filtered_result)
-
-    def show_tree_context_menu(self, pos):
-        # 트리 위젯에서 우클릭 시 컨텍스트 메뉴 표시
-        item = self.tree.itemAt(pos)
-        if item:
+        # 경과 시간과 연결별 송신 대기열 길이 갱신
+        self.client_model.refresh_live_columns(self.core.queue_depths())
+        self.update_handshake_stats()
+        self.update_board_stats()
+        self.update_compression_stats()
+
+    def update_handshake_stats(self):
+        # 최근 핸드셰이크 단계별 지연 시간 표시
+        stats = self.core.handshake_stats()
+        failures = stats['failures']
+        self.handshake_label.setText(
+            f"핸드셰이크 {stats['count']}건 (진행 중 {stats['pending']}) | "
+            f"TLS 평균 {stats['tls_avg']:.1f}ms, p95 {stats['tls_p95']:.1f}ms | "
+            f"NICK 평균 {stats['nick_avg']:.1f}ms, p95 {stats['nick_p95']:.1f}ms | "
+            f"실패 TLS {failures['tls']} / NICK {failures['nick']}")
+
+    def update_board_stats(self):
+        # 서버가 보관 중인 보드 크기와 늦게 들어온 클라이언트에게 보낸 스냅샷 통계
+        stats = self.core.board_stats()
+        self.board_label.setText(
+            f"보드 {stats['boards']}개, 선 {stats['lines']}개 "
+            f"({format_bytes(stats['bytes'])}, 정리 {stats['compacted']}개, "
+            f"체크포인트 {format_bytes(stats['checkpoint_bytes'])}) | "
+            f"스냅샷 {stats['snapshots']}건 평균 "
+            f"{format_bytes(stats['snapshot_bytes_avg'])} / 최대 "
+            f"{format_bytes(stats['snapshot_bytes_max'])}, "
+            f"평균 {stats['snapshot_ms_avg']:.1f}ms, p95 {stats['snapshot_ms_p95']:.1f}ms")
+
+    def update_compression_stats(self):
+        # 압축을 협상한 연결과 주고받은 프레임의 압축 전/후 크기와 걸린 시간
+        stats = self.core.compression_stats()
+        ratio_out = stats['wire_out'] / stats['raw_out'] if stats['raw_out'] else 1.0
+        ratio_in = stats['wire_in'] / stats['raw_in'] if stats['raw_in'] else 1.0
+        self.compression_label.setText(
+            f"압축 송신 {stats['compressed']}건 (효과 없음 {stats['skipped']}건) "
+            f"{format_bytes(stats['raw_out'])} -> {format_bytes(stats['wire_out'])} "
+            f"({ratio_out:.0%}), {stats['compress_ms']:.1f}ms | "
+            f"해제 수신 {stats['inflated']}건 {format_bytes(stats['wire_in'])} -> "
+            f"{format_bytes(stats['raw_in'])} ({ratio_in:.0%}), "
+            f"{stats['inflate_ms']:.1f}ms")
+
+    def on_socket_stats(self, sockets):
+        # 이벤트 루프 스레드에서 호출됨 - 문자열로 만드는 것까지 여기서 하고
+        # GUI 스레드는 텍스트 박스만 갱신한다
+        QMetaObject.invokeMethod(self,
+                                 "update_socket_stats_slot",
+                                 Qt.QueuedConnection,
+                                 Q_ARG(str, format_socket_stats(sockets)))
+
+    @pyqtSlot(str)
+    def update_socket_stats_slot(self, text):
+        self.stats_textbox.setPlainText(text)
+
+    def show_table_context_menu(self, pos):
+        # 접속자 표에서 우클릭 시 컨텍스트 메뉴 표시
+        index = self.proxy_model.mapToSource(self.table.indexAt(pos))
+        connection_id = self.client_model.client_id(index)
+        if connection_id is not None:
             context_menu = QMenu(self)
             disconnect_action = QAction("연결 끊기", self)
             disconnect_action.triggered.connect(
-                lambda: self.disconnect_client(item))
+                lambda: self.disconnect_client(connection_id))
             context_menu.addAction(disconnect_action)
-            context_menu.exec_(self.tree.mapToGlobal(pos))
+            context_menu.exec_(self.table.viewport().mapToGlobal(pos))
 
-    def disconnect_client(self, tree_item):
+    def disconnect_client(self, connection_id):
         # 특정 클라이언트 연결 끊기
         try:
-            nickname = tree_item.text(0)
-
-            # 해당 닉네임을 가진 클라이언트 찾기
-            for client in self.clients[:]:  # 복사본으로 순회
-                client_index = self.clients.index(client)
-                if self.nicknames[client_index] == nickname:
-                    # 클라이언트 제거 메서드 호출
-                    self.remove_client(client, nickname)
-                    break
+            # 네트워크 코어에 연결 끊기 요청
+            self.core.disconnect_client(connection_id)
         except Exception as e:
             print(f"클라이언트 연결 끊기 중 오류: {e}")
 
     def shutdown_server(self):
         try:
-            # 모든 클라이언트 연결 종료
-            for client in self.clients[:]:
-                try:
-                    # 클라이언트에게 서버 종료 메시지 전송
-                    shutdown_message = {
-                        'type': 'server_shutdown',
-                        'message': '서버가 종료됩니다.'
-                    }
-                    client.send(json.dumps(shutdown_message).encode('utf-8'))
-                    client.close()
-                except Exception as e:
-                    print(f"클라이언트 연결 종료 중 오류: {e}")
-
-            # 서버 소켓 종료
-            if hasattr(self, 'server'):
-                self.server.close()
+            # 모든 클라이언트에 종료 메시지를 보내고 서버 소켓 종료
+            if hasattr(self, 'core'):
+                self.core.shutdown()
 
             # 타이머 중지
             if hasattr(self, 'elapsed_time_timer'):
@@ -458,8 +427,42 @@ class ServerWindow(QMainWindow):
             print(f"서버 종료 중 오류: {e}")
 
 
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def format_socket_stats(sockets):
+    # 연결별 소켓 통계를 표 형태의 문자열로 변환
+    lines = [f"{'주소':<22}{'상태':<14}{'닉네임':<14}{'방':<12}"
+             f"{'수신':>10}{'송신':>10}{'대기열':>8}{'버퍼':>10}"]
+    total_in = total_out = 0
+    for entry in sorted(sockets, key=lambda e: e['address']):
+        total_in += entry['bytes_in']
+        total_out += entry['bytes_out']
+        address = entry['address']
+        if 'worker' in entry:
+            address = f"#{entry['worker']} {address}"
+        lines.append(
+            f"{address:<22}{entry['state']:<14}{entry['nickname']:<14}"
+            f"{entry['room']:<12}{format_bytes(entry['bytes_in']):>10}"
+            f"{format_bytes(entry['bytes_out']):>10}{entry['queue']:>8}"
+            f"{format_bytes(entry['buffered']):>10}")
+    lines.append(f"연결 {len(sockets)}개 | 전체 수신 {format_bytes(total_in)}, "
+                 f"송신 {format_bytes(total_out)}")
+    return "\n".join(lines)
+
+
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    server = ServerWindow()
+    # GUI 없이 실행하려면: python server_core.py [옵션]
+    args, qt_args = build_arg_parser().parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    core = create_server(args)
+    server = ServerWindow(core)  # 시작 전에 옵저버로 붙여 첫 접속부터 표시
+    core.start()
     server.show()
     sys.exit(app.exec_())
@@ -0,0 +1,1069 @@
+import argparse
+import asyncio
+import json
+import signal
+import ssl
+import threading
+import time
+from collections import deque
+
+from chat_history import (MAX_MESSAGE_ID, MAX_PAGE_SIZE, MAX_QUERY_LENGTH,
+                          PAGE_SIZE, SEARCH_CANDIDATES, ChatHistory)
+from board import (CLEAR_CODE, DRAWING_CODES, MAX_CHECKPOINT_SIZE, Board,
+                   checkpoint_size, fold_plan, match_plan)
+from board_store import BoardStore, load_boards
+from protocol import (DEFAULT_ROOM, DRAWING_BINARY, DRAWING_LEGACY,
+                      DRAWING_STROKE, HEADER_SIZE, PROTOCOL_VERSION,
+                      SERVER_CODES, SNAPSHOT_CODE, STROKE_BIN_CODE, STROKE_CODE,
+                      CompressionStats, FrameDecoder, LegacyDecoder,
+                      ProtocolError, compress_frame, convert_drawing,
+                      decode_frame, encode_message, json_incomplete,
+                      normalize_room, type_code, valid_drawing)
+
+# 송신 대기열이 가득 찼을 때의 처리 방식
+OVERFLOW_DROP = 'drop'  # 가장 오래된 선 조각부터 버림
+OVERFLOW_COALESCE = 'coalesce'  # 이어지는 선 조각을 하나로 합친 뒤 그래도 넘치면 버림
+OVERFLOW_DISCONNECT = 'disconnect'  # 연결을 끊음
+OVERFLOW_POLICIES = (OVERFLOW_DROP, OVERFLOW_COALESCE, OVERFLOW_DISCONNECT)
+
+# 트랜스포트 버퍼가 이 크기를 넘으면 대기열에 쌓기 시작
+WRITE_BUFFER_HIGH = 256 * 1024
+
+# NICK 응답 최대 크기 (이만큼 모여도 끝나지 않으면 연결을 끊음)
+MAX_HELLO_SIZE = 4096
+HELLO_DECODER = json.JSONDecoder()
+
+LINE_CODE = type_code('line')
+CHAT_CODE = type_code('chat')
+# 대기열이 넘칠 때 버릴 수 있는 그리기 메시지
+DROPPABLE_CODES = (LINE_CODE, STROKE_CODE, STROKE_BIN_CODE)
+
+
+class ClientConnection(asyncio.Protocol):
+    # 클라이언트 하나의 TLS 연결을 담당하는 프로토콜 객체
+    # 모든 연결은 ServerCore의 이벤트 루프 스레드 하나에서 처리된다
+
+    def __init__(self, core):
+        self.core = core
+        self.id = core.next_connection_id()  # 프로세스 안에서 유일한 연결 번호
+        self.transport = None
+        self.address = None
+        self.nickname = None
+        self.room = DEFAULT_ROOM
+        self.joined_at = 0.0  # 지금 방에 들어온 시각 (그 이전 채팅은 기록에서 가져감)
+        self.framed = False  # NICK 핸드셰이크에서 프레임 프로토콜 협상 여부
+        self.drawing_level = DRAWING_LEGACY  # 받을 수 있는 그리기 메시지 형식
+        self.compress = False  # 큰 프레임을 압축해서 보낼지 (NICK 핸드셰이크에서 협상)
+        self.decoder = None
+        self.hello = bytearray()  # 아직 끝나지 않은 NICK 응답
+
+        # 연결별 송신 대기열: (타입 코드, 헤더를 포함한 프레임)
+        # 트랜스포트 버퍼가 차 있는 동안 쌓였다가 resume_writing에서 비워진다
+        self.outbox = deque()
+        self.paused = False
+        self.dropped = 0
+
+        # 소켓 통계
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+        # 핸드셰이크 단계별 시각 (perf_counter)
+        self.accepted_at = None
+        self.tls_done_at = None
+        self.nick_timer = None
+
+    def connection_made(self, transport):
+        # accept 직후(평문 TCP 상태)에 호출됨
+        # TLS/NICK 핸드셰이크는 별도 태스크에서 진행하므로 accept는 바로 다음 연결을 받는다
+        self.accepted_at = time.perf_counter()
+        self.address = transport.get_extra_info('peername')
+        transport.pause_reading()  # start_tls 전에 평문 데이터를 받지 않도록
+        self.core.connections.add(self)
+        self.core.begin_handshake()
+        self.core.loop.create_task(self.handshake(transport))
+
+    async def handshake(self, raw_transport):
+        core = self.core
+        try:
+            transport = await core.loop.start_tls(
+                raw_transport, self, core.ssl_context, server_side=True,
+                ssl_handshake_timeout=core.handshake_timeout)
+        except Exception as e:
+            print(f"TLS 핸드셰이크 실패({self.address}): {e}")
+            core.end_handshake(failure='tls')
+            core.connections.discard(self)
+            raw_transport.abort()
+            return
+
+        self.tls_done_at = time.perf_counter()
+        self.transport = transport
+        transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+        print(f"새로운 연결: {self.address}")
+
+        # 닉네임 요청 - 제한 시간 안에 응답이 없으면 연결을 끊음
+        transport.write('NICK'.encode('utf-8'))
+        self.nick_timer = core.loop.call_later(core.handshake_timeout,
+                                               self.on_nick_timeout)
+
+    def on_nick_timeout(self):
+        self.nick_timer = None
+        if self.nickname is None:
+            print(f"닉네임 응답 시간 초과: {self.address}")
+            self.core.end_handshake(failure='nick')
+            self.transport.abort()
+
+    def data_received(self, data):
+        if self.transport is None:
+            return
+        self.bytes_in += len(data)
+        try:
+            if self.nickname is None:
+                self.handle_nickname(data)
+            else:
+                self.handle_data(data)
+        except ProtocolError as e:
+            print(f"프로토콜 오류({self.nickname}): {e}")
+            self.core.remove_client(self)
+            self.close()
+
+    def connection_lost(self, exc):
+        # 연결이 끊어진 경우 클라이언트 제거
+        if self.nick_timer is not None:
+            self.nick_timer.cancel()
+            if self.nickname is None:
+                self.core.end_handshake(failure='nick')
+        self.core.connections.discard(self)
+        self.core.remove_client(self)
+
+    def handle_nickname(self, data):
+        # NICK 응답이 여러 번에 나뉘어 오거나 뒤에 첫 메시지가 붙어 올 수 있으므로
+        # 응답 하나가 끝날 때까지 모은 뒤, 남은 바이트는 새 디코더로 넘긴다
+        self.hello += data
+        hello = parse_hello(self.hello)
+        if hello is None:
+            if len(self.hello) > MAX_HELLO_SIZE:
+                raise ProtocolError("NICK 응답이 너무 깁니다.")
+            return
+        payload, rest = hello
+        self.hello = None
+
+        self.nick_timer.cancel()
+        self.nick_timer = None
+        now = time.perf_counter()
+        self.core.end_handshake(
+            tls_ms=(self.tls_done_at - self.accepted_at) * 1000,
+            nick_ms=(now - self.tls_done_at) * 1000)
+
+        # JSON이면 닉네임, 프로토콜 버전, 방 이름 추출 (예전 클라이언트는 닉네임 문자열만 보냄)
+        proto = payload.get('proto', 0)
+        stroke_bin = payload.get('stroke_bin') is True
+        compress = payload.get('compress') is True
+        self.room = normalize_room(payload.get('room'))
+
+        self.nickname = payload['nickname']
+        if isinstance(proto, int) and proto >= PROTOCOL_VERSION:
+            # 프레임 모드로 전환하고 가장 먼저 welcome 프레임 전송
+            self.framed = True
+            self.drawing_level = DRAWING_BINARY if stroke_bin else DRAWING_STROKE
+            self.decoder = FrameDecoder(self.core.compression)
+            self.send_message({'type': 'welcome', 'proto': PROTOCOL_VERSION,
+                               'stroke_bin': stroke_bin, 'compress': compress,
+                               'history': True})
+            self.compress = compress
+        else:
+            self.decoder = LegacyDecoder()
+        self.core.add_client(self)
+        if rest:
+            self.handle_data(rest)
+
+    def handle_data(self, data):
+        # 클라이언트의 메시지를 처리하는 메서드
+        # 잘리거나 여러 개가 붙어 온 메시지도 디코더가 순서대로 분리한다
+        if not self.framed:
+            # 예전 클라이언트는 JSON을 파싱한 뒤 다시 인코딩해서 전달
+            for message in self.decoder.feed_messages(data):
+                self.core.dispatch_message(self, message)
+            return
+
+        for code, frame in self.decoder.feed(data):
+            self.core.dispatch_frame(self, code, frame)
+
+    def pause_writing(self):
+        # 트랜스포트 버퍼가 가득 참 - 이후 메시지는 대기열에 쌓는다
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.flush()
+
+    def flush(self):
+        # 대기열에 쌓인 메시지를 트랜스포트가 받아주는 만큼 전송
+        outbox = self.outbox
+        while outbox and not self.paused:
+            if self.transport.is_closing():
+                outbox.clear()
+                return
+            _, frame = outbox.popleft()
+            self.write_frame(frame)
+
+    def write_frame(self, frame):
+        if not self.framed:
+            # 예전 클라이언트에게는 헤더를 뗀 JSON만 전송
+            frame = frame[HEADER_SIZE:]
+        elif self.compress:
+            frame = self.core.compress_frame(frame)
+        self.transport.write(frame)
+        self.bytes_out += len(frame)
+
+    def send_frame(self, code, frame):
+        # 프레임 원본(memoryview)을 복사 없이 송신 대기열에 넣음
+        if self.transport is None or self.transport.is_closing():
+            return
+        if not self.paused and not self.outbox:
+            self.write_frame(frame)
+            return
+
+        self.outbox.append((code, frame))
+        if len(self.outbox) > self.core.queue_limit:
+            self.handle_overflow()
+
+    def send_message(self, data):
+        self.send_frame(type_code(data.get('type')),
+                        memoryview(encode_message(data)))
+
+    def handle_overflow(self):
+        policy = self.core.overflow_policy
+        limit = self.core.queue_limit
+        if policy == OVERFLOW_COALESCE:
+            self.coalesce_lines()
+        if policy in (OVERFLOW_DROP, OVERFLOW_COALESCE):
+            # 매번 넘칠 때마다 정리하지 않도록 여유를 두고 줄인다
+            self.drop_oldest_lines(len(self.outbox) - limit * 3 // 4)
+
+        if len(self.outbox) > limit:
+            # 버릴 수 있는 선 조각이 없거나 disconnect 정책
+            print(f"송신 대기열 초과로 연결을 끊습니다: {self.nickname}")
+            self.outbox.clear()
+            self.core.remove_client(self)
+            self.transport.abort()
+
+    def drop_oldest_lines(self, count):
+        if count <= 0:
+            return
+        kept = deque()
+        for entry in self.outbox:
+            if count and entry[0] in DROPPABLE_CODES:
+                count -= 1
+                self.dropped += 1
+                continue
+            kept.append(entry)
+        self.outbox = kept
+
+    def coalesce_lines(self):
+        # 같은 펜으로 끝점이 이어지는 선 조각들을 첫 시작점-마지막 끝점 하나로 합침
+        merged = deque()
+        run = None
+        for code, frame in self.outbox:
+            line = decode_frame(frame) if code == LINE_CODE else None
+            if line is not None and run is not None and \
+                    is_continuation(run, line):
+                run['x2'], run['y2'] = line['x2'], line['y2']
+                self.dropped += 1
+                continue
+            if run is not None:
+                merged.append((LINE_CODE, memoryview(encode_message(run))))
+                run = None
+            if line is not None:
+                run = line
+            else:
+                merged.append((code, frame))
+        if run is not None:
+            merged.append((LINE_CODE, memoryview(encode_message(run))))
+        self.outbox = merged
+
+    @property
+    def queue_depth(self):
+        return len(self.outbox)
+
+    @property
+    def state(self):
+        if self.transport is None:
+            return 'TLS 핸드셰이크'
+        if self.transport.is_closing():
+            return '종료 중'
+        if self.nickname is None:
+            return 'NICK 대기'
+        return '연결됨'
+
+    def socket_stats(self):
+        # 이 연결의 소켓 통계 (JSON으로 보낼 수 있는 값만)
+        host, port = self.address[:2] if self.address else ('-', 0)
+        buffered = 0
+        if self.transport is not None:
+            buffered = self.transport.get_write_buffer_size()
+        return {
+            'id': self.id,
+            'address': f"{host}:{port}",
+            'nickname': self.nickname or '',
+            'room': self.room if self.nickname else '',
+            'state': self.state,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'queue': len(self.outbox),
+            'buffered': buffered,
+        }
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    @property
+    def port(self):
+        return self.address[1] if self.address else 0
+
+
+def parse_hello(data):
+    # 모인 바이트에서 NICK 응답 하나를 꺼냄 -> (응답 dict, 뒤에 붙어 온 바이트), 아직 덜 왔으면 None
+    # JSON 객체는 닫는 괄호까지, 예전 클라이언트의 닉네임 문자열은 줄바꿈까지(없으면 받은 전부)
+    # 바이트 위치를 그대로 되찾을 수 있도록 잘못된 UTF-8 바이트는 surrogateescape로 보존
+    text = bytes(data).decode('utf-8', 'surrogateescape')
+    start = len(text) - len(text.lstrip())
+    if start == len(text):
+        return None
+    if text[start] == '{':
+        try:
+            payload, end = HELLO_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError as e:
+            if json_incomplete(e, len(text)):
+                return None  # 아직 끝까지 도착하지 않음
+            payload = None  # '{'로 시작하는 닉네임
+        if payload is not None:
+            if not isinstance(payload, dict) or \
+                    not isinstance(payload.get('nickname'), str):
+                raise ProtocolError("NICK 응답에 닉네임 문자열이 없습니다.")
+            payload['nickname'] = clean_text(payload['nickname']).strip()
+            return payload, hello_rest(data, text, end)
+    line, newline, _ = text.partition('\n')
+    return ({'nickname': clean_text(line).strip()},
+            hello_rest(data, text, len(line) + len(newline)))
+
+
+def hello_rest(data, text, end):
+    # text[:end] 뒤에 남은 원래 바이트
+    return bytes(data[len(text[:end].encode('utf-8', 'surrogateescape')):])
+
+
+def clean_text(text):
+    # 잘못된 UTF-8이나 짝 없는 서로게이트를 '?'로 (출력/인코딩할 때 오류가 나지 않도록)
+    return text.encode('utf-8', 'replace').decode('utf-8')
+
+
+def page_limit(limit, default, maximum):
+    if not isinstance(limit, int):
+        return default
+    return max(1, min(limit, maximum))
+
+
+def is_continuation(run, line):
+    try:
+        return (run['x2'] == line['x1'] and run['y2'] == line['y1']
+                and run.get('color') == line.get('color')
+                and run.get('width') == line.get('width')
+                and run.get('mode') == line.get('mode'))
+    except KeyError:
+        return False
+
+
+class Observable:
+    # 상태 변화를 등록된 옵저버의 on_<이벤트> 메서드로 알리는 기반 클래스
+
+    def __init__(self):
+        self.observers = []
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def notify(self, event, *args):
+        for observer in self.observers:
+            callback = getattr(observer, f'on_{event}', None)
+            if callback is None:
+                continue
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"옵저버 알림 중 오류({event}): {e}")
+
+
+class ServerCore(Observable):
+    # GUI와 무관한 네트워크 코어
+    # 하나의 asyncio 이벤트 루프에서 모든 TLS 소켓을 처리하고,
+    # 상태 변화는 등록된 옵저버에게 on_<이벤트> 메서드로 알린다.
+    # 옵저버 콜백은 이벤트 루프 스레드에서 호출되므로
+    # GUI 옵저버는 직접 메인 스레드로 넘겨야 한다.
+
+    def __init__(self, host='localhost', port=3000,
+                 certfile='auth/certfile.pem', keyfile='auth/keyfile.pem',
+                 queue_limit=1000, overflow_policy=OVERFLOW_DROP,
+                 backlog=511, handshake_timeout=10.0, reuse_port=False,
+                 stats_interval=1.0, history_path=None, board_dir=None,
+                 board_writer=True):
+        super().__init__()
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"알 수 없는 대기열 정책: {overflow_policy}")
+
+        self.host = host
+        self.port = port
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.queue_limit = queue_limit  # 연결별 송신 대기열 최대 메시지 수
+        self.overflow_policy = overflow_policy
+        self.backlog = backlog  # listen 대기열 (재시작 직후 재접속 폭주 대비)
+        self.handshake_timeout = handshake_timeout  # TLS, NICK 단계별 제한 시간(초)
+        self.reuse_port = reuse_port  # 여러 워커 프로세스가 같은 포트를 공유 (SO_REUSEPORT)
+        self.stats_interval = stats_interval  # 소켓 통계 알림 주기(초)
+        self.stats_timer = None
+        self.ssl_context = None
+
+        # 다른 워커 프로세스와 방 메시지를 주고받는 버스 (cluster.BusClient)
+        self.bus = None
+
+        # 방별 채팅 기록 (history_path가 없으면 저장하지 않음)
+        self.history = ChatHistory(history_path) if history_path else None
+
+        # 핸드셰이크 지연 시간 표본 (ms)
+        self.handshake_samples = deque(maxlen=1000)
+        self.handshake_failures = {'tls': 0, 'nick': 0}
+        self.pending_handshakes = 0
+
+        self.connections = set()  # 핸드셰이크 중인 것을 포함한 모든 연결
+        self.clients = {}  # 연결 번호 -> NICK 핸드셰이크까지 끝난 연결
+        self.last_connection_id = 0
+        self.rooms = {}  # 방 이름 -> 그 방에 있는 연결 집합
+        self.boards = {}  # 방 이름 -> 그림판 상태 (접속자가 없어도 유지)
+        # 스냅샷 전송 표본: (바이트 수, 만들어서 대기열에 넣기까지 걸린 시간 ms)
+        self.snapshot_samples = deque(maxlen=1000)
+        # 보드를 남길 디렉터리 - 시작할 때 복원하고, board_writer인 프로세스만 이어서 기록
+        # (워커 여러 개가 같은 보드를 복제해 가지므로 기록은 한 워커만 함)
+        self.board_dir = board_dir
+        self.board_writer = board_writer
+        self.board_store = None
+        # 압축 통계와, 방의 여러 연결에 같은 프레임을 보낼 때 한 번만 압축하기 위한
+        # 마지막 (원본 프레임, 압축 결과)
+        self.compression = CompressionStats()
+        self.last_compressed = (None, None)
+
+        # 서버가 내용을 직접 확인해야 하는 메시지 타입 코드 -> 처리 함수(connection, data)
+        # 여기에 없는 타입은 파싱하지 않고 원본 바이트 그대로 같은 방에 중계한다
+        self.message_handlers = {
+            type_code('join_room'): self.handle_join_room,
+            type_code('checkpoint'): self.handle_checkpoint,
+            type_code('history'): self.handle_history,
+            type_code('search'): self.handle_search,
+        }
+
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.stopping = False
+
+    def create_ssl_context(self):
+        # SSL 컨텍스트 생성
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile=self.certfile, keyfile=self.keyfile)
+        return context
+
+    def start(self):
+        # 별도 스레드에서 이벤트 루프를 시작하고 리슨 소켓이 열릴 때까지 대기
+        if self.board_dir:
+            self.boards, generations = load_boards(self.board_dir,
+                                                   repair=self.board_writer)
+            if self.board_writer:
+                self.board_store = BoardStore(self.board_dir, generations)
+                self.board_store.start()
+        self.loop = asyncio.new_event_loop()
+        self.ssl_context = self.create_ssl_context()
+        # TLS는 연결마다 start_tls로 따로 진행하므로 리슨 소켓은 평문으로 연다
+        self.server = self.loop.run_until_complete(
+            self.loop.create_server(lambda: ClientConnection(self),
+                                    self.host, self.port,
+                                    backlog=self.backlog,
+                                    reuse_port=self.reuse_port or None))
+        if self.history is not None:
+            self.history.start()
+        print("서버가 시작되었습니다...")
+        self.loop.call_soon(self.publish_socket_stats)
+
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def socket_stats(self):
+        # 모든 연결의 상태/송수신 바이트/송신 대기열 (이벤트 루프 스레드에서 호출)
+        return [connection.socket_stats()
+                for connection in list(self.connections)]
+
+    def publish_socket_stats(self):
+        # 주기적으로 소켓 통계를 모아 옵저버에 알림
+        # netstat 같은 외부 프로세스 없이 이벤트 루프 안에서 수집하므로 GUI를 막지 않는다
+        self.notify('socket_stats', self.socket_stats())
+        self.stats_timer = self.loop.call_later(self.stats_interval,
+                                                self.publish_socket_stats)
+
+    def call_in_loop(self, callback, *args):
+        # 다른 스레드(GUI 등)에서 루프 작업을 예약
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def client_count(self):
+        return len(self.clients)
+
+    def room_count(self):
+        return len(self.rooms)
+
+    def begin_handshake(self):
+        self.pending_handshakes += 1
+
+    def end_handshake(self, tls_ms=None, nick_ms=None, failure=None):
+        self.pending_handshakes -= 1
+        if failure is not None:
+            self.handshake_failures[failure] += 1
+        else:
+            self.handshake_samples.append((tls_ms, nick_ms))
+
+    def handshake_stats(self):
+        # 최근 핸드셰이크의 단계별 평균/p95 지연(ms)과 실패 수
+        samples = list(self.handshake_samples)
+        stats = {
+            'count': len(samples),
+            'pending': self.pending_handshakes,
+            'failures': dict(self.handshake_failures),
+        }
+        for i, phase in enumerate(('tls', 'nick')):
+            values = sorted(sample[i] for sample in samples)
+            if values:
+                stats[f'{phase}_avg'] = sum(values) / len(values)
+                stats[f'{phase}_p95'] = values[int(len(values) * 0.95)]
+                stats[f'{phase}_max'] = values[-1]
+            else:
+                stats[f'{phase}_avg'] = stats[f'{phase}_p95'] = 0.0
+                stats[f'{phase}_max'] = 0.0
+        return stats
+
+    def board_stats(self):
+        # 보드 크기와 최근 스냅샷 전송 크기/시간
+        # GUI 스레드에서도 불리므로 루프 스레드가 보드를 추가하는 중에 순회하지 않도록 먼저 복사
+        boards = list(self.boards.values())
+        samples = list(self.snapshot_samples)
+        times = sorted(sample[1] for sample in samples)
+        stats = {
+            'boards': len(boards),
+            'lines': sum(len(board.lines) for board in boards),
+            'bytes': sum(board.size for board in boards),
+            'compacted': sum(board.compacted for board in boards),
+            'checkpoint_bytes': sum(len(board.checkpoint or b'')
+                                    for board in boards),
+            'snapshots': len(samples),
+            'snapshot_bytes_avg': 0.0,
+            'snapshot_bytes_max': 0,
+            'snapshot_ms_avg': 0.0,
+            'snapshot_ms_p95': 0.0,
+        }
+        if samples:
+            stats['snapshot_bytes_avg'] = sum(s[0] for s in samples) / len(samples)
+            stats['snapshot_bytes_max'] = max(s[0] for s in samples)
+            stats['snapshot_ms_avg'] = sum(times) / len(times)
+            stats['snapshot_ms_p95'] = times[int(len(times) * 0.95)]
+        return stats
+
+    def compress_frame(self, frame):
+        # deliver는 같은 프레임 객체를 방의 연결마다 차례로 넘기므로 바로 전 결과를 재사용
+        plain, compressed = self.last_compressed
+        if frame is plain:
+            return compressed
+        compressed = compress_frame(frame, self.compression)
+        self.last_compressed = (frame, compressed)
+        return compressed
+
+    def compression_stats(self):
+        # 압축/해제한 프레임 수와 바이트, 걸린 시간(ms)
+        stats = self.compression.as_dict()
+        stats['compress_ms'] = stats.pop('compress_seconds') * 1000
+        stats['inflate_ms'] = stats.pop('inflate_seconds') * 1000
+        return stats
+
+    def next_connection_id(self):
+        self.last_connection_id += 1
+        return self.last_connection_id
+
+    def queue_depths(self):
+        # 연결 번호 -> (송신 대기열 길이, 버리거나 합친 메시지 수)
+        return {client.id: (client.queue_depth, client.dropped)
+                for client in list(self.clients.values())}
+
+    def add_client(self, connection):
+        self.clients[connection.id] = connection
+        self.enter_room(connection, connection.room)
+        self.notify('client_joined', connection.id, connection.nickname,
+                    connection.port, connection.room)
+
+    def remove_client(self, connection):
+        if self.clients.get(connection.id) is not connection:
+            return
+
+        # 클라이언트 목록에서 제거
+        del self.clients[connection.id]
+        self.leave_room(connection)
+        self.notify('client_left', connection.id)
+
+    def enter_room(self, connection, room):
+        connection.room = room
+        connection.joined_at = time.time()
+        self.rooms.setdefault(room, set()).add(connection)
+        self.send_snapshot(connection)
+
+        # 입장 메시지 브로드캐스트
+        join_message = {
+            'type': 'join_exit',
+            'message': f"{connection.nickname}님이 입장하셨습니다!"
+        }
+        self.broadcast(join_message, room)
+
+    def leave_room(self, connection):
+        members = self.rooms.get(connection.room)
+        if members is None:
+            return
+        members.discard(connection)
+        if not members:
+            del self.rooms[connection.room]
+
+        # 퇴장 메시지 브로드캐스트
+        exit_message = {
+            'type': 'join_exit',
+            'message': f"{connection.nickname}님이 퇴장하셨습니다."
+        }
+        self.broadcast(exit_message, connection.room)
+
+    def send_snapshot(self, connection):
+        # 방에 들어온 클라이언트에게 현재 보드를 한 번에 전송
+        board = self.boards.get(connection.room)
+        if board is None or (not board.lines and board.checkpoint is None):
+            return
+        started = time.perf_counter()
+        size = 0
+        for frame in board.snapshot_frames(connection.drawing_level,
+                                           connection.compress, self.compression):
+            size += len(frame)
+            connection.send_frame(SNAPSHOT_CODE, frame)
+        self.snapshot_samples.append(
+            (size, (time.perf_counter() - started) * 1000))
+
+    def record_board(self, code, frame, room):
+        # 선/지우기 메시지를 방의 보드에 반영 (보드를 남기면 로그에 붙이거나 스냅샷을 새로 씀)
+        if code in DRAWING_CODES:
+            board = self.boards.get(room)
+            if board is None:
+                board = self.boards[room] = Board()
+            board.add_line(frame)
+            if self.board_store is not None:
+                self.board_store.append(room, board.lines[-1])
+                if self.board_store.needs_snapshot(room):
+                    self.board_store.snapshot(room, board)
+            # 체크포인트는 기록하는 프로세스만 요청해서 접고, 다른 워커는 버스로 받아 따라 접음
+            if self.board_writer and board.needs_checkpoint(time.monotonic()):
+                self.request_checkpoint(room, board)
+        elif code == CLEAR_CODE and room in self.boards:
+            self.boards[room].clear()
+            if self.board_store is not None:
+                self.board_store.snapshot(room, self.boards[room])
+
+    def request_checkpoint(self, room, board, requested_for=None):
+        # 방의 프레임 모드 클라이언트 하나에게 지금까지의 보드를 이미지로 그려 달라고 요청
+        # 요청은 seq번 선까지 보낸 뒤에 대기열에 들어가므로 클라이언트는 그 상태를 그리게 된다
+        # 지난번에 요청한 연결이 답하지 않았을 수 있으므로 연결 번호 순서로 돌아가며 요청
+        # requested_for: 기록 워커가 버스로 부탁한 요청 번호 (그린 이미지는 그쪽으로 돌려줌)
+        now = time.monotonic()
+        framed = sorted((client for client in self.rooms.get(room, ())
+                         if client.framed), key=lambda client: client.id)
+        if framed:
+            client = next((client for client in framed
+                           if board.asked is None or client.id > board.asked),
+                          framed[0])
+            seq = board.request(client.id, now, requested_for)
+            client.send_message({'type': 'checkpoint_request', 'seq': seq})
+        elif requested_for is None:
+            # 이 워커에는 그려 줄 클라이언트가 없음 - 다른 워커의 클라이언트에게 부탁하고,
+            # 버스가 없으면 재시도 간격이 지난 뒤에 다시 찾음
+            seq = board.request(None, now)
+            if self.bus is not None:
+                self.publish_checkpoint(room, {'action': 'request', 'id': seq})
+
+    def handle_checkpoint(self, connection, data):
+        # 요청받은 클라이언트가 보낸 체크포인트 이미지로 보드 로그 앞부분을 정리
+        room = connection.room
+        board = self.boards.get(room)
+        seq = data.get('seq')
+        image = data.get('image')
+        if board is None or not isinstance(seq, int) or \
+                not isinstance(image, str) or len(image) > MAX_CHECKPOINT_SIZE:
+            return
+        # 보드가 기대하는 캔버스 크기가 아닌 이미지는 받지 않음
+        if not board.accepts_canvas(checkpoint_size(image)):
+            return
+        lines = board.accept_checkpoint(connection.id, seq)
+        if lines is None:
+            return
+        # 기록 워커의 부탁으로 그린 것이면 접지 않고 버스로 돌려줌
+        finish = self.fold_board if self.board_writer else self.reply_checkpoint
+        self.plan_fold(room, board, seq, image, finish, fold_plan, lines,
+                       checkpoint_size(image))
+
+    def plan_fold(self, room, board, seq, image, finish, plan, *args):
+        # 남길 선과 접히는 선을 가려내는 일(plan)은 선마다 파싱하거나 해시해야 하므로
+        # 실행기 스레드에서 하고, 결과는 이벤트 루프에서 finish(room, board, seq, image, plan 결과)로
+        def done(future):
+            try:
+                kept, folded = future.result()
+            except Exception as e:
+                print(f"보드 체크포인트 처리 중 오류({room}): {e}")
+                board.cancel_request()
+                return
+            finish(room, board, seq, image, kept, folded)
+
+        self.loop.run_in_executor(None, plan, *args).add_done_callback(done)
+
+    def fold_board(self, room, board, seq, image, kept, folded):
+        checkpoint = encode_message({'type': 'checkpoint', 'image': image})
+        size = checkpoint_size(image)
+        if not board.fold(seq, checkpoint, kept, size):
+            return
+        print(f"보드 체크포인트 적용: {room} (접은 선 {len(folded)}개, "
+              f"이미지 {size[0]}x{size[1]} {len(checkpoint)}바이트, "
+              f"이미지에 없어 남긴 선 {len(kept)}개)")
+        if self.board_store is not None:
+            self.board_store.snapshot(room, board)
+        if self.board_writer and self.bus is not None:
+            # 다른 워커도 같은 선을 접어 같은 체크포인트를 갖도록 알림
+            self.publish_checkpoint(room, {'action': 'apply', 'image': image,
+                                           'lines': folded})
+
+    def reply_checkpoint(self, room, board, seq, image, kept, folded):
+        requested_for = board.requested_for
+        if board.folding != seq:
+            return
+        board.cancel_request()
+        self.publish_checkpoint(room, {'action': 'reply', 'id': requested_for,
+                                       'image': image, 'lines': folded})
+
+    def publish_checkpoint(self, room, data):
+        data['type'] = 'bus_checkpoint'
+        self.bus.publish(room, encode_message(data))
+
+    def handle_bus_checkpoint(self, room, data):
+        # 다른 워커에서 온 체크포인트 메시지 (cluster.BusClient)
+        #   request: 기록 워커에 그려 줄 클라이언트가 없으니 대신 요청해 달라는 부탁
+        #   reply  : 부탁받은 워커의 클라이언트가 그린 이미지와 그 이미지에 들어간 선
+        #   apply  : 기록 워커가 접은 체크포인트 - 같은 선을 접어 따라감
+        board = self.boards.get(room)
+        if board is None or data is None:
+            return
+        action = data.get('action')
+        if action == 'request':
+            if not self.board_writer:
+                self.request_checkpoint(room, board, data.get('id'))
+            return
+        image = data.get('image')
+        folded = data.get('lines')
+        if not isinstance(image, str) or not isinstance(folded, list) or \
+                not board.accepts_canvas(checkpoint_size(image)):
+            return
+        if action == 'reply' and self.board_writer:
+            accepted = board.accept_remote(data.get('id'))
+        elif action == 'apply' and not self.board_writer:
+            accepted = board.begin_fold()
+        else:
+            return
+        if accepted is None:
+            return
+        seq, lines = accepted
+        self.plan_fold(room, board, seq, image, self.fold_board, match_plan,
+                       lines, set(folded))
+
+    def handle_history(self, connection, data):
+        # 지금 방의 채팅 기록 한 페이지 요청
+        # before: 클라이언트가 가진 가장 오래된 기록 번호 (없으면 방에 들어온 뒤의 채팅 중
+        #         live번째보다 앞 - 실시간으로 받은 채팅은 기록 번호를 모르므로 개수로 가리킴)
+        # after: 이 번호 다음의 기록 (검색 결과 위치에서 아래로 스크롤할 때)
+        # view: 클라이언트가 응답을 어느 목록에 넣을지 구분하는 값으로, 그대로 돌려준다
+        room = connection.room
+        before = data.get('before')
+        after = data.get('after')
+        live = data.get('live', 0)
+        limit = page_limit(data.get('limit'), PAGE_SIZE, MAX_PAGE_SIZE)
+        if not all(anchor is None or
+                   (isinstance(anchor, int) and 0 <= anchor <= MAX_MESSAGE_ID)
+                   for anchor in (before, after, live)):
+            return
+
+        def reply(messages, more):
+            # 기록 스레드에서 호출됨 - 전송은 이벤트 루프로 넘김
+            self.call_in_loop(connection.send_message, {
+                'type': 'history', 'room': room, 'view': data.get('view'),
+                'before': before, 'after': after, 'live': live,
+                'messages': messages, 'more': more})
+
+        if self.history is None:
+            reply([], False)
+        elif after is not None:
+            self.history.history_after(room, after, limit, reply)
+        else:
+            self.history.page(room, before, connection.joined_at, limit, reply,
+                              live or 0)
+
+    def handle_search(self, connection, data):
+        # 지금 방의 채팅 기록 검색 - 순위순 결과를 offset번째부터 한 페이지씩
+        # 순위는 최근 SEARCH_CANDIDATES개 안에서만 매기고, 그 뒤는 시간순 결과(ranked=False)가
+        # 이어진다. 시간순 결과의 다음 페이지는 before(마지막으로 받은 결과의 번호)로 요청한다.
+        room = connection.room
+        query = data.get('query')
+        offset = data.get('offset', 0)
+        before = data.get('before')
+        limit = page_limit(data.get('limit'), PAGE_SIZE, MAX_PAGE_SIZE)
+        if not isinstance(query, str) or len(query) > MAX_QUERY_LENGTH or \
+                not isinstance(offset, int) or not 0 <= offset <= MAX_MESSAGE_ID:
+            return
+        if before is None:
+            # 순위 범위 너머를 offset으로 건너뛰면 매번 앞의 일치를 다시 세어야 하므로 받지 않음
+            if offset > SEARCH_CANDIDATES:
+                return
+        elif not isinstance(before, int) or not 0 <= before <= MAX_MESSAGE_ID:
+            return
+
+        def reply(hits, more):
+            self.call_in_loop(connection.send_message, {
+                'type': 'search', 'room': room, 'query': query,
+                'offset': offset, 'hits': hits, 'more': more})
+
+        if self.history is None:
+            reply([], False)
+        else:
+            self.history.search(room, query, offset, limit, reply, before)
+
+    def handle_join_room(self, connection, data):
+        # 세션 중 다른 방으로 이동
+        room = normalize_room(data.get('room'))
+        if room == connection.room:
+            return
+        self.leave_room(connection)
+        connection.send_message({'type': 'room_changed', 'room': room})
+        self.enter_room(connection, room)
+        self.notify('client_room_changed', connection.id, room)
+
+    def dispatch_frame(self, connection, code, frame):
+        if code in SERVER_CODES:
+            # 서버가 보낸 것처럼 꾸민 snapshot, welcome이나 버스 메시지는 무시
+            return
+        if code == STROKE_CODE:
+            # 좌표가 잘못된 stroke는 방 사람들의 캔버스와 보드를 망가뜨리므로 중계도 기록도 하지 않음
+            # (stroke_bin은 형식상 좌표가 늘 정수 짝이고, 잘못된 프레임은 받는 쪽이 버림)
+            stroke = decode_frame(frame)
+            if stroke is None or not valid_drawing(stroke):
+                return
+        handler = self.message_handlers.get(code)
+        if handler is None:
+            # 헤더의 타입만 보고 원본 프레임을 그대로 중계
+            self.relay(code, frame, connection.room)
+            return
+        message = decode_frame(frame)
+        if message is not None:
+            handler(connection, message)
+
+    def dispatch_message(self, connection, data):
+        code = type_code(data.get('type'))
+        if code in SERVER_CODES or \
+                (code in DRAWING_CODES and not valid_drawing(data)):
+            return
+        handler = self.message_handlers.get(code)
+        if handler is None:
+            self.broadcast(data, connection.room)
+        else:
+            handler(connection, data)
+
+    def relay(self, code, frame, room=None, exclude=None):
+        # 이 프로세스의 방 멤버에게 전달하고, 다른 워커에도 버스로 발행
+        self.deliver(code, frame, room, exclude)
+        if self.bus is not None and room is not None:
+            self.bus.publish(room, frame)
+        if code == CHAT_CODE and room is not None and self.history is not None:
+            # 채팅은 처음 받은 워커에서만 기록 (다른 워커는 버스로 받아 deliver만 함)
+            self.history.append(room, frame)
+
+    def deliver(self, code, frame, room=None, exclude=None):
+        # 같은 방의 연결에만 전달 (room이 None이면 모든 연결)
+        # 각 연결의 송신 대기열에 넣기만 하므로 느린 클라이언트가 다른 전송을 막지 않음
+        if room is None:
+            members = self.clients.values()
+        else:
+            members = self.rooms.get(room, ())
+        converted = {}  # 그리기 수준 -> 그 수준에 맞게 변환한 프레임
+        for client in list(members):
+            if client is exclude:
+                continue
+            try:
+                out = frame
+                if code in (STROKE_CODE, STROKE_BIN_CODE):
+                    # 받는 쪽이 모르는 형식은 수준별로 한 번만 변환해서 공유
+                    level = client.drawing_level
+                    if level not in converted:
+                        converted[level] = convert_drawing(code, frame, level)
+                    out = converted[level]
+                    if out is None:
+                        continue
+                client.send_frame(code, out)
+            except Exception as e:
+                print(f"전송 오류({client.nickname}): {e}")
+
+        if room is not None:
+            # 다른 워커에서 온 메시지도 여기를 거치므로 워커마다 같은 보드를 갖게 됨
+            # (체크포인트 요청이 방금 보낸 선 뒤에 오도록 전달한 다음에 기록)
+            self.record_board(code, frame, room)
+
+    def broadcast(self, data, room=None, exclude=None):
+        # 메시지는 한 번만 인코딩해서 모든 연결이 같은 프레임을 공유
+        frame = memoryview(encode_message(data))
+        self.relay(type_code(data.get('type')), frame, room, exclude)
+
+    def disconnect_client(self, connection_id):
+        # 스레드 안전: 해당 번호의 클라이언트 연결 끊기
+        self.call_in_loop(self._disconnect_client, connection_id)
+
+    def _disconnect_client(self, connection_id):
+        client = self.clients.get(connection_id)
+        if client is not None:
+            # TLS 종료 절차를 기다리지 않고 바로 목록에서 제거
+            self.remove_client(client)
+            client.close()
+
+    def shutdown(self, timeout=2):
+        # 스레드 안전: 모든 클라이언트에 종료를 알리고 루프를 정지
+        if self.loop is None or not self.loop.is_running():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        try:
+            future.result(timeout)
+        except Exception as e:
+            print(f"서버 종료 중 오류: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def stop_in_loop(self):
+        # 이벤트 루프 스레드 안에서 종료할 때 사용 (shutdown은 다른 스레드용)
+        if self.stopping:
+            return
+        self.stopping = True
+        task = self.loop.create_task(self._shutdown())
+        task.add_done_callback(lambda _: self.loop.stop())
+
+    async def _shutdown(self):
+        if self.stats_timer is not None:
+            self.stats_timer.cancel()
+        shutdown_message = {
+            'type': 'server_shutdown',
+            'message': '서버가 종료됩니다.'
+        }
+        for client in list(self.clients.values()):
+            try:
+                # 클라이언트에게 서버 종료 메시지 전송
+                client.send_message(shutdown_message)
+                client.close()
+            except Exception as e:
+                print(f"클라이언트 연결 종료 중 오류: {e}")
+
+        # 서버 소켓 종료
+        self.server.close()
+        try:
+            await asyncio.wait_for(self.server.wait_closed(), 2)
+        except asyncio.TimeoutError:
+            pass
+
+        # 남은 채팅 기록과 보드 로그를 모두 쓰고 닫음
+        if self.history is not None:
+            await self.loop.run_in_executor(None, self.history.close)
+        if self.board_store is not None:
+            await self.loop.run_in_executor(None, self.board_store.close)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='그림판 & 채팅 서버')
+    parser.add_argument('--host', default='localhost', help='바인드 주소')
+    parser.add_argument('--port', type=int, default=3000, help='리슨 포트')
+    parser.add_argument('--cert', default='auth/certfile.pem',
+                        help='TLS 인증서 파일')
+    parser.add_argument('--key', default='auth/keyfile.pem',
+                        help='TLS 개인 키 파일')
+    parser.add_argument('--backlog', type=int, default=511,
+                        help='listen 대기열 크기')
+    parser.add_argument('--handshake-timeout', type=float, default=10.0,
+                        help='TLS, NICK 핸드셰이크 단계별 제한 시간(초)')
+    parser.add_argument('--queue-limit', type=int, default=1000,
+                        help='연결별 송신 대기열 최대 메시지 수')
+    parser.add_argument('--overflow-policy', choices=OVERFLOW_POLICIES,
+                        default=OVERFLOW_DROP, help='송신 대기열 초과 시 처리 방식')
+    parser.add_argument('--stats-interval', type=float, default=1.0,
+                        help='소켓 통계 갱신 주기(초)')
+    parser.add_argument('--history-db', default='chat_history.db',
+                        help="채팅 기록 SQLite 파일 (빈 문자열이면 저장하지 않음)")
+    parser.add_argument('--board-dir', default='boards',
+                        help="보드를 남기고 재시작할 때 복원할 디렉터리 (빈 문자열이면 남기지 않음)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help='SO_REUSEPORT로 포트를 공유할 워커 프로세스 수')
+    return parser
+
+
+def server_options(args):
+    # 명령행 인자 -> ServerCore 생성 인자
+    return {
+        'host': args.host,
+        'port': args.port,
+        'certfile': args.cert,
+        'keyfile': args.key,
+        'backlog': args.backlog,
+        'handshake_timeout': args.handshake_timeout,
+        'queue_limit': args.queue_limit,
+        'overflow_policy': args.overflow_policy,
+        'stats_interval': args.stats_interval,
+        'history_path': args.history_db,
+        'board_dir': args.board_dir,
+    }
+
+
+def create_server(args):
+    # 워커가 2개 이상이면 멀티 프로세스 감독 객체, 아니면 단일 ServerCore
+    options = server_options(args)
+    if args.workers > 1:
+        from cluster import ClusterSupervisor
+        return ClusterSupervisor(args.workers, options)
+    return ServerCore(**options)
+
+
+def main(argv=None):
+    # GUI(PyQt) 없이 실행하는 서버 진입점
+    args = build_arg_parser().parse_args(argv)
+    core = create_server(args)
+    core.start()
+    print(f"{args.host}:{args.port} 에서 대기 중입니다. (Ctrl+C로 종료)")
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    # 코어 스레드가 스스로 끝난 경우에도 빠져나옴
+    while not stop.wait(1):
+        if not core.thread.is_alive():
+            break
+
+    print("서버를 종료합니다...")
+    core.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import sys
+from array import array
+
+from protocol import valid_drawing
+
+# 공간 격자 칸 크기(px)와, 이보다 많은 칸에 걸치는 긴 선은 칸 대신 따로 보관
+GRID_CELL = 64
+GRID_MAX_CELLS = 64
+
+
+class StrokeStore:
+    # 열 단위 선 조각 저장소
+    # 좌표는 array('i') 네 개에, 펜(색, 굵기, 모드)은 한 번만 저장한 펜 테이블의 번호로 둔다.
+    # 선 하나에 dict + QPoint 2개 + QColor를 쓰던 것(수백 바이트)을 20바이트로 줄인다.
+
+    def __init__(self):
+        self.x1 = array('i')
+        self.y1 = array('i')
+        self.x2 = array('i')
+        self.y2 = array('i')
+        self.pen = array('I')  # 펜 테이블 번호
+        self.pens = []  # 펜 번호 -> (색 '#rrggbb', 굵기, 모드)
+        self.pen_ids = {}  # (색, 굵기, 모드) -> 펜 번호
+
+    def __len__(self):
+        return len(self.pen)
+
+    def pen_id(self, color, width, mode='pen'):
+        key = (color, width, mode)
+        pen = self.pen_ids.get(key)
+        if pen is None:
+            pen = self.pen_ids[key] = len(self.pens)
+            self.pens.append(key)
+        return pen
+
+    def append(self, x1, y1, x2, y2, color, width, mode='pen'):
+        self.x1.append(x1)
+        self.y1.append(y1)
+        self.x2.append(x2)
+        self.y2.append(y2)
+        self.pen.append(self.pen_id(color, width, mode))
+
+    def append_message(self, data):
+        # line 또는 stroke 메시지를 추가 (그릴 수 없는 메시지는 건너뛰고 False)
+        # 다른 클라이언트가 보낸 것이므로 잘못된 값이 열을 어긋나게 하거나 예외를 내지 않도록 검사
+        if not valid_drawing(data):
+            return False
+        if data.get('type') == 'stroke':
+            self.append_stroke(data['points'], data['color'], data['width'],
+                               data.get('mode', 'pen'))
+        else:
+            self.append(data['x1'], data['y1'], data['x2'], data['y2'],
+                        data['color'], data['width'], data.get('mode', 'pen'))
+        return True
+
+    def append_stroke(self, points, color, width, mode='pen'):
+        # 폴리라인 [x0, y0, x1, y1, ...] 을 선 조각들로 한 번에 추가
+        # 좌표 수가 홀수면 x, y 열의 길이가 달라지므로 받지 않음
+        count = len(points) // 2 - 1
+        if count <= 0 or len(points) % 2:
+            return
+        self.x1.extend(points[0:-2:2])
+        self.y1.extend(points[1:-2:2])
+        self.x2.extend(points[2::2])
+        self.y2.extend(points[3::2])
+        self.pen.extend([self.pen_id(color, width, mode)] * count)
+
+    def segments(self, start=0, stop=None):
+        # 그리기용 일괄 순회: (펜 번호, x1, y1, x2, y2)
+        stop = len(self) if stop is None else stop
+        return zip(self.pen[start:stop], self.x1[start:stop],
+                   self.y1[start:stop], self.x2[start:stop],
+                   self.y2[start:stop])
+
+    def segments_at(self, positions):
+        # 주어진 위치들의 선만 순회 (위치는 오름차순이어야 그린 순서가 유지됨)
+        pen, x1, y1, x2, y2 = self.pen, self.x1, self.y1, self.x2, self.y2
+        return ((pen[i], x1[i], y1[i], x2[i], y2[i]) for i in positions)
+
+    def bounds(self, start=0, stop=None):
+        # 범위 안 선들을 감싸는 (왼쪽, 위, 오른쪽, 아래, 최대 굵기), 비어 있으면 None
+        stop = len(self) if stop is None else stop
+        if start >= stop:
+            return None
+        xs = self.x1[start:stop] + self.x2[start:stop]
+        ys = self.y1[start:stop] + self.y2[start:stop]
+        width = max(self.pens[pen][1] for pen in set(self.pen[start:stop]))
+        return min(xs), min(ys), max(xs), max(ys), width
+
+    def truncate_front(self, count):
+        # 앞쪽 선 count개 제거 (체크포인트로 접은 뒤)
+        for column in (self.x1, self.y1, self.x2, self.y2, self.pen):
+            del column[:count]
+
+    def clear(self):
+        # 펜 테이블은 몇 개 되지 않으므로 그대로 둔다
+        for column in (self.x1, self.y1, self.x2, self.y2, self.pen):
+            del column[:]
+
+
+class SegmentGrid:
+    # 선 조각 경계 상자에 대한 균일 격자 색인
+    # 칸 -> 그 칸에 걸치는 선 위치 목록. 마우스로 그린 짧은 선은 한두 칸에만 들어가므로
+    # 추가는 선 하나당 상수 시간이고, 영역 질의는 그 영역의 칸만 본다.
+
+    def __init__(self, cell=GRID_CELL):
+        self.cell = cell
+        self.cells = {}  # (칸 x, 칸 y) -> array('I') 선 위치
+        self.large = array('I')  # GRID_MAX_CELLS보다 많은 칸에 걸치는 선 위치
+        self.count = 0  # 색인한 선 수
+
+    def add(self, store, start=None):
+        # 저장소에서 아직 색인하지 않은 선(start번부터)을 추가
+        start = self.count if start is None else start
+        cell = self.cell
+        cells = self.cells
+        pens = store.pens
+        position = start
+        for pen, x1, y1, x2, y2 in store.segments(start):
+            pad = pens[pen][1] // 2 + 2
+            left = (min(x1, x2) - pad) // cell
+            right = (max(x1, x2) + pad) // cell
+            top = (min(y1, y2) - pad) // cell
+            bottom = (max(y1, y2) + pad) // cell
+            if (right - left + 1) * (bottom - top + 1) > GRID_MAX_CELLS:
+                self.large.append(position)
+            else:
+                for cx in range(left, right + 1):
+                    for cy in range(top, bottom + 1):
+                        bucket = cells.get((cx, cy))
+                        if bucket is None:
+                            bucket = cells[(cx, cy)] = array('I')
+                        bucket.append(position)
+            position += 1
+        self.count = position
+
+    def query(self, left, top, right, bottom):
+        # 사각형과 경계 상자가 겹치는 선 위치를 그린 순서대로 반환
+        cell = self.cell
+        found = set(self.large)
+        for cx in range(left // cell, right // cell + 1):
+            for cy in range(top // cell, bottom // cell + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket is not None:
+                    found.update(bucket)
+        return sorted(found)
+
+    def rebuild(self, store):
+        # 저장소 앞쪽이 잘려 위치가 바뀌었을 때 (체크포인트로 접은 직후라 남은 선이 적음)
+        self.clear()
+        self.add(store, 0)
+
+    def clear(self):
+        self.cells = {}
+        self.large = array('I')
+        self.count = 0
+
+
+if __name__ == '__main__':
+    # 선 100만 개를 저장했을 때 메모리 비교
+    import tracemalloc
+
+    count = 1000000
+    colors = ['#000000', '#ff0000', '#0000ff', '#ffffff']
+
+    tracemalloc.start()
+    store = StrokeStore()
+    for i in range(count):
+        store.append(i % 600, i % 400, (i + 3) % 600, (i + 2) % 400,
+                     colors[i % 4], 2 if i % 4 < 3 else 10)
+    store_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"StrokeStore: {store_bytes / 1024 / 1024:.1f}MB "
+          f"(선당 {store_bytes / count:.1f}바이트)")
+    del store
+
+    try:
+        from PyQt5.QtCore import QPoint
+        from PyQt5.QtGui import QColor
+    except ImportError:
+        sys.exit(0)
+    tracemalloc.start()
+    lines = []
+    for i in range(count):
+        lines.append({'start': QPoint(i % 600, i % 400),
+                      'end': QPoint((i + 3) % 600, (i + 2) % 400),
+                      'color': QColor(colors[i % 4]),
+                      'width': 2 if i % 4 < 3 else 10, 'mode': 'pen'})
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # QPoint/QColor의 C++ 쪽 메모리는 tracemalloc에 잡히지 않으므로 실제로는 더 큼
+    print(f"dict + QPoint/QColor: {dict_bytes / 1024 / 1024:.1f}MB 이상 "
+          f"(선당 {dict_bytes / count:.1f}바이트 이상)")
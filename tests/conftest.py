@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# 저장소 루트의 모듈(protocol, board ...)을 그대로 import 하도록
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 클라이언트 테스트는 화면 없이
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+@pytest.fixture(scope='session')
+def qt_app():
+    # 클라이언트(PyQt5) 객체를 만드는 테스트용 QApplication
+    widgets = pytest.importorskip('PyQt5.QtWidgets')
+    return widgets.QApplication.instance() or widgets.QApplication([])
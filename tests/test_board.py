@@ -0,0 +1,192 @@
+import base64
+import struct
+import zlib
+
+from board import (CHECKPOINT_LINES, Board, checkpoint_size, fold_plan,
+                   match_plan, outside_positions)
+from protocol import (COMPRESSED_FLAG, DRAWING_LEGACY, DRAWING_STROKE,
+                      HEADER_SIZE, CompressionStats, FrameDecoder,
+                      LegacyDecoder, encode_message)
+
+
+def line(x, y=10):
+    return encode_message({'type': 'line', 'x1': x, 'y1': y, 'x2': x + 1,
+                           'y2': y + 1, 'color': '#000000', 'width': 2,
+                           'mode': 'pen'})
+
+
+def png(width, height):
+    # IHDR까지만 있는 PNG (서버는 크기만 읽음)
+    ihdr = struct.pack('!IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    chunk = struct.pack('!I', len(ihdr)) + b'IHDR' + ihdr + \
+        struct.pack('!I', zlib.crc32(b'IHDR' + ihdr))
+    return base64.b64encode(b'\x89PNG\r\n\x1a\n' + chunk).decode()
+
+
+def board_with(count, width=200):
+    board = Board()
+    for i in range(count):
+        board.add_line(line(i % width))
+    return board
+
+
+def test_clear_drops_lines():
+    board = board_with(5)
+    board.clear()
+    assert board.lines == [] and board.size == 0
+    assert board.next_seq == 5 and board.compacted == 5
+
+
+def test_snapshot_for_framed_client():
+    board = board_with(3)
+    frames = board.build_snapshot(DRAWING_STROKE)
+    [snapshot] = FrameDecoder().feed_messages(frames[0])
+    assert [message['x1'] for message in snapshot['lines']] == [0, 1, 2]
+
+
+def test_snapshot_for_legacy_client():
+    # 예전 클라이언트는 헤더 없이 선 JSON을 이어 붙인 것을 받음
+    board = board_with(3)
+    [frame] = board.build_snapshot(DRAWING_LEGACY)
+    messages = LegacyDecoder().feed_messages(bytes(frame[HEADER_SIZE:]))
+    assert [message['x1'] for message in messages] == [0, 1, 2]
+
+
+def test_snapshot_split_into_chunks(monkeypatch):
+    monkeypatch.setattr('board.SNAPSHOT_CHUNK_SIZE', len(line(0)) * 2)
+    board = board_with(5)
+    frames = board.build_snapshot(DRAWING_STROKE)
+    assert len(frames) == 3
+    lines = []
+    for frame in frames:
+        [snapshot] = FrameDecoder().feed_messages(frame)
+        lines += snapshot['lines']
+    assert [message['x1'] for message in lines] == [0, 1, 2, 3, 4]
+
+
+def test_snapshot_cache():
+    board = board_with(3)
+    frames = board.snapshot_frames(DRAWING_STROKE)
+    assert board.snapshot_frames(DRAWING_STROKE) is frames
+    [snapshot] = FrameDecoder().feed_messages(frames[0])
+    assert len(snapshot['lines']) == 3
+    board.add_line(line(7))
+    assert board.snapshot_frames(DRAWING_STROKE) is not frames
+    [snapshot] = FrameDecoder().feed_messages(
+        board.snapshot_frames(DRAWING_STROKE)[0])
+    assert len(snapshot['lines']) == 4
+
+
+def test_snapshot_cache_compressed():
+    # 압축 여부는 캐시 키에 들어가고, 압축은 보드가 바뀔 때만 다시 함
+    board = board_with(500)
+    stats = CompressionStats()
+    frames = board.snapshot_frames(DRAWING_STROKE, compress=True, stats=stats)
+    assert all(frame[1] & COMPRESSED_FLAG for frame in frames)
+    count = stats.compressed
+    assert board.snapshot_frames(DRAWING_STROKE, compress=True,
+                                 stats=stats) is frames
+    assert stats.compressed == count
+    plain = board.snapshot_frames(DRAWING_STROKE)
+    assert not plain[0][1] & COMPRESSED_FLAG
+    assert FrameDecoder().feed_messages(frames[0]) == \
+        FrameDecoder().feed_messages(plain[0])
+    board.clear()
+    assert board.snapshot_frames(DRAWING_STROKE, compress=True) is not frames
+
+
+def test_checkpoint_size():
+    assert checkpoint_size(png(640, 480)) == (640, 480)
+    assert checkpoint_size('bm90IGEgcG5n') is None
+    assert checkpoint_size('!!!') is None
+
+
+def test_needs_checkpoint_and_retry():
+    board = board_with(CHECKPOINT_LINES - 1)
+    assert not board.needs_checkpoint(0)
+    board.add_line(line(0))
+    assert board.needs_checkpoint(0)
+    board.request(1, 0)
+    assert not board.needs_checkpoint(1)
+    assert board.needs_checkpoint(100)
+
+
+def test_checkpoint_only_from_requested_connection():
+    board = board_with(10)
+    seq = board.request(1, 0)
+    assert board.accept_checkpoint(2, seq) is None
+    assert board.accept_checkpoint(1, seq - 1) is None
+    assert len(board.accept_checkpoint(1, seq)) == 10
+    # 같은 응답은 두 번 받지 않음
+    assert board.accept_checkpoint(1, seq) is None
+
+
+def test_fold_moves_outside_lines_after_image():
+    # 이미지 밖으로 나가는 선은 서로의 순서를 지킨 채 이미지 바로 뒤에 남음
+    board = Board()
+    frames = [line(x) for x in (10, 700, 20, 900, 30)]
+    for frame in frames:
+        board.add_line(frame)
+    seq = board.request(1, 0)
+    lines = board.accept_checkpoint(1, seq)
+    board.add_line(line(40))  # 그리는 동안 온 선
+    outside, folded = fold_plan(lines, (600, 400))
+    assert outside == [1, 3] and len(folded) == 3
+    assert board.fold(seq, b'image', outside, (600, 400))
+    assert board.lines == [frames[1], frames[3], line(40)]
+    assert board.first_seq == 3 and board.next_seq == 6
+    assert board.checkpoint == b'image' and board.kept == 3
+    assert board.canvas == (600, 400)
+    assert board.compacted == 3
+
+
+def test_remote_fold_by_digest():
+    # 선 순서가 다른 워커에서 접은 선을 다이제스트로 맞춰 접음
+    writer = board_with(6)
+    helper = Board()
+    for frame in reversed(writer.lines[:4]):
+        helper.add_line(frame)
+    _, folded = fold_plan(helper.lines, (1000, 1000))
+
+    writer.request(None, 0)
+    assert writer.accept_remote(writer.requested_seq + 1) is None
+    seq, lines = writer.accept_remote(writer.requested_seq)
+    kept, matched = match_plan(lines, set(folded))
+    assert kept == [4, 5] and sorted(matched) == sorted(folded)
+    assert writer.fold(seq, b'image', kept, (1000, 1000))
+    assert writer.lines == [line(4), line(5)] and writer.canvas == (1000, 1000)
+
+
+def test_fold_ignored_after_clear():
+    board = board_with(10)
+    seq = board.request(1, 0)
+    board.accept_checkpoint(1, seq)
+    board.clear()
+    assert not board.fold(seq, b'image', [], (600, 400))
+    assert board.checkpoint is None
+
+
+def test_outside_positions_pads_width_and_skips_broken_lines():
+    frames = [line(1), encode_message({'type': 'line'}), line(596), line(597)]
+    # 굵기 2 선은 양쪽으로 2px 넓혀서 판단
+    assert outside_positions(frames, (600, 400)) == [3]
+
+
+def test_accepts_canvas():
+    board = Board()
+    assert board.accepts_canvas((600, 400))
+    assert board.accepts_canvas((1920, 1080))
+    assert not board.accepts_canvas((599, 400))
+    assert not board.accepts_canvas((100000, 400))
+    assert not board.accepts_canvas(None)
+    # 이전 체크포인트보다 작은 이미지는 받지 않음
+    board.canvas = (1000, 800)
+    assert not board.accepts_canvas((800, 800))
+    assert board.accepts_canvas((1000, 800))
+
+
+def test_load_reads_canvas_from_checkpoint():
+    board = Board()
+    frame = encode_message({'type': 'checkpoint', 'image': png(800, 600)})
+    board.load(5, frame, [line(1)])
+    assert board.canvas == (800, 600) and board.next_seq == 6
@@ -0,0 +1,151 @@
+import os
+
+import board_store
+from board import Board
+from board_store import (LOG_SUFFIX, SNAPSHOT_SUFFIX, BoardStore, load_board,
+                         load_boards, room_path)
+from protocol import encode_message, type_code
+from server_core import ServerCore
+
+
+def line(i):
+    return encode_message({'type': 'line', 'x1': i, 'y1': 0, 'x2': i + 1,
+                           'y2': 1, 'color': '#000000', 'width': 2,
+                           'mode': 'pen'})
+
+
+def write(directory, tasks, generations=None):
+    # 쓰기 스레드를 띄워 tasks(store)를 넣고, 다 쓸 때까지 기다림
+    store = BoardStore(str(directory), generations)
+    store.start()
+    tasks(store)
+    store.close()
+    return store
+
+
+def test_append_and_restore(tmp_path):
+    def tasks(store):
+        for i in range(5):
+            store.append('방', line(i))
+
+    write(tmp_path, tasks)
+    boards, generations = load_boards(str(tmp_path))
+    assert [bytes(frame) for frame in boards['방'].lines] == \
+        [line(i) for i in range(5)]
+    assert generations == {'방': 0}
+
+
+def test_snapshot_then_log(tmp_path):
+    board = Board()
+    for i in range(3):
+        board.add_line(line(i))
+    board.checkpoint = encode_message({'type': 'checkpoint', 'image': 'x'})
+
+    def tasks(store):
+        store.snapshot('lobby', board)
+        store.append('lobby', line(3))
+
+    write(tmp_path, tasks)
+    restored, generation = load_board(str(tmp_path), 'lobby')
+    assert generation == 1
+    assert bytes(restored.checkpoint) == board.checkpoint
+    assert [bytes(frame) for frame in restored.lines] == \
+        [line(i) for i in range(4)]
+
+
+def test_clear_in_log(tmp_path):
+    def tasks(store):
+        store.append('lobby', line(0))
+        store.append('lobby', encode_message({'type': 'clear'}))
+        store.append('lobby', line(1))
+
+    write(tmp_path, tasks)
+    restored, _ = load_board(str(tmp_path), 'lobby')
+    assert [bytes(frame) for frame in restored.lines] == [line(1)]
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    write(tmp_path, lambda store: store.append('lobby', line(0)))
+    log_path = room_path(str(tmp_path), 'lobby', LOG_SUFFIX)
+    size = os.path.getsize(log_path)
+    with open(log_path, 'ab') as f:
+        f.write(line(1)[:7])
+
+    restored, generation = load_board(str(tmp_path), 'lobby', repair=True)
+    assert len(restored.lines) == 1
+    assert os.path.getsize(log_path) == size
+
+    # 이어 쓴 선이 잘린 꼬리 뒤에 묻히지 않음
+    write(tmp_path, lambda store: store.append('lobby', line(2)),
+          {'lobby': generation})
+    restored, _ = load_board(str(tmp_path), 'lobby')
+    assert [bytes(frame) for frame in restored.lines] == [line(0), line(2)]
+
+
+def test_stale_log_generation_ignored(tmp_path):
+    board = Board()
+    board.add_line(line(0))
+    write(tmp_path, lambda store: store.append('lobby', line(0)))
+    log_path = room_path(str(tmp_path), 'lobby', LOG_SUFFIX)
+    with open(log_path, 'rb') as f:
+        old_log = f.read()
+    write(tmp_path, lambda store: store.snapshot('lobby', board), {'lobby': 0})
+    # 스냅샷만 바뀌고 로그를 비우기 전에 죽은 경우
+    with open(log_path, 'wb') as f:
+        f.write(old_log)
+    restored, _ = load_board(str(tmp_path), 'lobby')
+    assert [bytes(frame) for frame in restored.lines] == [line(0)]
+
+
+def test_snapshot_when_log_grows(tmp_path, monkeypatch):
+    # 스냅샷 이후 로그가 임계값을 넘으면 스냅샷을 새로 써서 로그를 비움
+    monkeypatch.setattr(board_store, 'SNAPSHOT_LOG_LINES', 4)
+    core = ServerCore(board_dir=str(tmp_path))
+    core.board_store = BoardStore(str(tmp_path))
+    core.board_store.start()
+    for i in range(10):
+        core.record_board(type_code('line'), line(i), 'lobby')
+    core.board_store.close()
+
+    # 4개째에 처음, 그 뒤로는 로그가 직전 스냅샷(선 4개 + 헤더)보다 커진 9개째에 다시
+    assert core.board_store.snapshots == 2
+    assert core.board_store.log_sizes['lobby'] == [1, len(line(9))]
+    restored, generation = load_board(str(tmp_path), 'lobby')
+    assert generation == 2
+    assert [bytes(frame) for frame in restored.lines] == \
+        [line(i) for i in range(10)]
+    log_path = room_path(str(tmp_path), 'lobby', LOG_SUFFIX)
+    assert os.path.getsize(log_path) == \
+        board_store.LOG_HEADER.size + len(line(9))
+
+
+def test_snapshot_waits_for_log_to_outgrow_snapshot(tmp_path, monkeypatch):
+    # 보드 전체를 다시 쓰는 비용이 그동안 로그에 붙인 양을 넘지 않도록
+    monkeypatch.setattr(board_store, 'SNAPSHOT_LOG_LINES', 2)
+    board = Board()
+    for i in range(6):
+        board.add_line(line(i))
+    store = BoardStore(str(tmp_path))
+    store.snapshot('lobby', board)
+    # 스냅샷은 선 6개 + 헤더이므로 로그에 7개가 붙어야 다시 씀
+    for i in range(7):
+        store.append('lobby', line(i))
+        assert store.needs_snapshot('lobby') == (i == 6)
+
+
+def test_log_size_counted_after_restart(tmp_path, monkeypatch):
+    def tasks(store):
+        for i in range(3):
+            store.append('lobby', line(i))
+
+    write(tmp_path, tasks)
+    _, generations = load_boards(str(tmp_path), repair=True)
+    store = BoardStore(str(tmp_path), generations)
+    assert store.log_sizes['lobby'] == [0, 3 * len(line(0))]
+    # 스냅샷 없이 로그만 있던 방
+    assert store.snapshot_sizes['lobby'] == 0
+    assert not os.path.exists(room_path(str(tmp_path), 'lobby', SNAPSHOT_SUFFIX))
+    monkeypatch.setattr(board_store, 'SNAPSHOT_LOG_BYTES', 4 * len(line(0)))
+    assert not store.needs_snapshot('lobby')
+    store.append('lobby', line(3))
+    assert store.needs_snapshot('lobby')
@@ -0,0 +1,169 @@
+import queue
+import time
+
+import pytest
+
+from chat_history import (MAX_MESSAGE_ID, SEARCH_CANDIDATES, ChatHistory,
+                          match_query)
+from protocol import encode_message
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = ChatHistory(str(tmp_path / 'chat.db'))
+    history.start()
+    yield history
+    history.close()
+
+
+def chat(text):
+    return encode_message({'type': 'chat', 'message': text})
+
+
+def wait(request, *args):
+    # 기록 스레드가 돌려주는 (목록, 더 있는지)를 기다림
+    replies = queue.Queue()
+    request(*args, callback=lambda results, more: replies.put((results, more)))
+    return replies.get(timeout=5)
+
+
+def page(history, room, before, since, limit, live=0):
+    return wait(lambda callback: history.page(room, before, since, limit,
+                                              callback, live))
+
+
+def texts(messages):
+    return [message['message'] for message in messages]
+
+
+def test_page_backwards(history):
+    for i in range(5):
+        history.append('lobby', chat(f'm{i}'))
+    history.append('other', chat('elsewhere'))
+    now = time.time() + 1
+
+    messages, more = page(history, 'lobby', None, now, 3)
+    assert texts(messages) == ['m2', 'm3', 'm4'] and more
+    messages, more = page(history, 'lobby', messages[0]['id'], now, 3)
+    assert texts(messages) == ['m0', 'm1'] and not more
+
+
+def test_history_after(history):
+    for i in range(5):
+        history.append('lobby', chat(f'm{i}'))
+    first, _ = page(history, 'lobby', None, time.time() + 1, 5)
+    messages, more = wait(lambda callback: history.history_after(
+        'lobby', first[1]['id'], 2, callback))
+    assert texts(messages) == ['m2', 'm3'] and more
+
+
+def test_live_anchor(history):
+    # 방에 들어온 뒤 받은 채팅 중 앞에서 지운 live개와 그 앞의 기록
+    history.append('lobby', chat('before'))
+    time.sleep(0.01)
+    page(history, 'lobby', None, 0, 1)  # 쓰기가 끝날 때까지 기다림
+    joined = time.time()
+    for i in range(4):
+        history.append('lobby', chat(f'live{i}'))
+
+    messages, more = page(history, 'lobby', None, joined, 10, live=2)
+    assert texts(messages) == ['before', 'live0', 'live1'] and not more
+    messages, _ = page(history, 'lobby', None, joined, 10)
+    assert texts(messages) == ['before']
+
+
+def test_overflowing_anchor_gets_empty_reply(history):
+    history.append('lobby', chat('m0'))
+    assert page(history, 'lobby', MAX_MESSAGE_ID + 1, 0, 5) == ([], False)
+    # 기록 스레드가 계속 동작함
+    messages, _ = page(history, 'lobby', MAX_MESSAGE_ID, 0, 5)
+    assert texts(messages) == ['m0']
+
+
+def test_bad_frames_are_skipped(history):
+    history.append('lobby', b'\x01\x02\x00\x00\x00\x03abc')
+    history.append('lobby', encode_message({'type': 'chat', 'message': 5}))
+    history.append('lobby', chat('ok'))
+    messages, _ = page(history, 'lobby', None, time.time() + 1, 5)
+    assert texts(messages) == ['ok']
+
+
+def search(history, text, offset, limit, before=None):
+    return wait(lambda callback: history.search('lobby', text, offset, limit,
+                                                callback, before))
+
+
+def test_search(history):
+    for text in ('내일 회의에서 결정', '점심 메뉴', '회의 시간 변경', '회'):
+        history.append('lobby', chat(text))
+    history.append('other', chat('다른 방 회의'))
+
+    hits, more = search(history, '회의', 0, 10)
+    assert sorted(texts(hits)) == ['내일 회의에서 결정', '회의 시간 변경']
+    assert [hit['offset'] for hit in hits] == [0, 1] and not more
+    assert all(hit['ranked'] for hit in hits)
+
+    hits, more = search(history, '회의', 1, 1)
+    assert len(hits) == 1 and hits[0]['offset'] == 1 and not more
+
+
+def test_search_continues_past_ranked_window(history):
+    # 순위를 매기는 범위 너머의 오래된 일치도 시간순으로 이어서 찾을 수 있음
+    total = SEARCH_CANDIDATES + 30
+    for i in range(total):
+        history.append('lobby', chat(f'회의 {i}'))
+    history.append('lobby', chat('다른 이야기'))
+
+    offset = SEARCH_CANDIDATES - 5
+    hits, more = search(history, '회의', offset, 10)
+    assert [hit['offset'] for hit in hits] == list(range(offset, offset + 10))
+    assert [hit['ranked'] for hit in hits] == [True] * 5 + [False] * 5
+    assert texts(hits[5:]) == [f'회의 {i}' for i in range(29, 24, -1)] and more
+
+    seen = {hit['id'] for hit in hits}
+    offset += len(hits)
+    while more:
+        hits, more = search(history, '회의', offset, 10, hits[-1]['id'])
+        assert not any(hit['ranked'] for hit in hits)
+        seen.update(hit['id'] for hit in hits)
+        offset += len(hits)
+    assert offset == total
+    assert texts(hits)[-1] == '회의 0'
+
+    first, _ = search(history, '회의', 0, 200)
+    assert len(seen) == 35 and not seen & {hit['id'] for hit in first}
+
+
+def test_search_window_not_full_has_no_older_hits(history):
+    history.append('lobby', chat('회의'))
+    hits, more = search(history, '회의', 0, 10)
+    assert len(hits) == 1 and hits[0]['ranked'] and not more
+    assert search(history, '회의', 1, 10) == ([], False)
+
+
+def test_search_syntax_is_literal(history):
+    history.append('lobby', chat('a "quoted" OR text'))
+    hits, _ = search(history, '"quoted" OR', 0, 10)
+    assert texts(hits) == ['a "quoted" OR text']
+
+
+def test_match_query():
+    assert match_query('  ') is None
+    assert match_query('회의 a') == '"회의"* "a"'
+    assert match_query('say "hi"') == '"say"* """hi"""*'
+
+
+def test_history_survives_reopen(tmp_path):
+    path = str(tmp_path / 'chat.db')
+    first = ChatHistory(path)
+    first.start()
+    first.append('lobby', chat('saved'))
+    first.close()
+
+    second = ChatHistory(path)
+    second.start()
+    try:
+        messages, _ = page(second, 'lobby', None, time.time() + 1, 5)
+        assert texts(messages) == ['saved']
+    finally:
+        second.close()
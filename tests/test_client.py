@@ -0,0 +1,200 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from PyQt5.QtCore import Qt  # noqa: E402
+
+from client import DrawingClient, MessageModel, StrokeBatcher, simplify_points  # noqa: E402
+
+
+def segment(x1, y1, x2, y2, color='#000000', width=2, mode='pen'):
+    return {'type': 'line', 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+            'color': color, 'width': width, 'mode': mode}
+
+
+def test_simplify_points_drops_collinear():
+    points = [(0, 0), (1, 0), (2, 0), (3, 0), (3, 5)]
+    assert simplify_points(points, 0.75) == [(0, 0), (3, 0), (3, 5)]
+
+
+def test_simplify_points_keeps_corners_beyond_tolerance():
+    points = [(0, 0), (5, 1), (10, 0)]
+    assert simplify_points(points, 0.75) == points
+    assert simplify_points(points, 2) == [(0, 0), (10, 0)]
+    assert simplify_points(points, 0) == points
+
+
+def test_simplify_points_closed_loop():
+    # 처음과 끝이 같은 점이어도 중간 점은 거리로 판단
+    points = [(0, 0), (10, 0), (10, 10), (0, 0)]
+    assert simplify_points(points, 0.75) == points
+
+
+@pytest.fixture
+def batcher(qt_app):
+    batcher = StrokeBatcher()
+    batcher.sent = []
+    batcher.stroke_ready.connect(batcher.sent.append)
+    return batcher
+
+
+def test_batcher_joins_segments(batcher):
+    for x in range(0, 5):
+        batcher.add_line(segment(x, 0, x + 1, 0))
+    batcher.add_line(segment(5, 0, 5, 4))
+    batcher.flush()
+    assert batcher.sent == [{'type': 'stroke', 'points': [0, 0, 5, 0, 5, 4],
+                             'color': '#000000', 'width': 2, 'mode': 'pen'}]
+    # 다음 묶음은 마지막 점에서 이어짐
+    batcher.add_line(segment(5, 4, 9, 4))
+    batcher.flush()
+    assert batcher.sent[1]['points'] == [5, 4, 9, 4]
+
+
+def test_batcher_splits_on_pen_change_and_gap(batcher):
+    batcher.add_line(segment(0, 0, 1, 1))
+    batcher.add_line(segment(1, 1, 2, 2, color='#ff0000'))
+    batcher.add_line(segment(10, 10, 11, 11, color='#ff0000'))
+    batcher.end_stroke()
+    assert [stroke['points'] for stroke in batcher.sent] == \
+        [[0, 0, 1, 1], [1, 1, 2, 2], [10, 10, 11, 11]]
+    assert [stroke['color'] for stroke in batcher.sent] == \
+        ['#000000', '#ff0000', '#ff0000']
+    assert batcher.points == []
+
+
+def test_batcher_flush_without_segment(batcher):
+    batcher.flush()
+    batcher.end_stroke()
+    assert batcher.sent == []
+
+
+def chat_rows(texts, message_id=None):
+    return [('user', text, 'chat', message_id) for text in texts]
+
+
+def row_texts(model):
+    return [row[1] for row in model.messages]
+
+
+def test_model_keeps_limit_rows(qt_app):
+    model = MessageModel(limit=5)
+    inserted = []
+    removed = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+    model.add_messages(chat_rows('abc'))
+    model.add_messages(chat_rows('defg'))
+    assert row_texts(model) == list('cdefg') and model.rowCount() == 5
+    # 행 삽입/삭제는 한 번에 알림
+    assert inserted == [(0, 2), (3, 6)] and removed == [(0, 1)]
+    assert model.more_history
+
+
+def test_model_oversized_batch(qt_app):
+    model = MessageModel(limit=3)
+    model.add_messages(chat_rows('abcdefg'))
+    assert row_texts(model) == list('efg')
+
+
+def test_model_prepend_is_not_trimmed_until_next_add(qt_app):
+    model = MessageModel(limit=3)
+    model.add_messages(chat_rows('de'))
+    model.prepend_messages(chat_rows('abc', 1), more=False)
+    assert row_texts(model) == list('abcde') and not model.more_history
+    model.add_messages(chat_rows('f'))
+    assert row_texts(model) == list('def')
+
+
+def test_model_pending_messages_flush_together(qt_app):
+    model = MessageModel()
+    model.add_message('user', 'a')
+    model.add_message('user', '')  # 빈 메시지는 무시
+    model.add_message('user', 'b')
+    assert model.rowCount() == 0
+    model.flush_pending()
+    assert row_texts(model) == ['a', 'b']
+    assert model.data(model.index(0), Qt.DisplayRole) == ('user', 'a', 'chat')
+
+
+def test_model_older_anchor_counts_evicted_live_chat(qt_app):
+    model = MessageModel(limit=3)
+    assert model.older_anchor() == {'before': None, 'live': 0}
+    model.add_messages(chat_rows('ab') + [('server', 'x', 'system', None)])
+    model.add_messages(chat_rows('cd'))
+    # 지운 실시간 채팅(a, b)만 세고 시스템 메시지는 세지 않음
+    assert row_texts(model) == list('xcd')
+    assert model.older_anchor() == {'before': None, 'live': 2}
+    model.add_messages(chat_rows('e'))
+    assert model.older_anchor() == {'before': None, 'live': 2}
+
+
+def test_model_older_anchor_after_history(qt_app):
+    model = MessageModel(limit=3)
+    model.add_messages(chat_rows('cd'))
+    model.prepend_messages([('user', 'a', 'chat', 7), ('user', 'b', 'chat', 8)],
+                           more=True)
+    assert model.older_anchor() == {'before': 7}
+    # 기록 행이 지워져도 서버 번호가 있으므로 실시간 수로 세지 않음
+    model.add_messages(chat_rows('e'))
+    assert row_texts(model) == list('cde')
+    assert model.older_anchor() == {'before': None, 'live': 0}
+
+
+def test_model_clear_with_anchor(qt_app):
+    model = MessageModel()
+    model.add_messages(chat_rows('ab'))
+    model.clear(anchor=41)
+    assert model.rowCount() == 0 and model.more_newer
+    assert model.older_anchor() == {'before': 42}
+    assert model.newest_history_id() == 41
+    model.append_history([('user', 'x', 'chat', 42)], more=False)
+    assert model.newest_history_id() == 42 and not model.more_newer
+    assert model.older_anchor() == {'before': 42}
+
+
+class FakeCanvas:
+    def __init__(self):
+        self.batches = []
+
+    def load_lines(self, drawing):
+        if any('x1' not in data for data in drawing if data['type'] == 'line'):
+            raise KeyError('x1')
+        self.batches.append(drawing)
+
+
+class FakeClient:
+    # 위젯 없이 drain_inbox만 돌려 보기 위한 최소한의 상태
+    drain_inbox = DrawingClient.drain_inbox
+    load_drawing = DrawingClient.load_drawing
+
+    def __init__(self, messages):
+        self.inbox_lock = threading.Lock()
+        self.inbox = messages
+        self.inbox_since = time.perf_counter()
+        self.event_lag = []
+        self.canvas = FakeCanvas()
+        self.handled = []
+
+    def handle_message(self, data):
+        if data.get('type') == 'bad':
+            raise ValueError('bad')
+        self.handled.append(data.get('type'))
+
+
+def test_drain_inbox_continues_after_errors(capsys):
+    good = segment(0, 0, 1, 1)
+    client = FakeClient([
+        {'type': 'line'}, {'type': 'bad'}, {'message': 'no type'},
+        good, {'type': 'chat'}, good,
+    ])
+    client.drain_inbox()
+    assert client.handled == [None, 'chat']
+    assert client.canvas.batches == [[good], [good]]
+    assert client.inbox == [] and client.inbox_since is None
+    assert len(client.event_lag) == 1
+    out = capsys.readouterr().out
+    assert '그리기 메시지 처리 오류' in out and '메시지 처리 오류(bad)' in out
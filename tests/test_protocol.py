@@ -0,0 +1,153 @@
+import json
+
+import pytest
+
+from protocol import (COMPRESSED_FLAG, DRAWING_BINARY, DRAWING_LEGACY,
+                      DRAWING_STROKE, HEADER_SIZE, MAX_FRAME_SIZE,
+                      STROKE_BIN_CODE, STROKE_CODE, FrameDecoder,
+                      LegacyDecoder, ProtocolError, compress_frame,
+                      convert_drawing, decode_binary_stroke, decode_frame,
+                      encode_binary_stroke, encode_message, frame_header,
+                      type_code)
+
+
+def line(i):
+    return {'type': 'line', 'x1': i, 'y1': i, 'x2': i + 1, 'y2': i + 1,
+            'color': '#ff0000', 'width': 2, 'mode': 'pen'}
+
+
+def stroke(points):
+    return {'type': 'stroke', 'points': points, 'color': '#00ff80',
+            'width': 3, 'mode': 'eraser'}
+
+
+def test_encode_decode_roundtrip():
+    frame = encode_message({'type': 'chat', 'message': '안녕하세요'})
+    assert frame[1] == type_code('chat')
+    assert decode_frame(frame) == {'type': 'chat', 'message': '안녕하세요'}
+
+
+def test_unknown_type_is_other():
+    assert encode_message({'type': 'nope'})[1] == type_code('other')
+
+
+def test_frame_size_limit():
+    with pytest.raises(ProtocolError):
+        frame_header(type_code('chat'), MAX_FRAME_SIZE + 1)
+
+
+def test_decoder_byte_by_byte():
+    data = b''.join(encode_message(line(i)) for i in range(3))
+    decoder = FrameDecoder()
+    messages = []
+    for i in range(len(data)):
+        messages += decoder.feed_messages(data[i:i + 1])
+    assert messages == [line(i) for i in range(3)]
+
+
+def test_decoder_large_frame_in_chunks():
+    frame = encode_message({'type': 'chat', 'message': 'x' * 300000})
+    decoder = FrameDecoder()
+    frames = []
+    for i in range(0, len(frame), 1000):
+        frames += decoder.feed(frame[i:i + 1000])
+    assert len(frames) == 1
+    assert bytes(frames[0][1]) == frame
+    assert not decoder.buffer
+
+
+def test_decoder_rejects_bad_version_and_size():
+    with pytest.raises(ProtocolError):
+        FrameDecoder().feed(b'\x07' + encode_message(line(0))[1:])
+    with pytest.raises(ProtocolError):
+        FrameDecoder().feed(b'\x01\x01' + (MAX_FRAME_SIZE + 1).to_bytes(4, 'big'))
+
+
+def test_compress_roundtrip():
+    frame = encode_message({'type': 'chat', 'message': 'hello ' * 200})
+    compressed = compress_frame(frame)
+    assert compressed[1] & COMPRESSED_FLAG
+    assert len(compressed) < len(frame)
+    # 이미 압축한 프레임은 그대로
+    assert compress_frame(compressed) is compressed
+    [(code, inflated)] = FrameDecoder().feed(compressed)
+    assert code == type_code('chat')
+    assert bytes(inflated) == frame
+
+
+def test_small_frame_not_compressed():
+    frame = encode_message(line(0))
+    assert compress_frame(frame) is frame
+
+
+def test_broken_compressed_frame():
+    frame = frame_header(type_code('chat') | COMPRESSED_FLAG, 4) + b'abcd'
+    with pytest.raises(ProtocolError):
+        FrameDecoder().feed(frame)
+
+
+def test_legacy_decoder_split_and_joined():
+    data = b''.join(encode_message(line(i))[HEADER_SIZE:] for i in range(3))
+    decoder = LegacyDecoder()
+    assert decoder.feed_messages(data[:10]) == []
+    assert decoder.feed_messages(data[10:]) == [line(i) for i in range(3)]
+
+
+def test_legacy_decoder_split_anywhere():
+    # 어느 바이트에서 잘려도 메시지를 버리지 않음 (\uXXXX 이스케이프, UTF-8 글자 중간 포함)
+    message = {'type': 'chat', 'message': '안녕하세요'}
+    for ensure_ascii in (True, False):
+        data = json.dumps(message, ensure_ascii=ensure_ascii).encode()
+        for end in range(len(data)):
+            decoder = LegacyDecoder()
+            assert decoder.feed_messages(data[:end]) == []
+            assert decoder.feed_messages(data[end:]) == [message]
+
+
+def test_legacy_decoder_skips_bad_json():
+    decoder = LegacyDecoder()
+    assert decoder.feed_messages(b'{"a": \\uzzzz} {"type": "chat"}') == \
+        [{'type': 'chat'}]
+
+
+def test_binary_stroke_roundtrip():
+    for points in ([10, 20, 15, 18, 30, 40], [0, 0, 1000, -2000, 5, 5]):
+        frame = encode_binary_stroke(stroke(points))
+        assert frame[1] == STROKE_BIN_CODE
+        assert decode_binary_stroke(frame) == stroke(points)
+
+
+def test_binary_stroke_unrepresentable():
+    assert encode_binary_stroke(stroke([0, 0])) is None
+    assert encode_binary_stroke(stroke([0, 0, 40000, 0])) is None
+    assert encode_binary_stroke(stroke([0, 0, 1.5, 1])) is None
+    assert encode_binary_stroke(dict(stroke([0, 0, 1, 1]), color='red')) is None
+    assert encode_binary_stroke(dict(stroke([0, 0, 1, 1]), width=300)) is None
+
+
+def test_binary_stroke_odd_points():
+    # 짝이 없는 마지막 좌표가 있으면 인코딩하지 않음 (디코딩할 수 없는 프레임이 되므로)
+    assert encode_binary_stroke(stroke([0, 0, 5, 5, 9])) is None
+
+
+def test_binary_stroke_bad_frames():
+    frame = encode_binary_stroke(stroke([10, 20, 15, 18, 30, 40]))
+    truncated = frame_header(STROKE_BIN_CODE, len(frame) - HEADER_SIZE - 1) + \
+        frame[HEADER_SIZE:-1]
+    assert decode_binary_stroke(truncated) is None
+    assert decode_binary_stroke(frame_header(STROKE_BIN_CODE, 2) + b'ab') is None
+
+
+def test_convert_drawing_levels():
+    points = [0, 0, 5, 5, 10, 0]
+    frame = encode_binary_stroke(stroke(points))
+    assert convert_drawing(STROKE_BIN_CODE, frame, DRAWING_BINARY) is frame
+    assert decode_frame(convert_drawing(STROKE_BIN_CODE, frame,
+                                        DRAWING_STROKE)) == stroke(points)
+    # 예전 클라이언트는 line JSON을 이어 붙인 것으로 받음
+    for code, source in ((STROKE_CODE, encode_message(stroke(points))),
+                         (STROKE_BIN_CODE, frame)):
+        legacy = convert_drawing(code, source, DRAWING_LEGACY)
+        messages = LegacyDecoder().feed_messages(bytes(legacy[HEADER_SIZE:]))
+        assert [(m['x1'], m['y1'], m['x2'], m['y2']) for m in messages] == \
+            [(0, 0, 5, 5), (5, 5, 10, 0)]
@@ -0,0 +1,175 @@
+import json
+
+import pytest
+
+from board import Board
+from chat_history import SEARCH_CANDIDATES
+from protocol import ProtocolError, encode_message, type_code
+from server_core import ServerCore, parse_hello
+from test_board import png
+
+
+def test_json_hello_with_following_frame():
+    chat = encode_message({'type': 'chat', 'message': 'hi'})
+    hello = json.dumps({'nickname': ' 앨리스 ', 'proto': 1}).encode() + chat
+    payload, rest = parse_hello(hello)
+    assert payload['nickname'] == '앨리스' and payload['proto'] == 1
+    assert rest == chat
+
+
+def test_split_hello_waits():
+    # 어느 바이트에서 잘려도 닉네임을 잘못 읽지 않고 나머지를 기다림
+    # (\uXXXX 이스케이프 중간이나 UTF-8 글자 중간 포함)
+    for ensure_ascii in (True, False):
+        hello = json.dumps({'nickname': '앨리스', 'proto': 1},
+                           ensure_ascii=ensure_ascii).encode()
+        for end in range(len(hello)):
+            assert parse_hello(hello[:end]) is None
+        assert parse_hello(hello)[0]['nickname'] == '앨리스'
+    assert parse_hello(b'   ') is None
+
+
+def test_legacy_nickname():
+    assert parse_hello(b'bob') == ({'nickname': 'bob'}, b'')
+    assert parse_hello(b'bob\n{"type": "chat"}') == \
+        ({'nickname': 'bob'}, b'{"type": "chat"}')
+    assert parse_hello(b'{bob}') == ({'nickname': '{bob}'}, b'')
+    assert parse_hello(b'b\xffob') == ({'nickname': 'b?ob'}, b'')
+
+
+def test_bad_json_hello():
+    for hello in (b'{"nickname": null}', b'{"proto": 1}', b'{"nickname": 5}'):
+        with pytest.raises(ProtocolError):
+            parse_hello(hello)
+
+
+class FakeConnection:
+    room = 'lobby'
+
+    def __init__(self, id=0, framed=True):
+        self.id = id
+        self.framed = framed
+        self.sent = []
+
+    def send_message(self, data):
+        self.sent.append(data)
+
+
+def relayed_codes(messages, monkeypatch):
+    # 클라이언트가 보낸 메시지 중 같은 방에 중계되는 것의 타입 코드
+    core = ServerCore()
+    relayed = []
+    monkeypatch.setattr(core, 'relay',
+                        lambda code, *args: relayed.append(code))
+    for message in messages:
+        core.dispatch_frame(FakeConnection(), type_code(message['type']),
+                            encode_message(message))
+        core.dispatch_message(FakeConnection(), message)
+    return relayed
+
+
+def test_server_only_types_not_relayed(monkeypatch):
+    messages = [{'type': name} for name in (
+        'snapshot', 'welcome', 'checkpoint_request', 'join_exit',
+        'room_changed', 'server_shutdown', 'bus_publish', 'bus_checkpoint')]
+    assert relayed_codes(messages, monkeypatch) == []
+
+
+def test_client_types_relayed(monkeypatch):
+    messages = [{'type': 'chat', 'message': 'hi'}, {'type': 'clear'}]
+    assert relayed_codes(messages, monkeypatch) == \
+        [type_code('chat')] * 2 + [type_code('clear')] * 2
+
+
+def test_record_board_and_stats():
+    core = ServerCore()
+    line = encode_message({'type': 'line', 'x1': 0, 'y1': 0, 'x2': 1,
+                           'y2': 1, 'color': '#000000', 'width': 2})
+    for _ in range(3):
+        core.record_board(type_code('line'), line, 'lobby')
+    core.record_board(type_code('chat'), line, 'lobby')
+    stats = core.board_stats()
+    assert (stats['boards'], stats['lines'], stats['bytes']) == \
+        (1, 3, 3 * len(line))
+    core.record_board(type_code('clear'), encode_message({'type': 'clear'}),
+                      'lobby')
+    stats = core.board_stats()
+    assert (stats['lines'], stats['compacted']) == (0, 3)
+
+
+def test_checkpoint_request_rotates_clients():
+    # 답하지 않는 연결에게만 거듭 요청하지 않도록 돌아가며 요청
+    core = ServerCore()
+    board = Board()
+    board.add_line(encode_message({'type': 'line'}))
+    clients = [FakeConnection(id, framed=id != 2) for id in (3, 1, 2)]
+    core.rooms['lobby'] = set(clients)
+    asked = []
+    for _ in range(4):
+        core.request_checkpoint('lobby', board)
+        asked.append(board.requested_by)
+    assert asked == [1, 3, 1, 3]
+    assert clients[0].sent == [{'type': 'checkpoint_request', 'seq': 1}] * 2
+
+
+def test_checkpoint_without_framed_client_waits_retry():
+    core = ServerCore()
+    board = Board()
+    board.add_line(encode_message({'type': 'line'}))
+    core.rooms['lobby'] = {FakeConnection(1, framed=False)}
+    core.request_checkpoint('lobby', board)
+    assert board.requested_at is not None and board.requested_by is None
+
+
+def test_checkpoint_with_wrong_canvas_size_rejected():
+    core = ServerCore()
+    board = core.boards['lobby'] = Board()
+    board.add_line(encode_message({'type': 'line'}))
+    client = FakeConnection(1)
+    seq = board.request(1, 0)
+    core.handle_checkpoint(client, {'seq': seq, 'image': png(300, 200)})
+    assert board.requested_by == 1 and board.folding is None
+
+
+def test_malformed_stroke_not_relayed_or_recorded(monkeypatch):
+    good = {'type': 'stroke', 'points': [0, 0, 5, 5], 'color': '#000000',
+            'width': 2}
+    bad = [dict(good, points=[0, 0, 5, 5, 9]), dict(good, points=[0, 'x', 1, 1]),
+           dict(good, width=None)]
+    assert relayed_codes(bad, monkeypatch) == []
+    assert relayed_codes([good], monkeypatch) == [type_code('stroke')] * 2
+
+
+def test_malformed_legacy_line_not_relayed(monkeypatch):
+    # 예전 클라이언트의 메시지는 이미 파싱했으므로 line도 검사
+    core = ServerCore()
+    relayed = []
+    monkeypatch.setattr(core, 'relay', lambda code, *args: relayed.append(code))
+    core.dispatch_message(FakeConnection(), {'type': 'line', 'x1': 'a'})
+    assert relayed == [] and core.boards == {}
+
+
+class FakeHistory:
+    def __init__(self):
+        self.searches = []
+
+    def search(self, room, text, offset, limit, callback, before=None):
+        self.searches.append((room, text, offset, limit, before))
+
+
+def test_search_past_ranked_window_needs_before():
+    core = ServerCore()
+    core.history = FakeHistory()
+    connection = FakeConnection()
+    for request in (
+            {'offset': SEARCH_CANDIDATES},
+            {'offset': SEARCH_CANDIDATES + 1},  # before 없이 범위 너머로 건너뛸 수 없음
+            {'offset': SEARCH_CANDIDATES + 1, 'before': 40},
+            {'offset': 5, 'before': 'x'},
+            {'offset': -1},
+            {'offset': 0, 'limit': 10}):
+        core.handle_search(connection, dict(request, query='회의'))
+    assert core.history.searches == [
+        ('lobby', '회의', SEARCH_CANDIDATES, 50, None),
+        ('lobby', '회의', SEARCH_CANDIDATES + 1, 50, 40),
+        ('lobby', '회의', 0, 10, None)]
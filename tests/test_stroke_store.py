@@ -0,0 +1,99 @@
+from stroke_store import GRID_MAX_CELLS, SegmentGrid, StrokeStore
+
+
+def stroke(points, color='#ff0000', width=2):
+    return {'type': 'stroke', 'points': points, 'color': color, 'width': width}
+
+
+def columns(store):
+    return [len(column) for column in
+            (store.x1, store.y1, store.x2, store.y2, store.pen)]
+
+
+def test_append_and_segments():
+    store = StrokeStore()
+    store.append(0, 0, 10, 10, '#ff0000', 2)
+    assert store.append_message(stroke([0, 0, 5, 5, 10, 0]))
+    assert store.append_message({'type': 'line', 'x1': 1, 'y1': 2, 'x2': 3,
+                                 'y2': 4, 'color': '#000000', 'width': 5,
+                                 'mode': 'eraser'})
+    assert len(store) == 4
+    assert store.pens == [('#ff0000', 2, 'pen'), ('#000000', 5, 'eraser')]
+    assert list(store.segments()) == [(0, 0, 0, 10, 10), (0, 0, 0, 5, 5),
+                                      (0, 5, 5, 10, 0), (1, 1, 2, 3, 4)]
+    assert list(store.segments_at([3])) == [(1, 1, 2, 3, 4)]
+
+
+def test_bad_messages_skipped():
+    # 다른 클라이언트가 보낸 잘못된 선은 열을 어긋나게 하지 않고 건너뜀
+    store = StrokeStore()
+    bad = [stroke([0, 0, 5, 5, 9]), stroke([0, 0]), stroke([0, 0, '5', 5]),
+           stroke([0, 0, 1.5, 5]), stroke([0, 0, True, 5]),
+           stroke([0, 0, 2 ** 40, 5]), stroke('0, 0, 5, 5'),
+           stroke([0, 0, 5, 5], color=None), stroke([0, 0, 5, 5], width='2'),
+           {'type': 'line', 'x1': 0, 'y1': 0, 'x2': None, 'y2': 1,
+            'color': '#000000', 'width': 2},
+           {'type': 'line', 'color': '#000000', 'width': 2}]
+    for message in bad:
+        assert not store.append_message(message)
+    assert columns(store) == [0] * 5
+    store.append_stroke([0, 0, 5, 5, 9], '#000000', 2)
+    assert columns(store) == [0] * 5
+
+
+def test_short_stroke_adds_nothing():
+    store = StrokeStore()
+    store.append_stroke([1, 1], '#000000', 1)
+    assert len(store) == 0
+
+
+def test_bounds_and_truncate():
+    store = StrokeStore()
+    assert store.bounds() is None
+    store.append(0, 0, 10, 10, '#000000', 2)
+    store.append(-5, 20, 3, 4, '#000000', 8)
+    assert store.bounds() == (-5, 0, 10, 20, 8)
+    assert store.bounds(1) == (-5, 4, 3, 20, 8)
+    store.truncate_front(1)
+    assert list(store.segments()) == [(1, -5, 20, 3, 4)]
+    store.clear()
+    assert len(store) == 0 and len(store.pens) == 2
+
+
+def test_grid_query():
+    store = StrokeStore()
+    store.append(0, 0, 10, 10, '#000000', 2)
+    store.append(500, 500, 510, 510, '#000000', 2)
+    store.append(0, 0, 64 * GRID_MAX_CELLS, 0, '#000000', 2)  # 긴 선
+    grid = SegmentGrid()
+    grid.add(store)
+    assert grid.large.tolist() == [2]
+    assert grid.query(0, 0, 20, 20) == [0, 2]
+    assert grid.query(490, 490, 520, 520) == [1, 2]
+    assert grid.query(2000, 2000, 2010, 2010) == [2]
+
+    # 새로 추가된 선만 색인
+    store.append(505, 505, 506, 506, '#000000', 2)
+    grid.add(store)
+    assert grid.count == 4
+    assert grid.query(490, 490, 520, 520) == [1, 2, 3]
+
+
+def test_grid_pads_pen_width():
+    store = StrokeStore()
+    store.append(60, 10, 62, 10, '#000000', 10)  # 굵기만큼 옆 칸에도 걸침
+    grid = SegmentGrid()
+    grid.add(store)
+    assert grid.query(66, 0, 70, 20) == [0]
+
+
+def test_grid_rebuild_after_truncate():
+    store = StrokeStore()
+    for x in (0, 500, 505):
+        store.append(x, x, x + 1, x + 1, '#000000', 2)
+    grid = SegmentGrid()
+    grid.add(store)
+    store.truncate_front(2)
+    grid.rebuild(store)
+    assert grid.query(490, 490, 520, 520) == [0]
+    assert grid.query(0, 0, 20, 20) == []
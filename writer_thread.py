@@ -0,0 +1,64 @@
+import abc
+import queue
+import threading
+
+
+class WriterThread(abc.ABC):
+    # 이벤트 루프는 큐에 넣기만 하고, 전용 스레드 하나가 작업을 순서대로 몰아서 처리하는 저장소
+    # (chat_history.ChatHistory, board_store.BoardStore)
+    # 하위 클래스가 채우는 것:
+    #   setup()         : 스레드가 시작할 때 한 번 (파일, DB 열기)
+    #   process(tasks)  : 큐에서 한 번에 꺼낸 작업 목록 (최대 batch_size개) - 반드시 구현
+    #   teardown()      : 스레드가 끝날 때 한 번 (남은 것을 내리고 닫기)
+    batch_size = 1000
+    name = '쓰기'  # 오류 메시지에 쓰는 이름
+
+    def __init__(self):
+        self.tasks = queue.Queue()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def close(self, timeout=5):
+        # 남은 작업을 마치고 스레드 종료
+        if self.thread is None:
+            return
+        self.tasks.put(None)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def setup(self):
+        pass
+
+    @abc.abstractmethod
+    def process(self, tasks):
+        pass
+
+    def teardown(self):
+        pass
+
+    def run(self):
+        self.setup()
+        try:
+            while True:
+                tasks = [self.tasks.get()]
+                try:
+                    while len(tasks) < self.batch_size:
+                        tasks.append(self.tasks.get_nowait())
+                except queue.Empty:
+                    pass
+
+                stop = None in tasks
+                if stop:
+                    tasks = tasks[:tasks.index(None)]
+                try:
+                    self.process(tasks)
+                except Exception as e:
+                    # 작업 하나 때문에 스레드가 멈춰 큐가 끝없이 쌓이지 않도록
+                    print(f"{self.name} 스레드 작업 처리 중 오류: {e}")
+                if stop:
+                    return
+        finally:
+            self.teardown()